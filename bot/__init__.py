@@ -6,13 +6,19 @@ from bot.handlers.start_handler import router as start_router
 from bot.handlers.view_tg_handdler import router as view_tg_router
 from bot.handlers.info_handlers import router as info_chat_router
 from bot.admin.admin_handlers import router as admin_router
+from bot.admin.search_handlers import router as search_router
 from bot.middlewares.auth_middleware import AuthMiddleware
+from bot.middlewares.throttling_middleware import throttling_middleware
 from bot.callbacks.callbacks import router as callback_router
 from bot.callbacks.viewscallback import router as callback_view_user_router
 
 
 root_router = Router()
 
+# лимит частоты — до фильтров и авторизации (outer), для всех видов апдейтов
+root_router.message.outer_middleware(throttling_middleware)
+root_router.callback_query.outer_middleware(throttling_middleware)
+root_router.inline_query.outer_middleware(throttling_middleware)
 root_router.message.middleware(AuthMiddleware())
 
 root_router.include_router(auth_router)
@@ -22,6 +28,7 @@ root_router.include_router(take_rg_router)
 root_router.include_router(view_tg_router)
 root_router.include_router(info_chat_router)
 root_router.include_router(admin_router)
+root_router.include_router(search_router)
 
 root_router.include_router(callback_router)
 root_router.include_router(callback_view_user_router)
\ No newline at end of file
@@ -1,8 +1,9 @@
+import asyncio
+import html
 import logging
-import math
 from mmap import ACCESS_COPY
 from config import settings
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram import Router, types
 from aiogram.fsm.context import FSMContext
 from bot import FSM
@@ -14,8 +15,19 @@ from bot.FSM.states import (
     AdminIdsStates,
 )
 from bot.callbacks.callbackData import get_users_keyboard, PAGE_SIZE
-from db.services.user_crud import delete_admin, set_new_admin, get_all_users
-from db.services.telegram_crud import (
+from bot.monitoring.retention import retention_job
+from bot.monitoring.supervisor import collect_monitoring_status
+from bot.middlewares.throttling_middleware import throttling_middleware
+from bot.utils.passwords import password_hasher
+from db.database import engine
+from db.services.chat_summary import rebuild_chat_summaries
+from db.services.async_retention_crud import (
+    effective_days,
+    list_retention_policies,
+    set_account_retention,
+)
+from db.services.async_user_crud import delete_admin, set_new_admin, list_users_page
+from db.services.async_telegram_crud import (
     get_telegram_account_by_alias,
     list_telegram_accounts,
     get_telegram_account_by_alias_for_admin,
@@ -39,12 +51,18 @@ API_TELETHON_HASH = settings.API_TELETHON_HASH
 
 router = Router()
 
+MONITORING_STATUS_LIMIT = 30
+
 help_text_for_admin = """<b>Каманды для админа:</b>\n\n 
 /kill_session - удаление всех сессий на аккаунте за исключением бота. Полезно, если нужно выкинуть всех с аккаунта.\n
 /get_info - выводит айди группы\n
 /delete_admin - лешение прав по нику пользователя в боте, действует на всех\n
 /set_admin - назначение прав администратора по нику пользователя в боте\n
 /view_users - показывает всех пользователей бота\n
+/monitoring_status - состояние подключений мониторинга, очереди записи и кэша\n
+/rebuild_chat_summary [alias] - пересчитать сводку чатов (все аккаунты или один), если счётчики разошлись\n
+/search слова [account:alias] [chat:id] [from:имя] [since:дата] [until:дата] [deleted] - поиск по архиву сообщений (и inline: search ...)\n
+/retention [run | alias текст_дней медиа_дней] - сроки хранения архива, очистка сейчас, срок для аккаунта (default — общий)\n
 """
 
 
@@ -67,7 +85,7 @@ async def cmd_kill_session(message: types.Message, current_user: User):
 
     # берем alias + user_id и ищем его в БД
     alias = parts[1].strip()
-    acсount_dict = get_telegram_account_by_alias_for_admin(alias=alias)
+    acсount_dict = await get_telegram_account_by_alias_for_admin(alias=alias)
     if not acсount_dict:
         await message.answer("Аккаунт для убийства сессий не найден.")
         return
@@ -118,7 +136,7 @@ async def cmd_set_new_admin(message: types.Message, state: FSMContext):
 async def get_id_for_new_admin(message: types.Message, state: FSMContext):
     msg_id = message.text.strip()
     try:
-        set_new_admin(msg_id)
+        await set_new_admin(msg_id)
         await message.answer(
             f"Назначен новый администратор <b>username=</b> <code>{msg_id}</code>",
             parse_mode="HTML",
@@ -143,7 +161,7 @@ async def cmd_delete_admin(message: types.Message, state: FSMContext):
 @router.message(AdminNameStates.wait_name)
 async def get_admin_name_for_delete(message: types.Message, state: FSMContext):
     name_msg = message.text.strip()
-    result = delete_admin(username=name_msg)
+    result = await delete_admin(username=name_msg)
     if result:
         logger.info(f"get_admin_name_for_delete: админ {name_msg} лишен прав!")
         await message.answer(
@@ -159,21 +177,206 @@ async def get_admin_name_for_delete(message: types.Message, state: FSMContext):
 
 @router.message(Command("view_users"))
 async def cmd_view_users(message: types.Message):
-    all_users = get_all_users()
-    if not all_users:
+    page = 1
+    users_on_page, total_pages, total = await list_users_page(page, PAGE_SIZE)
+    if not total:
         await message.answer("Пользователи не найдены!")
         return
 
-    page = 1
-    total_pages = math.ceil(len(all_users) / PAGE_SIZE)
-
-    # Берём срез пользователей на текущей странице
-    start_idx = (page - 1) * PAGE_SIZE
-    end_idx = start_idx + PAGE_SIZE
-    users_on_page = all_users[start_idx:end_idx]
-
     text = f"<b>Список пользователей (страница {page}/{total_pages}):</b>"
     keyboard = get_users_keyboard(page, total_pages, users_on_page)
 
     await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
 
+
+
+@router.message(Command("monitoring_status"))
+async def cmd_monitoring_status(message: types.Message):
+    status = collect_monitoring_status()
+    states = status["states"]
+    queue = status["ingest"]
+    cache = status["peer_cache"]
+    media = status["media"]
+    passwords = password_hasher.stats()
+    throttle = throttling_middleware.stats()
+
+    lines = [
+        f"<b>Мониторинг:</b> {states['live']}/{status['total']} live",
+        ", ".join(f"{name}: {count}" for name, count in states.items()),
+        "",
+        f"<b>Очередь записи:</b> в очереди {queue['queue_depth']}, "
+        f"записано {queue['committed']} (повторов {queue['duplicates']}), "
+        f"ошибок {queue['failed']}, "
+        f"commit avg {queue['avg_commit_ms']} мс / max {queue['max_commit_ms']} мс",
+        f"<b>Кэш собеседников:</b> {cache['size']} записей, "
+        f"hit rate {cache['hit_rate']:.0%} ({cache['hits']}/{cache['hits'] + cache['misses']})",
+        f"<b>Медиа:</b> в очереди {media['queued']}, качается {media['active']}, "
+        f"сохранено {media['done']} (из хранилища {media['reused']}, "
+        f"скачано {media['downloaded_mb']} МБ), "
+        f"пропущено {media['skipped']}, ошибок {media['failed']}",
+        f"<b>Пароли:</b> в очереди {passwords['pending']} (max {passwords['max_pending']}), "
+        f"считается {passwords['active']}, готово {passwords['done']} "
+        f"(пересчитано {passwords['rehashed']}), отклонено {passwords['rejected']}, "
+        f"ожидание avg {passwords['avg_wait_ms']} мс / max {passwords['max_wait_ms']} мс, "
+        f"хэш avg {passwords['avg_hash_ms']} мс",
+        f"<b>Лимит запросов:</b> пользователей {throttle['users']}, "
+        f"отклонено {throttle['throttled']} (бот занят {throttle['busy']}), "
+        f"дорогих команд сейчас {throttle['running']}",
+    ]
+
+    leases = status["leases"]
+    lines.append(
+        f"<b>Экземпляр:</b> <code>{html.escape(leases['instance'])}</code>, "
+        f"арендовано {leases['owned']}, живых экземпляров {leases['instances']}"
+    )
+
+    if status["workers"]:
+        lines += ["", f"<b>Процессы:</b> перезапусков {status['restarts']}"]
+        for w in status["workers"]:
+            lines.append(
+                f"#{w['index']} pid {w['pid']} — "
+                f"{'работает' if w['alive'] else 'не работает'}, "
+                f"аккаунтов {w['accounts']}"
+                + ("" if w["reported"] else ", статус ещё не получен")
+            )
+
+    problems = status["problems"]
+    if problems:
+        lines += ["", "<b>Проблемные аккаунты:</b>"]
+        for p in problems[:MONITORING_STATUS_LIMIT]:
+            retry = (
+                f", повтор через {p['retry_in']:.0f} сек." if p["retry_in"] else ""
+            )
+            lines.append(
+                f"<code>{p['account_id']}</code> {html.escape(p['alias'] or '')} — "
+                f"{p['state']}, ошибок {p['failures']}{retry}"
+                + (f": {html.escape(p['last_error'])}" if p["last_error"] else "")
+            )
+        if len(problems) > MONITORING_STATUS_LIMIT:
+            lines.append(f"... и ещё {len(problems) - MONITORING_STATUS_LIMIT}")
+
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@router.message(Command("rebuild_chat_summary"))
+async def cmd_rebuild_chat_summary(message: types.Message, command: CommandObject):
+    account_ids = None
+    if command.args:
+        alias = command.args.strip()
+        account = await get_telegram_account_by_alias_for_admin(alias)
+        if not account:
+            await message.answer(
+                f"Аккаунт <b>{html.escape(alias)}</b> не найден.", parse_mode="HTML"
+            )
+            return
+        account_ids = [account["id"]]
+
+    await message.answer("Пересчитываем сводку чатов...")
+    try:
+        # пересборка синхронная (как в миграции) — уводим из event loop
+        chats = await asyncio.to_thread(rebuild_chat_summaries, engine, account_ids)
+    except Exception as e:
+        logger.exception("Ошибка при пересборке сводки чатов")
+        await message.answer(f"Ошибка при пересборке сводки чатов: {e}")
+        return
+    await message.answer(f"Сводка чатов пересобрана: {chats} чатов.")
+
+
+def _format_retention_report(report: dict) -> str:
+    return (
+        f"Последняя очистка {report['started_at']:%Y-%m-%d %H:%M} UTC "
+        f"({report['seconds']} сек.): удалено сообщений {report['messages']}, "
+        f"медиа {report['media']}, файлов {report['files']} "
+        f"(без ссылок {report.get('orphan_blobs', 0)}), "
+        f"освобождено {report['freed_bytes'] / 1024 / 1024:.1f} МБ; "
+        f"в холодный архив {report['archived']} сообщений "
+        f"({report['segments']} сегментов, {report['archive_bytes'] / 1024 / 1024:.1f} МБ)"
+    )
+
+
+def _parse_retention_days(value: str) -> int | None:
+    # default — вернуть глобальную политику, 0 — хранить бессрочно
+    if value.lower() == "default":
+        return None
+    days = int(value)
+    if days < 0:
+        raise ValueError(value)
+    return days
+
+
+@router.message(Command("retention"))
+async def cmd_retention(message: types.Message, command: CommandObject):
+    """
+    /retention — сроки хранения и итог последней очистки
+    /retention run — запустить очистку сейчас
+    /retention <alias> <текст, дней|default> <медиа, дней|default>
+    """
+    args = (command.args or "").split()
+    if args == ["run"]:
+        if retention_job.running:
+            await message.answer("Очистка уже идёт.")
+            return
+        await message.answer("Запущена очистка архива по сроку хранения...")
+        try:
+            report = await retention_job.run_once()
+        except Exception as e:
+            logger.exception("Ошибка очистки архива")
+            await message.answer(f"Ошибка очистки архива: {e}")
+            return
+        await message.answer(_format_retention_report(report))
+        return
+
+    if args:
+        if len(args) != 3:
+            await message.answer(
+                "Использование: /retention <alias> <текст, дней|default> <медиа, дней|default>"
+            )
+            return
+        account = await get_telegram_account_by_alias_for_admin(args[0])
+        if not account:
+            await message.answer(
+                f"Аккаунт <b>{html.escape(args[0])}</b> не найден.", parse_mode="HTML"
+            )
+            return
+        try:
+            text_days = _parse_retention_days(args[1])
+            media_days = _parse_retention_days(args[2])
+        except ValueError:
+            await message.answer("Срок — целое число дней (0 — бессрочно) или default.")
+            return
+        await set_account_retention(account["id"], text_days, media_days)
+        await message.answer(
+            f"Срок хранения для <b>{html.escape(account['alias'])}</b> сохранён, "
+            "применится при следующей очистке.",
+            parse_mode="HTML",
+        )
+        return
+
+    def days(value):
+        return f"{value} дн." if value else "бессрочно"
+
+    lines = [
+        "<b>Срок хранения архива</b>",
+        f"По умолчанию: текст — {days(retention_job.text_days)}, "
+        f"медиа — {days(retention_job.media_days)}",
+        "Холодный архив: "
+        + (
+            f"сообщения старше {retention_job.archive_days} дн."
+            if retention_job.archive_days
+            else "выключен"
+        ),
+    ]
+    for policy in await list_retention_policies():
+        if policy["text_days"] is None and policy["media_days"] is None:
+            continue
+        text_days = effective_days(policy["text_days"], retention_job.text_days)
+        media_days = effective_days(policy["media_days"], retention_job.media_days)
+        lines.append(
+            f"{html.escape(policy['alias'])}: текст — {days(text_days)}, "
+            f"медиа — {days(media_days)}"
+        )
+    if retention_job.running:
+        lines.append("\nОчистка идёт сейчас.")
+    elif retention_job.last_report:
+        lines.append("\n" + _format_retention_report(retention_job.last_report))
+    await message.answer("\n".join(lines), parse_mode="HTML")
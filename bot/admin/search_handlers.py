@@ -0,0 +1,154 @@
+import html
+import logging
+import re
+import uuid
+from datetime import datetime, timedelta
+
+from aiogram import F, Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+
+from db.services.async_search_crud import SEARCH_LIMIT, search_messages
+from db.services.async_telegram_crud import get_telegram_account_by_alias_for_admin
+from db.services.async_user_crud import get_authorized_user
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+SEARCH_HELP = (
+    "<b>Поиск по архиву:</b>\n"
+    "<code>/search слова [account:alias] [chat:id] [from:имя|id] "
+    "[since:2024-01-31] [until:2024-02-29] [deleted]</code>\n\n"
+    "Ищутся сообщения, где есть все слова (последнее — по началу слова). "
+    "В inline-режиме: <code>@бот search слова ...</code>"
+)
+
+# Сколько символов текста показывать в результате
+SNIPPET_LEN = 200
+
+_FILTER = re.compile(r"^(account|chat|from|since|until):(.+)$")
+
+
+def parse_search_query(raw: str) -> dict:
+    """
+    Разбирает строку поиска: фильтры вида key:value и флаг deleted,
+    остальное — искомые слова. Ошибка в фильтре — ValueError с текстом для пользователя.
+    """
+    params = {"words": [], "deleted_only": False}
+    for token in raw.split():
+        match = _FILTER.match(token)
+        if token.lower() == "deleted":
+            params["deleted_only"] = True
+        elif not match:
+            params["words"].append(token)
+        elif match.group(1) == "chat":
+            try:
+                params["chat_id"] = int(match.group(2))
+            except ValueError:
+                raise ValueError("chat: — числовой ID чата")
+        elif match.group(1) in ("since", "until"):
+            try:
+                day = datetime.strptime(match.group(2), "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"{match.group(1)}: — дата в формате ГГГГ-ММ-ДД")
+            if match.group(1) == "since":
+                params["date_from"] = day
+            else:
+                params["date_to"] = day + timedelta(days=1)  # включительно
+        else:
+            params[match.group(1)] = match.group(2)
+    params["query"] = " ".join(params.pop("words"))
+    return params
+
+
+async def run_search(raw: str, offset: int = 0) -> list[dict]:
+    """Поиск по строке запроса с фильтрами; alias аккаунта переводится в id."""
+    params = parse_search_query(raw)
+    alias = params.pop("account", None)
+    if alias:
+        account = await get_telegram_account_by_alias_for_admin(alias)
+        if not account:
+            raise ValueError(f"аккаунт {alias} не найден")
+        params["account_id"] = account["id"]
+    params["sender"] = params.pop("from", None)
+    return await search_messages(**params, offset=offset)
+
+
+def _format_result(m: dict) -> str:
+    date = m["date"].strftime("%Y-%m-%d %H:%M") if m["date"] else "—"
+    snippet = (m["text"] or "")[:SNIPPET_LEN]
+    return (
+        f"<b>{html.escape(m['chat_name'])}</b> (<code>{m['chat_id']}</code>, "
+        f"акк. {m['account_id']}) {date}"
+        + (" 🗑" if m["deleted_at"] else "")
+        + f"\n{html.escape(m['sender_name'] or str(m['sender_id'] or ''))}: "
+        + html.escape(snippet)
+    )
+
+
+@router.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject):
+    if not command.args:
+        await message.answer(SEARCH_HELP, parse_mode="HTML")
+        return
+    try:
+        results = await run_search(command.args)
+    except ValueError as e:
+        await message.answer(f"Ошибка в запросе: {e}")
+        return
+    if not results:
+        await message.answer("Ничего не найдено.")
+        return
+
+    lines = [_format_result(m) for m in results]
+    if len(results) == SEARCH_LIMIT:
+        lines.append(f"\nПоказаны первые {SEARCH_LIMIT}, уточните запрос или фильтры.")
+    await message.answer("\n\n".join(lines), parse_mode="HTML")
+
+
+@router.inline_query(F.query.lower().startswith("search"))
+async def inline_search_handler(query: InlineQuery) -> None:
+    """Inline-поиск по архиву для админов: "search слова фильтры"."""
+    user = await get_authorized_user(query.from_user.id)
+    if not user or not user.is_admin:
+        await query.answer(
+            results=[],
+            switch_pm_text="Поиск доступен только админам",
+            switch_pm_parameter="login",
+            cache_time=1,
+            is_personal=True,
+        )
+        return
+
+    raw = query.query[len("search") :].strip()
+    offset = int(query.offset or 0)
+    try:
+        results = await run_search(raw, offset) if raw else []
+    except ValueError as e:
+        await query.answer(
+            results=[],
+            switch_pm_text=f"Ошибка в запросе: {e}"[:64],
+            switch_pm_parameter="search",
+            cache_time=1,
+            is_personal=True,
+        )
+        return
+
+    articles = [
+        InlineQueryResultArticle(
+            id=str(uuid.uuid4()),
+            title=f"{m['chat_name']}: {m['sender_name'] or m['sender_id'] or ''}",
+            description=(m["text"] or "")[:100],
+            input_message_content=InputTextMessageContent(
+                message_text=_format_result(m), parse_mode="HTML"
+            ),
+        )
+        for m in results
+    ]
+    await query.answer(
+        results=articles,
+        cache_time=1,
+        is_personal=True,
+        next_offset=str(offset + SEARCH_LIMIT) if len(results) == SEARCH_LIMIT else "",
+    )
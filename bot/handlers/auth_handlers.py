@@ -4,8 +4,7 @@ from aiogram.fsm.context import FSMContext
 
 from bot.FSM.states import AuthStates
 
-from db.database import SessionLocal
-from db.services.user_crud import login_user, logout_user, register_user
+from db.services.async_user_crud import login_user, logout_user, register_user
 from db.models.model import User
 
 router = Router()
@@ -54,22 +53,19 @@ async def get_password(message: types.Message, state: FSMContext):
     username = data["username"]
 
     # записываем в БД
-    db = SessionLocal()
     try:
-        user = register_user(username=username, password=password, is_admin=False)
+        user = await register_user(
+            username=username, password=password, is_admin=False
+        )
         await message.answer(
             f"Регистрация прошла успешно!\n Что бы продолжить работу с ботом, войдите в профиль /login"
         )
     except ValueError as ve:
-        # Ловим ValueError, который выходит при существующем пользователя
-        await message.answer(
-            f"Ошибка регистрации: Пользователь уже существует! \n Введите /login для входа!"
-        )
+        # ValueError — с текстом для пользователя (например, очередь хэширования паролей переполнена)
+        await message.answer(f"Ошибка регистрации: {ve}")
     except Exception as e:
         # Ловим все остальные непредвиденные ошибки
         await message.answer(f"Произошла непредвиденная ошибка: {e}")
-    finally:
-        db.close()
     # очищаем состояние
     await state.clear()
 
@@ -104,9 +100,8 @@ async def login_password(message: types.Message, state: FSMContext):
     data = await state.get_data()  # получаем данные из временного хранилища
     username = data["username"]
 
-    db = SessionLocal()
     try:
-        session_obj: dict = login_user(
+        session_obj: dict = await login_user(
             username, password, telegram_user_id=message.from_user.id
         )
         await message.answer(
@@ -116,19 +111,14 @@ async def login_password(message: types.Message, state: FSMContext):
         await message.answer(f"Ошибка авторизации: {e}")
     except Exception as e:
         await message.answer(f"Неожиданная ошибка при входе: {e}")
-    finally:
-        db.close()
     await state.clear()  # Диалог закончен — сбрасываем состояние
 
 
 # ------------------- LOGOUT -------------------
 @router.message(Command("logout"))
 async def cmd_logout(message: types.Message):
-    db = SessionLocal()
     try:
-        logout_user(telegram_user_id=message.from_user.id)
+        await logout_user(telegram_user_id=message.from_user.id)
         await message.answer("Вы успешно разлогинились!")
     except ValueError as e:
         await message.answer(f"Ошибка логаута: {e}")
-    finally:
-        db.close()
@@ -18,7 +18,7 @@ from telethon import functions
 from config import settings
 from bot.FSM.states import GiveTgStates
 from db.models.model import User
-from db.services.telegram_crud import (
+from db.services.async_telegram_crud import (
     create_telegram_account,
     get_telegram_account_by_phone,
     get_telegram_account_by_alias,
@@ -209,12 +209,14 @@ async def give_tg_alias(message: types.Message, state: FSMContext, current_user:
     data = await state.get_data()
 
     # Проверяем, есть ли аккаунт по номеру телефона для данного пользователя
-    existing_account_by_phone = get_telegram_account_by_phone(
+    existing_account_by_phone = await get_telegram_account_by_phone(
         current_user.id, data["phone"]
     )
     if existing_account_by_phone:
         # Обновляем существующий аккаунт, снимая флаг is_taken (делаем аккаунт "свободным")
-        update_telegram_account(existing_account_by_phone, alias=alias, is_taken=False)
+        await update_telegram_account(
+            existing_account_by_phone, alias=alias, is_taken=False
+        )
         await message.answer(
             f"Аккаунт с номером телефона <code>{data['phone']}</code> сохранен.\n",
             f"под alias <code>{existing_account_by_phone['alias']}</code>.\n\n",
@@ -224,7 +226,7 @@ async def give_tg_alias(message: types.Message, state: FSMContext, current_user:
         return
 
     # Проверяем, не используется ли уже введённый alias для данного пользователя
-    existing_account = get_telegram_account_by_alias(current_user.id, alias)
+    existing_account = await get_telegram_account_by_alias(current_user.id, alias)
     if existing_account:
         await message.answer(
             f"Alias <code>{alias}</code> уже используется.\n"
@@ -234,7 +236,7 @@ async def give_tg_alias(message: types.Message, state: FSMContext, current_user:
         return  # Не очищаем состояние, ждём новое значение alias
 
     try:
-        create_telegram_account(
+        await create_telegram_account(
             user_id=current_user.id,
             alias=alias,
             phone=data["phone"],
@@ -307,13 +309,15 @@ async def give_tg_alias_2fa(
     data = await state.get_data()
 
     # Проверяем, есть ли аккаунт по номеру телефона для данного пользователя
-    existing_account_by_phone = get_telegram_account_by_phone(
+    existing_account_by_phone = await get_telegram_account_by_phone(
         current_user.id, data["phone"]
     )
 
     if existing_account_by_phone:
         # Обновляем существующий аккаунт, снимая флаг is_taken (делаем аккаунт "свободным")
-        update_telegram_account(existing_account_by_phone, alias=alias, is_taken=False)
+        await update_telegram_account(
+            existing_account_by_phone, alias=alias, is_taken=False
+        )
         await message.answer(
             f"Аккаунт с номером телефона <code>{data['phone']}</code> сохранен.\n"
             f"под alias <code>{alias}</code>.\n\n",
@@ -323,7 +327,7 @@ async def give_tg_alias_2fa(
         return
 
     # Проверяем, не используется ли уже введённый alias для данного пользователя
-    existing_account = get_telegram_account_by_alias(current_user.id, alias)
+    existing_account = await get_telegram_account_by_alias(current_user.id, alias)
     if existing_account:
         await message.answer(
             f"Alias <code>{alias}</code> уже используется.\n"
@@ -333,7 +337,7 @@ async def give_tg_alias_2fa(
         return  # Не очищаем состояние, ждём новое значение alias
 
     try:
-        create_telegram_account(
+        await create_telegram_account(
             user_id=current_user.id,
             alias=alias,
             phone=data["phone"],
@@ -14,7 +14,7 @@ from telethon.tl.functions.account import GetAuthorizationsRequest
 from config import settings
 from bot.core.bot_instance import bot
 from db.models.model import User
-from db.services.telegram_crud import (
+from db.services.async_telegram_crud import (
     get_telegram_account_by_alias,
     delete_telegram_account,
     update_telegram_account,
@@ -40,7 +40,7 @@ async def handle_take_tg_logic(user_id: int, alias: str, chat_id: int) -> str:
     - Возвращает строку, которую вызывающий код может отправить пользователю.
     """
 
-    account = get_telegram_account_by_alias(user_id=user_id,alias=alias)
+    account = await get_telegram_account_by_alias(user_id=user_id,alias=alias)
     if not account:
         return "Аккаунт не найден, проверьте alias и попробуйте заново."
 
@@ -108,7 +108,7 @@ async def poll_for_new_session(
                 f"Сессия аккаунта <b>{alias}</b> удалено кем-то. Удаляем из БД.",
                 parse_mode="HTML",
             )
-            delete_telegram_account(alias, phone)
+            await delete_telegram_account(alias, phone)
             await client.disconnect()
             return
         except FloodWaitError as e:
@@ -128,10 +128,10 @@ async def poll_for_new_session(
             # Новая сессия обнаружена
             logger.info(f"New session detected for alias={alias}, phone={phone}")
             # Получаем объект аккаунта по user_id и alias
-            account = get_telegram_account_by_alias(user_id=user_id, alias=alias)
+            account = await get_telegram_account_by_alias(user_id=user_id, alias=alias)
             if account:
                 # Обновляем запись, устанавливая is_taken=True
-                update_telegram_account(account, is_taken=True)
+                await update_telegram_account(account, is_taken=True)
             else:
                 logger.error(f"Аккаунт с alias={alias} не найден для обновления.")
             await bot.send_message(
@@ -183,7 +183,7 @@ async def listen_for_code_and_check_session(
             f"Сессия аккаунта <b>{alias}</b> уже отозвана. Удаляем из БД.",
             parse_mode="HTML",
         )
-        delete_telegram_account(alias, phone)
+        await delete_telegram_account(alias, phone)
         await client.disconnect()
         return
     except Exception as e:
@@ -231,7 +231,7 @@ async def listen_for_code_and_check_session(
             f"Сессия аккаунта <b>{alias}</b> была отозвана. Удаляем из БД.",
             parse_mode="HTML",
         )
-        delete_telegram_account(alias, phone)
+        await delete_telegram_account(alias, phone)
         await client.disconnect()
     except Exception as e:
         logger.exception(f"Unhandled error in run_until_disconnected: {e}")
@@ -1,7 +1,7 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from db.models.model import User
-from db.services.telegram_crud import (
+from db.services.async_telegram_crud import (
     list_telegram_accounts,
     get_user_by_telegram_id,
 )
@@ -26,7 +26,7 @@ async def inline_view_tg_handler(query: InlineQuery) -> None:
         return  # пропускаем остальные inline-запросы
 
     # Пытаемся найти данные пользователя в БД
-    user_data = get_user_by_telegram_id(query.from_user.id)
+    user_data = await get_user_by_telegram_id(query.from_user.id)
     print(user_data['telegram_user_id'])
     if not user_data:
         # Если пользователь не найден (не авторизован и т.д.)
@@ -41,7 +41,7 @@ async def inline_view_tg_handler(query: InlineQuery) -> None:
         return
 
     # Получаем список аккаунтов
-    accounts = list_telegram_accounts(user_id=user_data['user_id'])
+    accounts = await list_telegram_accounts(user_id=user_data['user_id'])
     # фильтрация аккаунтов, с параметро is_taken = True
     accounts = [acc for acc in accounts if not acc.get("is_taken", False)] 
     # Формируем результаты для inline-запроса
@@ -87,7 +87,7 @@ def _build_inline_article(acc: dict) -> InlineQueryResultArticle:
 
 @router.message(Command("view_tg"))
 async def cmd_view_tg(message: types.Message, current_user: User) -> None:
-    accounts = list_telegram_accounts(user_id=current_user.id)
+    accounts = await list_telegram_accounts(user_id=current_user.id)
     if not accounts:
         await message.answer("Аккаунты не найдены!")
     else:
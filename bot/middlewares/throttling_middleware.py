@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Команды, которые ходят в БД целыми таблицами или открывают Telethon-соединения:
+# для них отдельный лимит на пользователя и общий лимит одновременных вызовов.
+# Сообщения — "/команда", callback — префикс callback_data, inline — первое слово запроса
+# (inline "search" сюда не входит: запрос приходит на каждую набранную букву)
+expensive_commands = {
+    "/view_users",
+    "/view_tg",
+    "/take_tg",
+    "/kill_session",
+    "/search",
+    "/monitoring_status",
+    "/rebuild_chat_summary",
+    "/retention",
+    "take_tg",
+    "users",
+    "view_tg",
+}
+
+# Сколько пользователей помнить (самые давние забываются первыми)
+MAX_TRACKED_USERS = 10000
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше burst про запас."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Берёт токен. Возвращает 0, если удалось, иначе — сколько секунд ждать."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты запросов (сообщения, callback- и inline-запросы).
+
+    У каждого пользователя общий bucket на все запросы (rate в секунду,
+    burst подряд) и отдельный, более строгий, на каждую дорогую команду
+    (expensive_commands). Дорогих команд одновременно выполняется не больше
+    concurrency на весь бот. Лишний запрос до хендлеров не доходит —
+    пользователь получает короткий ответ "подождите" (на сообщения —
+    не чаще раза в окно ожидания, чтобы не отвечать на каждое).
+
+    Регистрируется как outer-middleware: срабатывает раньше фильтров
+    и AuthMiddleware, отброшенный запрос не трогает БД.
+    """
+
+    def __init__(
+        self,
+        rate: float = settings.THROTTLE_RATE,
+        burst: int = settings.THROTTLE_BURST,
+        command_rate: float = settings.THROTTLE_COMMAND_RATE,
+        command_burst: int = settings.THROTTLE_COMMAND_BURST,
+        concurrency: int = settings.THROTTLE_EXPENSIVE_CONCURRENCY,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.command_rate = command_rate
+        self.command_burst = command_burst
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # user_id -> {"": общий bucket, команда: bucket команды, ...}
+        self._buckets: "OrderedDict[int, Dict[str, TokenBucket]]" = OrderedDict()
+        # user_id -> до какого момента не отвечать повторно на сообщения
+        self._warned_until: Dict[int, float] = {}
+        self.throttled = 0
+        self.busy = 0
+        self.running = 0
+
+    def _user_buckets(self, user_id: int) -> Dict[str, TokenBucket]:
+        buckets = self._buckets.get(user_id)
+        if buckets is None:
+            buckets = self._buckets[user_id] = {"": TokenBucket(self.rate, self.burst)}
+            while len(self._buckets) > MAX_TRACKED_USERS:
+                old_id, _ = self._buckets.popitem(last=False)
+                self._warned_until.pop(old_id, None)
+        else:
+            self._buckets.move_to_end(user_id)
+        return buckets
+
+    def _check(self, user_id: int, command: Optional[str]) -> float:
+        """0 — запрос можно выполнять, иначе — сколько секунд подождать."""
+        buckets = self._user_buckets(user_id)
+        wait = buckets[""].take()
+        if wait or command not in expensive_commands:
+            return wait
+        bucket = buckets.get(command)
+        if bucket is None:
+            bucket = buckets[command] = TokenBucket(
+                self.command_rate, self.command_burst
+            )
+        return bucket.take()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return await handler(event, data)
+
+        command = _command(event)
+        wait = self._check(user.id, command)
+        if wait:
+            self.throttled += 1
+            text = f"Слишком часто, подождите {math.ceil(wait)} сек."
+            await self._slow_down(event, user.id, text, wait)
+            return
+
+        if command not in expensive_commands:
+            return await handler(event, data)
+        if self._semaphore.locked():
+            self.busy += 1
+            text = "Бот занят, повторите через несколько секунд."
+            await self._slow_down(event, user.id, text, 5)
+            return
+        async with self._semaphore:
+            self.running += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.running -= 1
+
+    async def _slow_down(
+        self, event: TelegramObject, user_id: int, text: str, wait: float
+    ) -> None:
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(text)
+            elif isinstance(event, InlineQuery):
+                await event.answer(
+                    results=[],
+                    switch_pm_text=text,
+                    switch_pm_parameter="start",
+                    cache_time=1,
+                    is_personal=True,
+                )
+            elif isinstance(event, Message):
+                now = time.monotonic()
+                if self._warned_until.get(user_id, 0) <= now:
+                    self._warned_until[user_id] = now + max(wait, 1)
+                    await event.answer(text)
+        except Exception as e:
+            logger.debug("ThrottlingMiddleware: не удалось ответить: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._buckets),
+            "throttled": self.throttled,
+            "busy": self.busy,
+            "running": self.running,
+        }
+
+
+def _command(event: TelegramObject) -> Optional[str]:
+    """Ключ команды запроса для лимитов (см. expensive_commands)."""
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            # "/view_tg@bot аргументы" -> "/view_tg"
+            return event.text.split()[0].split("@")[0].lower()
+        return None
+    if isinstance(event, CallbackQuery):
+        return (event.data or "").split(":")[0] or None
+    if isinstance(event, InlineQuery):
+        words = event.query.split()
+        return words[0].lower() if words else None
+    return None
+
+
+# Общий ограничитель для сообщений, callback- и inline-запросов
+throttling_middleware = ThrottlingMiddleware()
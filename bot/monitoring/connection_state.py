@@ -0,0 +1,161 @@
+import enum
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = settings.MONITORING_BACKOFF_BASE
+BACKOFF_MAX = settings.MONITORING_BACKOFF_MAX
+MAX_FAILURES = settings.MONITORING_MAX_FAILURES
+STABLE_AFTER = settings.MONITORING_STABLE_AFTER
+
+
+class ConnectionState(str, enum.Enum):
+    CONNECTING = "connecting"  # идёт подключение
+    LIVE = "live"  # подключён и авторизован
+    DEGRADED = "degraded"  # соединение потеряно, переподключаемся
+    BACKING_OFF = "backing_off"  # ждём следующей попытки после ошибки
+    DEAD = "dead"  # попытки прекращены (сессия отозвана / лимит ошибок)
+
+
+_ERROR_STATES = (
+    ConnectionState.DEGRADED,
+    ConnectionState.BACKING_OFF,
+    ConnectionState.DEAD,
+)
+
+
+def backoff_delay(failures: int) -> float:
+    """Экспоненциальная задержка с jitter: base * 2^(n-1), не больше BACKOFF_MAX."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, failures - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class AccountConnection:
+    """Состояние подключения одного аккаунта мониторинга."""
+
+    def __init__(self, account_id: int, version=None):
+        self.account_id = account_id
+        # версия строки аккаунта (updated_at): её изменение снова запускает dead-аккаунт
+        self.version = version
+        self.state = ConnectionState.CONNECTING
+        self.failures = 0
+        self.next_attempt_at = 0.0  # time.monotonic()
+        self.live_since: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.changed_at = time.time()
+
+    def _set(self, state: ConnectionState) -> None:
+        if state != self.state:
+            logger.info(
+                "account_id=%d: %s -> %s%s",
+                self.account_id,
+                self.state.value,
+                state.value,
+                f" ({self.last_error})" if state in _ERROR_STATES else "",
+            )
+            self.state = state
+            self.changed_at = time.time()
+
+    def is_due(self, now: float) -> bool:
+        """Можно ли сейчас запускать подключение."""
+        if self.state == ConnectionState.DEAD:
+            return False
+        return self.next_attempt_at <= now
+
+    def mark_connecting(self) -> None:
+        self._set(ConnectionState.CONNECTING)
+
+    def is_stable(self) -> bool:
+        """Соединение живёт не меньше STABLE_AFTER секунд."""
+        return (
+            self.live_since is not None
+            and time.monotonic() - self.live_since >= STABLE_AFTER
+        )
+
+    def mark_live(self) -> None:
+        # счётчик ошибок сбрасывается только после стабильной работы (mark_healthy),
+        # иначе аккаунт, который падает сразу после подключения, никогда не станет dead
+        self.last_error = None
+        if self.live_since is None:
+            self.live_since = time.monotonic()
+        self._set(ConnectionState.LIVE)
+
+    def mark_healthy(self) -> None:
+        """Проверка прошла успешно."""
+        if self.state != ConnectionState.LIVE:
+            self.mark_live()
+        if self.is_stable():
+            self.failures = 0
+
+    def mark_degraded(self, reason: str) -> None:
+        self.last_error = reason
+        self._set(ConnectionState.DEGRADED)
+
+    def mark_dropped(self, reason: str) -> None:
+        """
+        Клиент отключился сам. Если соединение было стабильным — переподключаемся
+        сразу, если упало вскоре после подключения — считаем это ошибкой (backoff).
+        """
+        stable = self.is_stable()
+        self.live_since = None
+        if stable:
+            self.failures = 0
+            self.last_error = reason
+            self.next_attempt_at = 0.0
+            self._set(ConnectionState.DEGRADED)
+        else:
+            self.mark_failed(reason)
+
+    def mark_failed(self, error: str) -> None:
+        self.failures += 1
+        self.last_error = error
+        self.live_since = None
+        if self.failures >= MAX_FAILURES:
+            self._set(ConnectionState.DEAD)
+            return
+        delay = backoff_delay(self.failures)
+        self.next_attempt_at = time.monotonic() + delay
+        self._set(ConnectionState.BACKING_OFF)
+        logger.warning(
+            "account_id=%d: ошибка %d/%d, следующая попытка через %.0f сек.: %s",
+            self.account_id,
+            self.failures,
+            MAX_FAILURES,
+            delay,
+            error,
+        )
+
+    def mark_dead(self, reason: str) -> None:
+        self.last_error = reason
+        self.live_since = None
+        self._set(ConnectionState.DEAD)
+
+    def to_dict(self) -> dict:
+        retry_in = None
+        if self.state in (ConnectionState.BACKING_OFF, ConnectionState.DEGRADED):
+            retry_in = max(0.0, self.next_attempt_at - time.monotonic())
+        return {
+            "account_id": self.account_id,
+            "state": self.state.value,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "retry_in": retry_in,
+            "changed_at": self.changed_at,
+        }
+
+
+# account_id -> состояние подключения
+connection_states: Dict[int, AccountConnection] = {}
+
+
+def connection_summary() -> dict:
+    """Количество аккаунтов в каждом состоянии."""
+    summary = {state.value: 0 for state in ConnectionState}
+    for conn in connection_states.values():
+        summary[conn.state.value] += 1
+    return summary
@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from config import settings
+from db.services.async_telegram_crud import (
+    bulk_create_telegram_messages,
+    create_telegram_message,
+    mark_deleted_messages,
+    update_messages_media,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MessageIngestQueue:
+    """
+    Очередь отложенной записи (write-behind) сообщений из всех Telethon-клиентов.
+
+    Хендлеры только кладут словарь сообщения в очередь, а фоновая задача
+    собирает пачки и пишет их в БД одним INSERT + одним commit.
+    Пачка сбрасывается, когда набралось batch_size сообщений
+    или прошло flush_interval секунд с первого сообщения в пачке.
+
+    Через ту же очередь идут обновления медиа (put_media_update): они
+    применяются после INSERT своей пачки, поэтому строка сообщения,
+    поставленная раньше, к этому моменту уже записана.
+    Удаления (put_deletions) за то же окно сливаются в один UPDATE на аккаунт
+    и применяются последними.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+        flush_interval: float = settings.INGEST_FLUSH_INTERVAL,
+        max_size: int = settings.INGEST_MAX_QUEUE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # метрики
+        self.enqueued = 0
+        self.committed = 0
+        self.duplicates = 0  # уже были в БД (повторная доставка)
+        self.failed = 0
+        self.media_updates = 0
+        self.deleted = 0
+        self.batches = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+
+    def start(self) -> None:
+        """Запускает фоновую задачу записи (вызывать внутри работающего event loop)."""
+        if self._task and not self._task.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "MessageIngestQueue: запущена (batch=%d, interval=%.2f сек.)",
+            self.batch_size,
+            self.flush_interval,
+        )
+
+    async def put(self, message: dict) -> None:
+        """
+        Кладёт сообщение в очередь. Если очередь переполнена — ждёт,
+        пока фоновая задача освободит место (backpressure).
+        """
+        if self._queue is None or self._closing:
+            raise RuntimeError("MessageIngestQueue не запущена")
+        await self._queue.put(message)
+        self.enqueued += 1
+
+    async def put_media_update(self, update: dict) -> None:
+        """
+        Кладёт результат скачивания медиа: account_id, chat_id, message_id,
+        media_state и (необязательно) media_path, media_size, media_blob_id.
+        redownload — что делать, если blob успели удалить до записи ссылки:
+        вызывается без аргументов, возвращает обновление для записи вместо
+        этого или None (загрузка поставлена заново).
+        """
+        if self._queue is None or self._closing:
+            raise RuntimeError("MessageIngestQueue не запущена")
+        await self._queue.put(("media", update))
+
+    async def put_deletions(
+        self, account_id: int, message_ids: list[int], chat_id: Optional[int] = None
+    ) -> None:
+        """Кладёт удалённые сообщения аккаунта (в личке chat_id неизвестен)."""
+        if self._queue is None or self._closing:
+            raise RuntimeError("MessageIngestQueue не запущена")
+        await self._queue.put(("deleted", (account_id, chat_id, list(message_ids))))
+
+    async def flush(self) -> None:
+        """Дожидается записи в БД всего, что было положено в очередь до вызова."""
+        if self._queue is None or not self._task or self._task.done():
+            return
+        marker = asyncio.get_running_loop().create_future()
+        await self._queue.put(marker)
+        await marker
+
+    async def drain(self) -> None:
+        """
+        Останавливает приём новых сообщений, записывает всё, что осталось
+        в очереди, и завершает фоновую задачу. Вызывается из on_shutdown.
+        """
+        if self._queue is None or not self._task:
+            return
+        self._closing = True
+        if not self._task.done():
+            await self._queue.put(None)  # будим задачу, если она ждёт
+            await self._task
+        logger.info("MessageIngestQueue: очередь сброшена, %s", self.stats())
+
+    def stats(self) -> dict:
+        """Текущее состояние очереди: глубина, количество записей, задержка commit."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "enqueued": self.enqueued,
+            "committed": self.committed,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "media_updates": self.media_updates,
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "last_commit_ms": round(self.last_commit_ms, 1),
+            "avg_commit_ms": (
+                round(self._total_commit_ms / self.batches, 1) if self.batches else 0.0
+            ),
+            "max_commit_ms": round(self.max_commit_ms, 1),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch: list[dict] = []
+        updates: list[dict] = []
+        # (account_id, chat_id) -> id удалённых сообщений за окно
+        deletions: dict[tuple, list[int]] = {}
+        waiters: list[asyncio.Future] = []
+        deadline = None
+
+        def take(item) -> None:
+            nonlocal deadline
+            if isinstance(item, asyncio.Future):
+                waiters.append(item)
+                return
+            if isinstance(item, dict):
+                batch.append(item)
+            elif isinstance(item, tuple) and item[0] == "media":
+                updates.append(item[1])
+            elif isinstance(item, tuple) and item[0] == "deleted":
+                account_id, chat_id, message_ids = item[1]
+                deletions.setdefault((account_id, chat_id), []).extend(message_ids)
+            else:
+                return
+            if deadline is None:
+                deadline = loop.time() + self.flush_interval
+
+        while True:
+            # Ждём либо первое сообщение пачки, либо окончание интервала
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = False  # интервал истёк
+
+            stop = item is None
+            take(item)
+
+            if (
+                stop
+                or waiters
+                or item is False
+                or len(batch) + len(updates) + len(deletions) >= self.batch_size
+            ):
+                if stop:
+                    # забираем всё, что успели положить до остановки
+                    while not self._queue.empty():
+                        take(self._queue.get_nowait())
+                while batch:
+                    chunk, batch = batch[: self.batch_size], batch[self.batch_size :]
+                    await self._commit(chunk)
+                if updates:
+                    await self._commit_media(updates)
+                    updates = []
+                if deletions:
+                    await self._commit_deletions(deletions)
+                    deletions = {}
+                for w in waiters:
+                    if not w.done():
+                        w.set_result(None)
+                waiters = []
+                deadline = None
+                if stop:
+                    return
+
+    async def _commit(self, batch: list[dict]) -> None:
+        started = time.perf_counter()
+        try:
+            inserted = await bulk_create_telegram_messages(batch)
+            self.committed += len(batch)
+            if inserted >= 0:
+                self.duplicates += len(batch) - inserted
+        except Exception as e:
+            logger.error(
+                "MessageIngestQueue: ошибка пакетной записи (%d сообщений): %s. "
+                "Пишем по одному.",
+                len(batch),
+                e,
+                exc_info=True,
+            )
+            # Пишем по одному, чтобы одна плохая строка не потеряла всю пачку
+            for row in batch:
+                try:
+                    result = await create_telegram_message(**row)
+                except Exception as row_error:
+                    logger.error(
+                        "MessageIngestQueue: сообщение message_id=%s не записано: %s",
+                        row.get("message_id"),
+                        row_error,
+                    )
+                    result = None
+                if result:
+                    self.committed += 1
+                else:
+                    self.failed += 1
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.last_commit_ms = elapsed_ms
+        self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+        self._total_commit_ms += elapsed_ms
+        logger.debug(
+            "MessageIngestQueue: записано %d сообщений за %.1f мс, в очереди %d",
+            len(batch),
+            elapsed_ms,
+            self._queue.qsize(),
+        )
+
+    async def _commit_media(self, updates: list[dict]) -> None:
+        try:
+            lost = await update_messages_media(updates)
+            self.media_updates += len(updates) - len(lost)
+            fallback = [
+                update
+                for update in (u["redownload"]() for u in lost if u.get("redownload"))
+                if update
+            ]
+            if lost:
+                logger.warning(
+                    "MessageIngestQueue: %d файлов медиа удалены до записи ссылки, "
+                    "скачиваются заново (%d не удалось)",
+                    len(lost),
+                    len(fallback),
+                )
+            if fallback:
+                await update_messages_media(fallback)
+                self.media_updates += len(fallback)
+        except Exception as e:
+            self.failed += len(updates)
+            logger.error(
+                "MessageIngestQueue: ошибка записи состояния медиа (%d): %s",
+                len(updates),
+                e,
+                exc_info=True,
+            )
+
+    async def _commit_deletions(self, deletions: dict[tuple, list[int]]) -> None:
+        for (account_id, chat_id), message_ids in deletions.items():
+            try:
+                self.deleted += await mark_deleted_messages(
+                    account_id, message_ids, chat_id
+                )
+            except Exception as e:
+                logger.error(
+                    "MessageIngestQueue: ошибка пометки удалённых (account_id=%s, %d id): %s",
+                    account_id,
+                    len(message_ids),
+                    e,
+                    exc_info=True,
+                )
+
+
+# Глобальная очередь, общая для всех Telethon-клиентов процесса
+ingest_queue = MessageIngestQueue()
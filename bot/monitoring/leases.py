@@ -0,0 +1,133 @@
+import os
+import math
+import time
+import socket
+import asyncio
+import logging
+from typing import Callable, Iterable, Optional
+
+from config import settings
+from db.services.async_lease_crud import (
+    claim_account_leases,
+    delete_instance,
+    heartbeat_instance,
+    release_account_leases,
+    renew_account_leases,
+)
+from db.services.async_telegram_crud import list_monitoring_account_ids
+
+logger = logging.getLogger(__name__)
+
+INSTANCE_ID = settings.INSTANCE_ID or f"{socket.gethostname()}:{os.getpid()}"
+LEASE_TTL = settings.LEASE_TTL
+
+
+class AccountLeases:
+    """
+    Аренда аккаунтов мониторинга этим экземпляром бота.
+
+    Каждые ttl/3 секунд: heartbeat экземпляра, продление своих аренд,
+    захват свободных/просроченных аккаунтов до справедливой доли
+    (ceil(аккаунтов / живых экземпляров)) и возврат лишних, чтобы новый
+    экземпляр получил свою часть. Об изменении набора сообщает on_change.
+    """
+
+    def __init__(self, owner_id: str = INSTANCE_ID, ttl: int = LEASE_TTL):
+        self.owner_id = owner_id
+        self.ttl = ttl
+        self.owned: set[int] = set()
+        self.instances = 1
+        self._last_renewed: Optional[float] = None  # time.monotonic()
+
+    async def refresh(self) -> set[int]:
+        """Один цикл heartbeat. Возвращает аккаунты, которыми владеет экземпляр."""
+        account_ids = set(await list_monitoring_account_ids())
+        self.instances = await heartbeat_instance(self.owner_id, self.ttl)
+
+        # мониторинг выключили — аренда больше не нужна
+        gone = self.owned - account_ids
+        if gone:
+            await release_account_leases(self.owner_id, gone)
+
+        owned = await renew_account_leases(self.owner_id, account_ids, self.ttl)
+        self._last_renewed = time.monotonic()
+        lost = self.owned - owned - gone
+        if lost:
+            logger.warning(
+                "AccountLeases: аренда потеряна (забрал другой экземпляр): %s",
+                sorted(lost),
+            )
+
+        fair_share = math.ceil(len(account_ids) / self.instances)
+        if len(owned) < fair_share:
+            owned |= await claim_account_leases(
+                self.owner_id,
+                sorted(account_ids - owned),
+                self.ttl,
+                fair_share - len(owned),
+            )
+        elif len(owned) > fair_share:
+            # отдаём лишние — их заберут экземпляры, у которых меньше доли
+            excess = set(sorted(owned)[fair_share:])
+            await release_account_leases(self.owner_id, excess)
+            owned -= excess
+            logger.info(
+                "AccountLeases: отдано %d аккаунтов (доля %d на %d экземпляров)",
+                len(excess),
+                fair_share,
+                self.instances,
+            )
+        return owned
+
+    async def run(self, on_change: Callable[[Iterable[int]], None]) -> None:
+        """
+        Бесконечный цикл аренды. Если продлить аренду не удаётся дольше ttl,
+        экземпляр отказывается от всех аккаунтов, чтобы их не слушали дважды.
+        """
+        interval = self.ttl / 3
+        logger.info(
+            "AccountLeases: экземпляр %s, ttl %d сек.", self.owner_id, self.ttl
+        )
+        while True:
+            try:
+                owned = await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("AccountLeases: ошибка heartbeat: %s", e, exc_info=True)
+                expired = (
+                    self._last_renewed is None
+                    or time.monotonic() - self._last_renewed >= self.ttl
+                )
+                owned = set() if expired else self.owned
+            if owned != self.owned:
+                logger.info(
+                    "AccountLeases: аккаунтов %d (+%d/-%d), экземпляров %d",
+                    len(owned),
+                    len(owned - self.owned),
+                    len(self.owned - owned),
+                    self.instances,
+                )
+                self.owned = owned
+                on_change(owned)
+            await asyncio.sleep(interval)
+
+    async def release_all(self) -> None:
+        """Отдаёт все аккаунты экземпляра (вызывать после отключения клиентов)."""
+        try:
+            await release_account_leases(self.owner_id)
+            await delete_instance(self.owner_id)
+        except Exception as e:
+            logger.error("AccountLeases: ошибка при освобождении аренды: %s", e)
+        self.owned = set()
+
+    def stats(self) -> dict:
+        return {
+            "instance": self.owner_id,
+            "owned": len(self.owned),
+            "instances": self.instances,
+        }
+
+
+# Аренда аккаунтов этим экземпляром бота
+account_leases = AccountLeases()
@@ -0,0 +1,326 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+from collections import deque
+from functools import partial
+from typing import Dict, Optional
+
+from config import settings
+from bot.monitoring.ingest_queue import ingest_queue
+from bot.monitoring.media_store import (
+    find_blob,
+    store_file,
+    telegram_file_key,
+    temp_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+# media_state в telegram_messages (ещё "expired" — файл удалён по сроку
+# хранения, см. async_retention_crud)
+MEDIA_PENDING = "pending"
+MEDIA_DONE = "done"
+MEDIA_SKIPPED = "skipped"
+MEDIA_FAILED = "failed"
+
+
+class _RateLimiter:
+    """Общий лимит скорости скачивания (token bucket по байтам в секунду)."""
+
+    def __init__(self, rate: int):
+        self.rate = rate  # байт/сек., 0 — без лимита
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def consume(self, amount: int) -> None:
+        if not self.rate or amount <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens < 0:
+                # держим lock, чтобы остальные загрузки тоже ждали общий лимит
+                await asyncio.sleep(-self._tokens / self.rate)
+
+
+class MediaDownloadPool:
+    """
+    Пул фоновых загрузок медиа из всех Telethon-клиентов процесса.
+
+    Хендлер сразу пишет сообщение с media_state="pending" и отдаёт загрузку
+    сюда. У каждого аккаунта своя очередь, воркеры берут задачи по кругу
+    (один аккаунт с сотней видео не задерживает остальные). Общие лимиты:
+    workers одновременных загрузок и max_rate байт/сек. Файлы больше лимита
+    своего типа не скачиваются (media_state="skipped", размер сохраняется).
+    Файлы сохраняются в хранилище по хэшу (media_store): уже известный
+    Telegram-файл не скачивается повторно.
+    Результат уходит в БД через ingest_queue после строки сообщения.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.MEDIA_WORKERS,
+        max_rate_kb: int = settings.MEDIA_MAX_RATE_KB,
+        max_pending: int = settings.MEDIA_MAX_PENDING,
+        size_limits_mb: Optional[Dict[str, int]] = None,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.size_limits_mb = (
+            settings.MEDIA_SIZE_LIMITS_MB if size_limits_mb is None else size_limits_mb
+        )
+        self._limiter = _RateLimiter(max_rate_kb * 1024)
+
+        # account_id -> очередь задач; _ready — аккаунты с задачами по кругу
+        self._pending: Dict[int, deque] = {}
+        self._ready: deque[int] = deque()
+        self._jobs: Optional[asyncio.Semaphore] = None
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        # file_key -> загрузка, которая уже идёт (ждём её, а не качаем второй раз)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # метрики
+        self.active = 0
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.reused = 0  # файл уже был в хранилище
+        self.downloaded_bytes = 0
+
+    def start(self) -> None:
+        """Запускает воркеры (вызывать внутри работающего event loop)."""
+        if self._tasks:
+            return
+        self._closing = False
+        self._jobs = asyncio.Semaphore(0)
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        logger.info(
+            "MediaDownloadPool: запущен (воркеров %d, лимит %s КБ/с, размеры %s МБ)",
+            self.workers,
+            self._limiter.rate // 1024 or "нет",
+            self.size_limits_mb,
+        )
+
+    def admit(self, account_id: int, media_type: str, size: Optional[int]) -> str:
+        """
+        Решает, скачивать ли файл: MEDIA_PENDING (нужно вызвать submit)
+        или MEDIA_SKIPPED (лимит размера / переполнена очередь аккаунта).
+        """
+        limit_mb = self.size_limits_mb.get(media_type)
+        if limit_mb is not None and (
+            limit_mb == 0 or (size is not None and size > limit_mb * 1024 * 1024)
+        ):
+            self.skipped += 1
+            return MEDIA_SKIPPED
+        if (
+            self._jobs is None
+            or self._closing
+            or len(self._pending.get(account_id, ())) >= self.max_pending
+        ):
+            self.skipped += 1
+            return MEDIA_SKIPPED
+        return MEDIA_PENDING
+
+    def submit(
+        self, account_id: int, chat_id: int, message_id: int, media_type: str, message
+    ) -> None:
+        """Ставит загрузку в очередь аккаунта (после того, как строка сообщения в ingest_queue)."""
+        self._enqueue(
+            {
+                "account_id": account_id,
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "media_type": media_type,
+                "message": message,
+            }
+        )
+
+    def _enqueue(self, job: dict) -> None:
+        queue = self._pending.get(job["account_id"])
+        if queue is None:
+            queue = self._pending[job["account_id"]] = deque()
+            self._ready.append(job["account_id"])
+        queue.append(job)
+        self._jobs.release()
+
+    def _redownload(self, job: dict) -> Optional[dict]:
+        """
+        Blob, записанный для сообщения, удалила очистка раньше, чем ссылка
+        дошла до БД (update_messages_media вернул обновление): качаем заново.
+        Один раз — если и повторная попытка не удалась или пул остановлен,
+        возвращает обновление с media_state="failed" для записи.
+        """
+        if job.get("redownload") or self._jobs is None or self._closing:
+            self.failed += 1
+            return {
+                "account_id": job["account_id"],
+                "chat_id": job["chat_id"],
+                "message_id": job["message_id"],
+                "media_state": MEDIA_FAILED,
+            }
+        self._enqueue(dict(job, redownload=True))
+        return None
+
+    def _next_job(self) -> dict:
+        account_id = self._ready.popleft()
+        queue = self._pending[account_id]
+        job = queue.popleft()
+        if queue:
+            self._ready.append(account_id)
+        else:
+            del self._pending[account_id]
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            await self._jobs.acquire()
+            if not self._ready:
+                continue  # очередь очищена при остановке
+            job = self._next_job()
+            self.active += 1
+            try:
+                update = await self._download(job)
+            finally:
+                self.active -= 1
+            try:
+                await ingest_queue.put_media_update(update)
+            except RuntimeError:
+                logger.warning(
+                    "MediaDownloadPool: очередь записи остановлена, состояние медиа "
+                    "message_id=%d не сохранено",
+                    job["message_id"],
+                )
+
+    async def _download(self, job: dict) -> dict:
+        update = {
+            "account_id": job["account_id"],
+            "chat_id": job["chat_id"],
+            "message_id": job["message_id"],
+        }
+        file_key = telegram_file_key(job["message"])
+
+        # Этот файл уже есть в хранилище — не качаем повторно
+        blob = await self._find_blob(file_key)
+        if blob is not None:
+            self.reused += 1
+        elif file_key in self._inflight:
+            # тот же файл прямо сейчас качается для другого сообщения
+            blob = await asyncio.shield(self._inflight[file_key])
+            if blob is not None:
+                self.reused += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            if file_key:
+                self._inflight[file_key] = waiter
+            try:
+                blob = await self._fetch(job, file_key)
+            finally:
+                # при отмене/ошибке ждущие получат None и пометят медиа как failed
+                if not waiter.done():
+                    waiter.set_result(blob)
+                self._inflight.pop(file_key, None)
+
+        if blob is None:
+            self.failed += 1
+            update["media_state"] = MEDIA_FAILED
+            return update
+
+        self.done += 1
+        update.update(
+            media_state=MEDIA_DONE,
+            media_path=blob["path"],
+            media_size=blob["size"],
+            media_blob_id=blob["id"],
+            redownload=partial(self._redownload, job),
+        )
+        return update
+
+    async def _find_blob(self, file_key: Optional[str]) -> Optional[dict]:
+        try:
+            return await find_blob(file_key)
+        except Exception as e:
+            logger.error("MediaDownloadPool: ошибка поиска файла %s: %s", file_key, e)
+            return None
+
+    async def _fetch(self, job: dict, file_key: Optional[str]) -> Optional[dict]:
+        """Скачивает файл во временную папку и переносит в хранилище по хэшу."""
+        received = 0
+
+        async def progress(current, total):
+            nonlocal received
+            await self._limiter.consume(current - received)
+            received = current
+
+        folder = None
+        try:
+            folder = temp_dir()
+            # Автоматически расширение добавится само
+            path = await job["message"].download_media(
+                file=folder, progress_callback=progress if self._limiter.rate else None
+            )
+            if not path:
+                raise RuntimeError("download_media ничего не вернул")
+            self.downloaded_bytes += os.path.getsize(path)
+            return await store_file(path, file_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                "MediaDownloadPool: ошибка скачивания медиа для сообщения %d: %s",
+                job["message_id"],
+                e,
+            )
+            return None
+        finally:
+            if folder:
+                shutil.rmtree(folder, ignore_errors=True)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Сбрасывает незапущенные загрузки (строки остаются pending), ждёт
+        текущие до timeout секунд и останавливает воркеры. Вызывать до
+        отключения клиентов и до ingest_queue.drain().
+        """
+        if not self._tasks:
+            return
+        self._closing = True
+        dropped = sum(len(queue) for queue in self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        deadline = time.monotonic() + timeout
+        while self.active and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(
+            "MediaDownloadPool: остановлен, не скачано (осталось pending) %d, %s",
+            dropped,
+            self.stats(),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(queue) for queue in self._pending.values()),
+            "active": self.active,
+            "done": self.done,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "reused": self.reused,
+            "downloaded_mb": round(self.downloaded_bytes / 1024 / 1024, 1),
+        }
+
+
+# Глобальный пул загрузок, общий для всех Telethon-клиентов процесса
+media_pool = MediaDownloadPool()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import asyncio
+import hashlib
+import logging
+import uuid
+from typing import Optional
+
+from config import settings
+from db.services.async_media_crud import (
+    get_media_blob_by_file_key,
+    get_or_create_media_blob,
+)
+
+logger = logging.getLogger(__name__)
+
+MEDIA_ROOT = os.path.join(settings.BASE_DIR, "media")
+# Файлы по содержимому: blobs/<первые 2 символа sha256>/<sha256><расширение>
+BLOB_ROOT = os.path.join(MEDIA_ROOT, "blobs")
+# Недокачанные файлы, пока не посчитан хэш
+TMP_ROOT = os.path.join(MEDIA_ROOT, "tmp")
+
+_CHUNK = 1024 * 1024
+
+
+def telegram_file_key(message) -> Optional[str]:
+    """
+    Telegram-id файла сообщения: один и тот же для пересланных копий
+    в любых чатах и аккаунтах.
+    """
+    if message.photo is not None:
+        return f"photo:{message.photo.id}"
+    if message.document is not None:
+        return f"document:{message.document.id}"
+    return None
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(sha256: str, ext: str) -> str:
+    return os.path.join(BLOB_ROOT, sha256[:2], sha256 + ext)
+
+
+async def find_blob(file_key: Optional[str]) -> Optional[dict]:
+    """Уже сохранённый blob для этого Telegram-файла (если файл на диске на месте)."""
+    if not file_key:
+        return None
+    blob = await get_media_blob_by_file_key(file_key)
+    if blob is None or not os.path.exists(blob["path"]):
+        return None
+    return blob
+
+
+def temp_dir() -> str:
+    """Отдельная временная папка под одну загрузку."""
+    path = os.path.join(TMP_ROOT, uuid.uuid4().hex)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+async def store_file(downloaded_path: str, file_key: Optional[str]) -> dict:
+    """
+    Переносит скачанный файл в хранилище по sha256. Если такой файл уже есть,
+    скачанная копия удаляется. Возвращает blob (id, path, size, ...).
+    """
+    sha256 = await asyncio.to_thread(_sha256_file, downloaded_path)
+    ext = os.path.splitext(downloaded_path)[1].lower()
+    path = blob_path(sha256, ext)
+    size = os.path.getsize(downloaded_path)
+
+    if os.path.exists(path):
+        os.remove(downloaded_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(downloaded_path, path)
+    shutil.rmtree(os.path.dirname(downloaded_path), ignore_errors=True)
+
+    blob = await get_or_create_media_blob(sha256, path, size, file_key)
+    if blob["path"] != path and os.path.exists(blob["path"]):
+        # тот же хэш уже сохранён под другим расширением — оставляем один файл
+        os.remove(path)
+    return blob
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import settings
+
+
+def peer_display_name(entity) -> Optional[str]:
+    """Имя собеседника так же, как его показывает бот: first_name или username."""
+    if entity is None:
+        return None
+    return getattr(entity, "first_name", None) or getattr(entity, "username", None)
+
+
+class PeerCache:
+    """
+    Кэш одного аккаунта: собственный user id и отображаемые имена собеседников.
+    LRU с ограничением по размеру и TTL на каждую запись.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.PEER_CACHE_SIZE,
+        ttl: float = settings.PEER_CACHE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.self_id: Optional[int] = None
+        self._names: "OrderedDict[int, tuple[Optional[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, peer_id: int, default=None):
+        """Возвращает имя из кэша или default (промах / запись устарела)."""
+        entry = self._names.get(peer_id)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._names[peer_id]
+            self.misses += 1
+            return default
+        self._names.move_to_end(peer_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, peer_id: int, name: Optional[str]) -> None:
+        self._names[peer_id] = (name, time.monotonic() + self.ttl)
+        self._names.move_to_end(peer_id)
+        while len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+
+    def update_from_entity(self, entity) -> None:
+        """Обновляет запись по сущности, пришедшей вместе с апдейтом (без запросов к API)."""
+        peer_id = getattr(entity, "id", None)
+        if peer_id is not None:
+            self.set(peer_id, peer_display_name(entity))
+
+    def invalidate(self, peer_id: int) -> None:
+        self._names.pop(peer_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._names),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# account_id -> кэш собеседников этого аккаунта
+peer_caches: Dict[int, PeerCache] = {}
+
+
+def peer_cache_stats() -> dict:
+    """Суммарные счётчики по всем аккаунтам — для подбора PEER_CACHE_SIZE/TTL."""
+    size = hits = misses = 0
+    for cache in peer_caches.values():
+        size += len(cache._names)
+        hits += cache.hits
+        misses += cache.misses
+    total = hits + misses
+    return {
+        "accounts": len(peer_caches),
+        "size": size,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else 0.0,
+    }
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Optional
+
+from config import settings
+from db.services.async_archive_crud import archive_messages
+from db.services.async_retention_crud import (
+    effective_days,
+    list_retention_policies,
+    purge_expired_media,
+    purge_orphan_media_blobs,
+    purge_expired_messages,
+    purge_expired_segments,
+)
+
+logger = logging.getLogger(__name__)
+
+# Сегментов архива на одну транзакцию очистки (каждый — тысячи сообщений)
+SEGMENT_BATCH_SIZE = 10
+
+
+class RetentionJob:
+    """
+    Фоновая очистка архива по сроку хранения и перенос в холодный архив.
+
+    Раз в interval секунд для каждого аккаунта: сообщения старше срока
+    хранения текста удаляются целиком (из холодного архива — сегментами),
+    у сообщений старше срока хранения медиа удаляются файлы (сообщение
+    остаётся), сообщения старше archive_days переносятся в сжатые сегменты
+    (message_archive). Срок — настройка аккаунта (/retention) или глобальная
+    RETENTION_*_DAYS, 0 — бессрочно. В конце прохода удаляются blob'ы медиа,
+    на которые никто не сослался дольше orphan_grace секунд (сообщение удалили
+    раньше, чем записалась ссылка). Работа идёт пачками по batch_size строк
+    с паузой pause секунд между ними; итог последнего прохода — в last_report.
+    """
+
+    def __init__(
+        self,
+        text_days: int = settings.RETENTION_TEXT_DAYS,
+        media_days: int = settings.RETENTION_MEDIA_DAYS,
+        interval: int = settings.RETENTION_INTERVAL,
+        batch_size: int = settings.RETENTION_BATCH_SIZE,
+        pause: float = settings.RETENTION_BATCH_PAUSE,
+        archive_days: int = settings.ARCHIVE_AFTER_DAYS,
+        segment_size: int = settings.ARCHIVE_SEGMENT_SIZE,
+        orphan_grace: int = settings.MEDIA_ORPHAN_GRACE,
+    ):
+        self.text_days = text_days
+        self.media_days = media_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archive_days = archive_days
+        self.segment_size = segment_size
+        self.orphan_grace = orphan_grace
+
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.last_report: Optional[dict] = None
+
+    def start(self) -> None:
+        """Запускает периодическую очистку (вызывать внутри работающего event loop)."""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "RetentionJob: запущена (текст %s, медиа %s дн., раз в %d сек.)",
+            self.text_days or "бессрочно",
+            self.media_days or "бессрочно",
+            self.interval,
+        )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("RetentionJob: ошибка очистки: %s", e, exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def run_once(self) -> dict:
+        """Один проход по всем аккаунтам. Возвращает отчёт (он же last_report)."""
+        async with self._lock:
+            started = time.monotonic()
+            report = {
+                "started_at": datetime.utcnow(),
+                "accounts": 0,
+                "messages": 0,
+                "media": 0,
+                "files": 0,
+                "freed_bytes": 0,
+                "archived": 0,
+                "segments": 0,
+                "archive_bytes": 0,
+                "orphan_blobs": 0,
+            }
+            for policy in await list_retention_policies():
+                text_days = effective_days(policy["text_days"], self.text_days)
+                media_days = effective_days(policy["media_days"], self.media_days)
+                archive_days = self.archive_days
+                if text_days and archive_days >= text_days:
+                    archive_days = 0  # удалится раньше, чем попадёт в архив
+                if not text_days and not media_days and not archive_days:
+                    continue
+                before = (report["messages"], report["media"], report["archived"])
+                # сначала удаляются сообщения целиком (вместе с их файлами),
+                # затем файлы у оставшихся, если срок медиа короче
+                if text_days:
+                    await self._purge_messages(policy["account_id"], text_days, report)
+                if media_days and (not text_days or media_days < text_days):
+                    await self._purge_media(policy["account_id"], media_days, report)
+                # медиа в архиве не трогается (сегменты не переписываются),
+                # поэтому переносится то, что уже прошло очистку медиа
+                if archive_days:
+                    await self._archive(policy["account_id"], archive_days, report)
+                if (report["messages"], report["media"], report["archived"]) != before:
+                    report["accounts"] += 1
+            await self._purge_orphan_blobs(report)
+
+            report["seconds"] = round(time.monotonic() - started, 1)
+            self.last_report = report
+            if (
+                report["messages"]
+                or report["media"]
+                or report["archived"]
+                or report["orphan_blobs"]
+            ):
+                logger.info(
+                    "RetentionJob: аккаунтов %d, удалено сообщений %d, "
+                    "медиа %d, файлов %d (без ссылок %d), освобождено %.1f МБ; "
+                    "в архив %d сообщений (%d сегментов, %.1f МБ) за %.1f сек.",
+                    report["accounts"],
+                    report["messages"],
+                    report["media"],
+                    report["files"],
+                    report["orphan_blobs"],
+                    report["freed_bytes"] / 1024 / 1024,
+                    report["archived"],
+                    report["segments"],
+                    report["archive_bytes"] / 1024 / 1024,
+                    report["seconds"],
+                )
+            return report
+
+    async def _purge_messages(self, account_id: int, days: int, report: dict) -> None:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        while True:
+            batch = await purge_expired_messages(account_id, cutoff, self.batch_size)
+            report["messages"] += batch["messages"]
+            report["files"] += batch["files"]
+            report["freed_bytes"] += batch["freed_bytes"]
+            if batch["messages"] < self.batch_size:
+                break
+            await asyncio.sleep(self.pause)
+        while True:
+            batch = await purge_expired_segments(account_id, cutoff, SEGMENT_BATCH_SIZE)
+            report["messages"] += batch["messages"]
+            report["files"] += batch["files"]
+            report["freed_bytes"] += batch["freed_bytes"]
+            if batch["segments"] < SEGMENT_BATCH_SIZE:
+                return
+            await asyncio.sleep(self.pause)
+
+    async def _purge_media(self, account_id: int, days: int, report: dict) -> None:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        last_id = 0
+        while True:
+            batch = await purge_expired_media(
+                account_id, cutoff, self.batch_size, last_id
+            )
+            report["media"] += batch["messages"]
+            report["files"] += batch["files"]
+            report["freed_bytes"] += batch["freed_bytes"]
+            last_id = batch["last_id"]
+            if batch["messages"] < self.batch_size:
+                return
+            await asyncio.sleep(self.pause)
+
+    async def _archive(self, account_id: int, days: int, report: dict) -> None:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        while True:
+            batch = await archive_messages(account_id, cutoff, self.segment_size)
+            if not batch["messages"]:
+                return
+            report["archived"] += batch["messages"]
+            report["segments"] += 1
+            report["archive_bytes"] += batch["size"]
+            await asyncio.sleep(self.pause)
+
+    async def _purge_orphan_blobs(self, report: dict) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.orphan_grace)
+        while True:
+            batch = await purge_orphan_media_blobs(cutoff, self.batch_size)
+            report["orphan_blobs"] += batch["files"]
+            report["files"] += batch["files"]
+            report["freed_bytes"] += batch["freed_bytes"]
+            if batch["blobs"] < self.batch_size:
+                return
+            await asyncio.sleep(self.pause)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "text_days": self.text_days,
+            "media_days": self.media_days,
+            "archive_days": self.archive_days,
+            "last_report": self.last_report,
+        }
+
+
+# Очистка архива по сроку хранения
+retention_job = RetentionJob()
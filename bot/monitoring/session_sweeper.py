@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime
+from typing import Optional
+
+from config import settings
+from db.services.async_user_crud import purge_expired_sessions
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    """
+    Фоновая очистка истёкших сессий пользователей бота.
+
+    Путь запроса (AuthMiddleware) истёкшие сессии только игнорирует; раз в
+    interval секунд эта задача удаляет их пачками по batch_size строк
+    с паузой pause секунд между ними и сбрасывает в кэше авторизации (session_cache).
+    """
+
+    def __init__(
+        self,
+        interval: int = settings.SESSION_SWEEP_INTERVAL,
+        batch_size: int = settings.SESSION_SWEEP_BATCH_SIZE,
+        pause: float = settings.SESSION_SWEEP_PAUSE,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_removed = 0
+
+    def start(self) -> None:
+        """Запускает периодическую очистку (вызывать внутри работающего event loop)."""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("SessionSweeper: запущен (раз в %d сек.)", self.interval)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("SessionSweeper: ошибка очистки: %s", e, exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Один проход. Возвращает число удалённых сессий."""
+        now = datetime.utcnow()
+        removed = 0
+        while True:
+            batch = await purge_expired_sessions(now, self.batch_size)
+            removed += batch
+            if batch < self.batch_size:
+                break
+            await asyncio.sleep(self.pause)
+        self.last_run = now
+        self.last_removed = removed
+        if removed:
+            logger.info("SessionSweeper: удалено истёкших сессий: %d", removed)
+        return removed
+
+
+# Очистка истёкших сессий
+session_sweeper = SessionSweeper()
@@ -0,0 +1,405 @@
+import os
+import sys
+import time
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing
+from contextlib import suppress
+from typing import Dict, Iterable, Optional
+
+from config import settings
+from bot.monitoring.connection_state import ConnectionState, backoff_delay
+from bot.monitoring.ingest_queue import ingest_queue
+from bot.monitoring.leases import account_leases
+from bot.monitoring.media_pool import media_pool
+from bot.monitoring.peer_cache import peer_cache_stats
+from bot.monitoring.telethon_service import (
+    monitoring_status,
+    run_monitoring,
+    set_account_filter,
+    stop_all_clients,
+)
+
+logger = logging.getLogger(__name__)
+
+MONITORING_OP_TIMEOUT = settings.MONITORING_OP_TIMEOUT
+STABLE_AFTER = settings.MONITORING_STABLE_AFTER
+
+# Как часто супервизор проверяет процессы и как часто worker шлёт статус, сек.
+SUPERVISOR_TICK = 1.0
+STATUS_INTERVAL = 5.0
+
+_NO_MESSAGE = object()
+
+
+def rebalance(assignments: Dict[int, set[int]], account_ids: Iterable[int]) -> set[int]:
+    """
+    Распределяет аккаунты по worker-процессам (assignments меняется на месте).
+
+    Распределение «липкое»: аккаунт остаётся на своём процессе, пока это
+    не нарушает баланс, поэтому добавление/удаление аккаунта не переподключает
+    остальных. Новые аккаунты уходят на самый свободный процесс, затем
+    нагрузка выравнивается до разницы не больше одного аккаунта.
+    Возвращает номера процессов, у которых изменился набор аккаунтов.
+    """
+    account_ids = set(account_ids)
+    before = {index: set(ids) for index, ids in assignments.items()}
+
+    for ids in assignments.values():
+        ids &= account_ids
+
+    assigned = set().union(*assignments.values())
+    for acc_id in sorted(account_ids - assigned):
+        least = min(assignments, key=lambda i: (len(assignments[i]), i))
+        assignments[least].add(acc_id)
+
+    while True:
+        most = max(assignments, key=lambda i: (len(assignments[i]), -i))
+        least = min(assignments, key=lambda i: (len(assignments[i]), i))
+        if len(assignments[most]) - len(assignments[least]) <= 1:
+            break
+        acc_id = max(assignments[most])
+        assignments[most].remove(acc_id)
+        assignments[least].add(acc_id)
+
+    return {index for index in assignments if assignments[index] != before[index]}
+
+
+def _merge_ingest_stats(items: list[dict]) -> dict:
+    """Суммирует статистику очередей записи нескольких процессов."""
+    merged = {
+        key: sum(item[key] for item in items)
+        for key in (
+            "queue_depth",
+            "enqueued",
+            "committed",
+            "duplicates",
+            "failed",
+            "media_updates",
+            "deleted",
+            "batches",
+        )
+    }
+    total_ms = sum(item["avg_commit_ms"] * item["batches"] for item in items)
+    merged["last_commit_ms"] = max((item["last_commit_ms"] for item in items), default=0.0)
+    merged["avg_commit_ms"] = (
+        round(total_ms / merged["batches"], 1) if merged["batches"] else 0.0
+    )
+    merged["max_commit_ms"] = max((item["max_commit_ms"] for item in items), default=0.0)
+    return merged
+
+
+def _merge_cache_stats(items: list[dict]) -> dict:
+    """Суммирует статистику кэшей собеседников нескольких процессов."""
+    merged = {"accounts": 0, "size": 0, "hits": 0, "misses": 0}
+    for item in items:
+        for key in merged:
+            merged[key] += item[key]
+    total = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = round(merged["hits"] / total, 3) if total else 0.0
+    return merged
+
+
+class MonitoringSupervisor:
+    """
+    Управляет worker-процессами мониторинга: каждый процесс держит свою часть
+    Telethon-клиентов (свой event loop, своя очередь записи и кэш собеседников).
+
+    Набор аккаунтов экземпляра приходит из аренды (set_accounts), супервизор
+    распределяет его между процессами и отправляет изменившиеся наборы. Упавший процесс
+    перезапускается (с задержкой, если падает сразу после старта) и получает
+    прежний набор аккаунтов.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self.assignments: Dict[int, set[int]] = {i: set() for i in range(workers)}
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._queues: Dict[int, multiprocessing.Queue] = {}
+        self._statuses = self._ctx.Queue()
+        self._started_at: Dict[int, float] = {}
+        self._crashes: Dict[int, int] = {i: 0 for i in range(workers)}
+        self._restart_at: Dict[int, float] = {}
+        self.restarts = 0
+        # последний снимок статуса от каждого процесса
+        self.worker_status: Dict[int, dict] = {}
+        self._stopping = False
+
+    async def run(self) -> None:
+        logger.info("MonitoringSupervisor: запуск %d worker-процессов", self.workers)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while True:
+            self._check_workers()
+            self._read_statuses()
+            await asyncio.sleep(SUPERVISOR_TICK)
+
+    def set_accounts(self, account_ids: Iterable[int]) -> None:
+        """Перераспределяет аккаунты экземпляра и отправляет изменившиеся наборы."""
+        account_ids = set(account_ids)
+        changed = rebalance(self.assignments, account_ids)
+        if changed:
+            logger.info(
+                "MonitoringSupervisor: аккаунтов %d, распределение: %s",
+                len(account_ids),
+                {i: len(ids) for i, ids in self.assignments.items()},
+            )
+        for index in changed:
+            self._send_assignment(index)
+
+    def _spawn(self, index: int) -> None:
+        assignments = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, assignments, self._statuses),
+            name=f"monitoring-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        self._queues[index] = assignments
+        self._started_at[index] = time.monotonic()
+        self.worker_status.pop(index, None)
+        self._send_assignment(index)
+        logger.info("MonitoringSupervisor: worker %d запущен (pid %s)", index, process.pid)
+
+    def _send_assignment(self, index: int) -> None:
+        assignments = self._queues.get(index)
+        if assignments is not None:
+            assignments.put(sorted(self.assignments[index]))
+
+    def _check_workers(self) -> None:
+        """Перезапускает упавшие процессы."""
+        if self._stopping:
+            return
+        now = time.monotonic()
+        for index in range(self.workers):
+            process = self._processes.get(index)
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                # процесс упал: фиксируем и планируем перезапуск
+                lived = now - self._started_at.get(index, now)
+                self._crashes[index] = 1 if lived >= STABLE_AFTER else self._crashes[index] + 1
+                delay = backoff_delay(self._crashes[index]) if self._crashes[index] > 1 else 0.0
+                logger.error(
+                    "MonitoringSupervisor: worker %d (pid %s) завершился с кодом %s, "
+                    "перезапуск через %.0f сек.",
+                    index,
+                    process.pid,
+                    process.exitcode,
+                    delay,
+                )
+                self._processes.pop(index)
+                self._queues.pop(index, None)
+                self.worker_status.pop(index, None)
+                self._restart_at[index] = now + delay
+
+            if self._restart_at.get(index, 0.0) <= now:
+                self._restart_at.pop(index, None)
+                self.restarts += 1
+                self._spawn(index)
+
+    def _read_statuses(self) -> None:
+        while True:
+            try:
+                snapshot = self._statuses.get_nowait()
+            except queue.Empty:
+                return
+            process = self._processes.get(snapshot["worker"])
+            if process is not None and process.pid == snapshot["pid"]:
+                self.worker_status[snapshot["worker"]] = snapshot
+
+    async def stop(self) -> None:
+        """Просит процессы отключить клиентов и дописать очередь, затем ждёт их."""
+        self._stopping = True
+        loop = asyncio.get_running_loop()
+        for index, assignments in self._queues.items():
+            with suppress(Exception):
+                assignments.put(None)
+
+        timeout = MONITORING_OP_TIMEOUT * 2
+        for index, process in list(self._processes.items()):
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning(
+                    "MonitoringSupervisor: worker %d не завершился за %.0f сек., terminate",
+                    index,
+                    timeout,
+                )
+                process.terminate()
+                await loop.run_in_executor(None, process.join, 5)
+        self._processes.clear()
+        self._queues.clear()
+        logger.info("MonitoringSupervisor: все worker-процессы остановлены")
+
+    def status(self) -> dict:
+        """Сводка по всем процессам в том же формате, что и collect_monitoring_status."""
+        states = {state.value: 0 for state in ConnectionState}
+        problems = []
+        total = 0
+        workers = []
+        snapshots = []
+        for index in range(self.workers):
+            process = self._processes.get(index)
+            snapshot = self.worker_status.get(index)
+            workers.append(
+                {
+                    "index": index,
+                    "pid": process.pid if process else None,
+                    "alive": bool(process and process.is_alive()),
+                    "accounts": len(self.assignments[index]),
+                    "reported": snapshot is not None,
+                }
+            )
+            if snapshot is None:
+                continue
+            snapshots.append(snapshot)
+            total += snapshot["status"]["total"]
+            for name, count in snapshot["status"]["states"].items():
+                states[name] += count
+            problems += snapshot["status"]["problems"]
+        return {
+            "total": total,
+            "states": states,
+            "problems": sorted(problems, key=lambda p: p["account_id"]),
+            "ingest": _merge_ingest_stats([s["ingest"] for s in snapshots]),
+            "peer_cache": _merge_cache_stats([s["peer_cache"] for s in snapshots]),
+            "media": {
+                key: sum(s["media"][key] for s in snapshots)
+                for key in media_pool.stats()
+            },
+            "workers": workers,
+            "restarts": self.restarts,
+        }
+
+
+# Супервизор процесса бота (None — мониторинг работает в этом же процессе)
+supervisor: Optional[MonitoringSupervisor] = None
+
+
+def start_supervisor(workers: int) -> asyncio.Task:
+    """Создаёт супервизор и запускает его цикл в фоне."""
+    global supervisor
+    supervisor = MonitoringSupervisor(workers)
+    return asyncio.create_task(supervisor.run())
+
+
+def set_monitored_accounts(account_ids: Iterable[int]) -> None:
+    """Передаёт супервизору аккаунты, арендованные этим экземпляром."""
+    if supervisor is not None:
+        supervisor.set_accounts(account_ids)
+
+
+async def stop_supervisor() -> None:
+    if supervisor is not None:
+        await supervisor.stop()
+
+
+def collect_monitoring_status() -> dict:
+    """
+    Статус мониторинга для админов: из worker-процессов, если работает
+    супервизор, иначе — из текущего процесса.
+    """
+    if supervisor is not None:
+        status = supervisor.status()
+    else:
+        status = dict(
+            monitoring_status(),
+            ingest=ingest_queue.stats(),
+            peer_cache=peer_cache_stats(),
+            media=media_pool.stats(),
+            workers=[],
+            restarts=0,
+        )
+    status["leases"] = account_leases.stats()
+    return status
+
+
+def _worker_main(index: int, assignments, statuses) -> None:
+    """Точка входа worker-процесса (multiprocessing, spawn)."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"[worker {index}] %(asctime)s %(levelname)s %(name)s: %(message)s",
+        force=True,
+    )
+    # статус — только свежие снимки, не ждём их отправки при выходе
+    statuses.cancel_join_thread()
+    # Ctrl+C получает вся группа процессов — останавливает нас супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(_worker(index, assignments, statuses))
+
+
+async def _worker(index: int, assignments, statuses) -> None:
+    from db.database import async_engine
+
+    # до получения набора аккаунтов ничего не подключаем
+    set_account_filter(set())
+    ingest_queue.start()
+    media_pool.start()
+    stop = asyncio.Event()
+    monitoring = asyncio.create_task(run_monitoring())
+    reader = asyncio.create_task(_read_assignments(index, assignments, stop))
+    reporter = asyncio.create_task(_report_status(index, statuses))
+
+    try:
+        await stop.wait()
+    finally:
+        for task in (monitoring, reporter, reader):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await media_pool.stop()
+        await stop_all_clients()
+        await ingest_queue.drain()
+        await async_engine.dispose()
+        logger.info("worker %d: остановлен", index)
+
+
+async def _read_assignments(index: int, assignments, stop: asyncio.Event) -> None:
+    """Получает от супервизора набор account_id; None — команда остановиться."""
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+
+    def get():
+        try:
+            return assignments.get(timeout=1.0)
+        except queue.Empty:
+            return _NO_MESSAGE
+
+    while True:
+        message = await loop.run_in_executor(None, get)
+        if message is _NO_MESSAGE:
+            if parent is not None and not parent.is_alive():
+                logger.error("worker %d: процесс бота завершился, останавливаемся", index)
+                stop.set()
+                return
+            continue
+        if message is None:
+            stop.set()
+            return
+        logger.info("worker %d: получено аккаунтов: %d", index, len(message))
+        set_account_filter(message)
+
+
+async def _report_status(index: int, statuses) -> None:
+    """Периодически отправляет супервизору снимок статуса процесса."""
+    while True:
+        statuses.put(
+            {
+                "worker": index,
+                "pid": os.getpid(),
+                "status": monitoring_status(),
+                "ingest": ingest_queue.stats(),
+                "peer_cache": peer_cache_stats(),
+                "media": media_pool.stats(),
+            }
+        )
+        await asyncio.sleep(STATUS_INTERVAL)
@@ -1,16 +1,27 @@
-import os
+import time
 import asyncio
 import logging
-from typing import Dict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
 
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, types
 from telethon.sessions import StringSession
 
 from config import settings
-from db.services.telegram_crud import (
-    list_telegram_accounts_with_monitoring,
-    create_telegram_message,
-    mark_deleted_messages,
+from bot.monitoring.connection_state import (
+    AccountConnection,
+    ConnectionState,
+    connection_states,
+    connection_summary,
+)
+from bot.monitoring.ingest_queue import ingest_queue
+from bot.monitoring.media_pool import MEDIA_PENDING, media_pool
+from bot.monitoring.peer_cache import PeerCache, peer_caches, peer_display_name
+from db.services.async_telegram_crud import (
+    get_monitoring_account,
+    list_accounts_changed_since,
+    list_monitoring_accounts_brief,
+    record_peer_name,
 )
 
 logging.getLogger("telethon").setLevel(logging.CRITICAL)
@@ -19,93 +30,414 @@ logger = logging.getLogger(__name__)
 API_TELETHON_ID = settings.API_TELETHON_ID
 API_TELETHON_HASH = settings.API_TELETHON_HASH
 CHECK_INTERVAL = settings.CHECK_INTERVAL
-MEDIA_ROOT = os.path.join(settings.BASE_DIR, "media")
+MONITORING_CONCURRENCY = settings.MONITORING_CONCURRENCY
+MONITORING_OP_TIMEOUT = settings.MONITORING_OP_TIMEOUT
+ACCOUNTS_RESYNC_INTERVAL = settings.ACCOUNTS_RESYNC_INTERVAL
 
 # Глобальный словарь: account_id -> client
 active_clients: Dict[int, TelegramClient] = {}
 
+# account_id -> задача запуска клиента, которая ещё не завершилась
+_starting: Dict[int, asyncio.Task] = {}
+
+# Все аккаунты с мониторингом: account_id -> {id, alias, is_monitoring, updated_at}
+_known: Dict[int, dict] = {}
+
+# account_id -> последний увиденный updated_at (отсев повторов в окне перекрытия)
+_versions: Dict[int, datetime] = {}
+
+# Аккаунты, которые обслуживает этот процесс (_known с учётом _account_filter)
+_accounts: Dict[int, dict] = {}
+
+# Время начала последней сверки и следующей полной сверки (loop.time())
+_watermark: Optional[datetime] = None
+_next_resync = 0.0
+
+# Запас окна инкрементальной сверки: транзакция могла закоммитить строку
+# с updated_at раньше, чем прошлая сверка её увидела
+_WATERMARK_OVERLAP = timedelta(seconds=60)
+
+# Ограничение одновременных подключений / проверок
+_connect_slots = asyncio.Semaphore(MONITORING_CONCURRENCY)
+
+# Будит цикл мониторинга раньше CHECK_INTERVAL (например, при обрыве соединения)
+_wakeup = asyncio.Event()
+
+# Фоновые задачи наблюдения за отключением (держим ссылки, чтобы их не собрал GC)
+_watchers: set[asyncio.Task] = set()
+
+# account_id, которые обслуживает этот процесс (None — все аккаунты).
+# В worker-процессах задаётся супервизором (bot/monitoring/supervisor.py).
+_account_filter: Optional[set[int]] = None
+
+# Сверка со списком аккаунтов нужна раньше CHECK_INTERVAL
+_reload_requested = False
+
+_MISSING = object()
+
+
+class AccountNotAuthorized(Exception):
+    """Сессия аккаунта больше не авторизована (отозвана/разлогинена)."""
+
 
 async def run_monitoring():
     """
     Бесконечный цикл, который:
       1. Каждые CHECK_INTERVAL секунд перечитывает логовую группу из БД.
       2. Получает аккаунты для мониторинга.
-      3. Поднимает отсутствующие клиенты, отключает лишние.
-      4. Проверяет, авторизован ли клиент (если нет – отключает).
+      3. Отключает лишние клиенты и проверяет, авторизованы ли живые.
+      4. Поднимает клиентов, у которых подошло время попытки (в фоне, параллельно).
+         Обрыв соединения будит цикл сразу, не дожидаясь CHECK_INTERVAL.
     """
 
     logger.info(
-        "run_monitoring: Запущен цикл мониторинга (интервал %s сек.)", CHECK_INTERVAL
+        "run_monitoring: Запущен цикл мониторинга (интервал %s сек., параллельно %d)",
+        CHECK_INTERVAL,
+        MONITORING_CONCURRENCY,
     )
 
+    loop = asyncio.get_running_loop()
+    next_reload = loop.time()
+
+    global _reload_requested
     while True:
-        # 2. Получаем список аккаунтов для мониторинга
+        if _reload_requested or loop.time() >= next_reload:
+            _reload_requested = False
+            await _reconcile()
+            next_reload = loop.time() + CHECK_INTERVAL
+
+        # Поднимаем клиентов, у которых подошло время попытки
+        _start_due_clients()
+
+        # Спим до следующей сверки, ближайшей попытки переподключения или сигнала
+        timeout = next_reload - loop.time()
+        next_attempt = _next_attempt_in()
+        if next_attempt is not None:
+            timeout = min(timeout, next_attempt)
+        _wakeup.clear()
         try:
-            accounts = list_telegram_accounts_with_monitoring()
-        except Exception as e:
-            logger.error("Ошибка при получении списка аккаунтов: %s", e, exc_info=True)
-            await asyncio.sleep(CHECK_INTERVAL)
+            await asyncio.wait_for(_wakeup.wait(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _reconcile() -> None:
+    """
+    Сверяет клиентов со списком аккаунтов из БД и проверяет живых.
+    Раз в ACCOUNTS_RESYNC_INTERVAL читается полный список (только id/alias/updated_at),
+    в остальное время — только строки, изменённые после прошлой сверки.
+    Сессии и 2FA читаются и расшифровываются только при запуске клиента.
+    """
+    global _watermark, _next_resync
+    loop = asyncio.get_running_loop()
+    full = _watermark is None or loop.time() >= _next_resync
+    started_at = datetime.utcnow()
+
+    # 2. Получаем аккаунты для мониторинга (все или изменённые)
+    try:
+        if full:
+            rows = await list_monitoring_accounts_brief()
+        else:
+            rows = await list_accounts_changed_since(_watermark - _WATERMARK_OVERLAP)
+    except Exception as e:
+        logger.error("Ошибка при получении списка аккаунтов: %s", e, exc_info=True)
+        return
+
+    if full:
+        for acc_id in set(_known) - {row["id"] for row in rows}:
+            del _known[acc_id]
+        _versions.clear()
+        _next_resync = loop.time() + ACCOUNTS_RESYNC_INTERVAL
+    changed = 0
+    for row in rows:
+        if _versions.get(row["id"]) == row["updated_at"]:
+            continue  # уже видели эту версию (перекрытие окна)
+        _versions[row["id"]] = row["updated_at"]
+        changed += 1
+        if row["is_monitoring"]:
+            _known[row["id"]] = row
+            conn = connection_states.get(row["id"])
+            if conn is not None and conn.state == ConnectionState.DEAD:
+                # аккаунт изменился (например, сдали заново) — пробуем снова
+                connection_states[row["id"]] = AccountConnection(
+                    row["id"], row["updated_at"]
+                )
+        else:
+            _known.pop(row["id"], None)
+    _watermark = started_at
+    # версии вне окна перекрытия больше не придут повторно
+    for acc_id, version in list(_versions.items()):
+        if acc_id not in _known and version < started_at - _WATERMARK_OVERLAP:
+            del _versions[acc_id]
+
+    if _account_filter is None:
+        _accounts.clear()
+        _accounts.update(_known)
+    else:
+        for acc_id in list(_accounts):
+            if acc_id not in _account_filter or acc_id not in _known:
+                del _accounts[acc_id]
+        for acc_id in _account_filter:
+            if acc_id in _known:
+                _accounts[acc_id] = _known[acc_id]
+    if full or changed:
+        logger.info(
+            "run_monitoring: Аккаунтов для мониторинга: %d (%s, изменено %d)",
+            len(_accounts),
+            "полная сверка" if full else "изменения",
+            changed,
+        )
+
+    for acc_id, acc in _accounts.items():
+        if acc_id not in connection_states:
+            connection_states[acc_id] = AccountConnection(acc_id, acc["updated_at"])
+
+    # 3. Отключаем клиентов, которых нет в списке (monitoring выключен)
+    removed = [acc_id for acc_id in active_clients if acc_id not in _accounts]
+    for acc_id in list(_starting):
+        if acc_id not in _accounts:
+            _starting.pop(acc_id).cancel()
+    await asyncio.gather(
+        *(
+            _stop_client(
+                acc_id,
+                "передан другому процессу" if acc_id in _known else "мониторинг выключен",
+            )
+            for acc_id in removed
+        )
+    )
+    for acc_id in list(connection_states):
+        if acc_id not in _accounts:
+            del connection_states[acc_id]
+
+    # Проверяем, подключён и авторизован ли клиент
+    await _probe_clients()
+
+
+def request_reconcile() -> None:
+    """Просит цикл мониторинга перечитать аккаунты, не дожидаясь CHECK_INTERVAL."""
+    global _reload_requested
+    _reload_requested = True
+    _wakeup.set()
+
+
+def set_account_filter(account_ids: Optional[Iterable[int]]) -> None:
+    """
+    Ограничивает процесс заданными account_id (None — все аккаунты).
+    Лишние клиенты отключаются при ближайшей сверке, которая запускается сразу.
+    """
+    global _account_filter
+    _account_filter = None if account_ids is None else set(account_ids)
+    request_reconcile()
+
+
+def _next_attempt_in() -> float | None:
+    """Через сколько секунд наступит ближайшая попытка переподключения."""
+    now = time.monotonic()
+    waits = [
+        conn.next_attempt_at - now
+        for acc_id, conn in connection_states.items()
+        if conn.state in (ConnectionState.BACKING_OFF, ConnectionState.DEGRADED)
+        and acc_id not in active_clients
+        and acc_id not in _starting
+    ]
+    return max(0.0, min(waits)) if waits else None
+
+
+def _start_due_clients() -> None:
+    """Запускает фоновые задачи подключения для аккаунтов, у которых подошла попытка."""
+    now = time.monotonic()
+    due = []
+    for acc_id, acc in _accounts.items():
+        if acc_id in active_clients or acc_id in _starting:
             continue
+        conn = connection_states.get(acc_id)
+        if conn is not None and conn.is_due(now):
+            due.append(acc)
+    if not due:
+        return
+
+    total = len(_accounts)
+    logger.info(
+        "run_monitoring: Подключаем %d аккаунтов (уже подключено %d/%d)",
+        len(due),
+        len(active_clients),
+        total,
+    )
+    for acc in due:
+        connection_states[acc["id"]].mark_connecting()
+        task = asyncio.create_task(_start_client_guarded(acc, total))
+        _starting[acc["id"]] = task
+
+
+async def _start_client_guarded(acc: dict, total: int) -> None:
+    """Подключает один аккаунт с ограничением параллельности и таймаутом."""
+    acc_id = acc["id"]
+    conn = connection_states[acc_id]
+    try:
+        async with _connect_slots:
+            client = await asyncio.wait_for(
+                _load_and_start(acc_id), MONITORING_OP_TIMEOUT
+            )
+        if client is None:
+            # мониторинг выключили или аккаунт удалили после сверки
+            _known.pop(acc_id, None)
+            _accounts.pop(acc_id, None)
+            connection_states.pop(acc_id, None)
+            return
+        active_clients[acc_id] = client
+        conn.mark_live()
+        watcher = asyncio.create_task(_watch_disconnect(acc_id, client))
+        _watchers.add(watcher)
+        watcher.add_done_callback(_watchers.discard)
+    except AccountNotAuthorized:
+        conn.mark_dead("не авторизован")
+    except asyncio.TimeoutError:
+        conn.mark_failed(f"таймаут подключения ({MONITORING_OP_TIMEOUT} сек.)")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.debug("account_id=%d: ошибка подключения", acc_id, exc_info=True)
+        conn.mark_failed(repr(e))
+    finally:
+        _starting.pop(acc_id, None)
+        _log_progress(total)
+
+
+async def _load_and_start(acc_id: int) -> Optional[TelegramClient]:
+    """Читает сессию (и расшифровывает 2FA) только перед запуском клиента."""
+    acc = await get_monitoring_account(acc_id)
+    if acc is None:
+        return None
+    return await start_client_for_account(acc)
+
 
+async def _watch_disconnect(acc_id: int, client: TelegramClient) -> None:
+    """Ждёт отключения клиента и сразу будит цикл для переподключения."""
+    try:
+        await client.disconnected
+    except Exception:
+        pass
+    if active_clients.get(acc_id) is not client:
+        return  # клиента остановили намеренно
+    active_clients.pop(acc_id, None)
+    peer_caches.pop(acc_id, None)
+    conn = connection_states.get(acc_id)
+    if conn is not None:
+        conn.mark_dropped("соединение потеряно")
+    _wakeup.set()
+
+
+def _log_progress(total: int) -> None:
+    """Пишет прогресс подключения: каждые ~10% и по завершении волны запуска."""
+    connected = len(active_clients)
+    step = max(1, total // 10)
+    if not _starting or connected % step == 0:
         logger.info(
-            "run_monitoring: Найдено аккаунтов для мониторинга: %d", len(accounts)
+            "run_monitoring: %d/%d подключено, в процессе %d",
+            connected,
+            total,
+            len(_starting),
         )
-        current_ids = set(acc["id"] for acc in accounts)
-
-        # 3. Поднимаем клиентов, если их ещё нет
-        for acc in accounts:
-            acc_id = acc["id"]
-            if acc_id not in active_clients:
-                try:
-                    client = await start_client_for_account(acc)
-                    active_clients[acc_id] = client
-                    logger.info(
-                        "run_monitoring: Запущен Telethon-клиент для account_id=%d",
-                        acc_id,
-                    )
-                except Exception as e:
-                    logger.error(
-                        "run_monitoring: Ошибка при запуске клиента для account_id=%d: %s",
-                        acc_id,
-                        e,
-                        exc_info=True,
-                    )
-
-        # 4. Отключаем клиентов, которых нет в списке (monitoring выключен)
-        for acc_id in list(active_clients.keys()):
-            if acc_id not in current_ids:
-                client = active_clients[acc_id]
-                try:
-                    await client.disconnect()
-                except Exception as e:
-                    logger.error(
-                        "run_monitoring: Ошибка при отключении клиента account_id=%d: %s",
-                        acc_id,
-                        e,
-                        exc_info=True,
-                    )
-                del active_clients[acc_id]
-                logger.info("Отключен Telethon-клиент для account_id=%d", acc_id)
-
-        # 5. Проверяем, подключён и авторизован ли клиент, если нет – отключаем
-        for acc_id, client in list(active_clients.items()):
-            if not client.is_connected():
-                logger.warning(
-                    "run_monitoring: Client for account_id=%d не is_connected(), отключаем",
-                    acc_id,
-                )
-                await client.disconnect()
-                del active_clients[acc_id]
-                continue
-            if not await client.is_user_authorized():
-                logger.warning(
-                    "run_monitoring: Аккаунт id=%d не авторизован, отключаем", acc_id
-                )
-                await client.disconnect()
-                del active_clients[acc_id]
-                continue
 
-        await asyncio.sleep(CHECK_INTERVAL)
+
+async def _stop_client(acc_id: int, reason: str) -> None:
+    """Отключает клиента (с таймаутом) и убирает его из active_clients."""
+    client = active_clients.pop(acc_id, None)
+    peer_caches.pop(acc_id, None)
+    if client is None:
+        return
+    try:
+        await asyncio.wait_for(client.disconnect(), MONITORING_OP_TIMEOUT)
+    except Exception as e:
+        logger.error(
+            "run_monitoring: Ошибка при отключении клиента account_id=%d: %s",
+            acc_id,
+            e,
+            exc_info=True,
+        )
+    logger.info("Отключен Telethon-клиент для account_id=%d (%s)", acc_id, reason)
+
+
+async def _probe_client(acc_id: int, client: TelegramClient) -> None:
+    conn = connection_states[acc_id]
+    async with _connect_slots:
+        if not client.is_connected():
+            if conn.state == ConnectionState.LIVE:
+                # Telethon сам пытается переподключиться — даём ему время до следующей проверки
+                conn.mark_degraded("нет соединения")
+                return
+            await _stop_client(acc_id, "нет соединения")
+            conn.mark_failed("нет соединения")
+            return
+        try:
+            authorized = await asyncio.wait_for(
+                client.is_user_authorized(), MONITORING_OP_TIMEOUT
+            )
+        except Exception as e:
+            conn.mark_degraded(f"проверка не удалась: {e!r}")
+            return
+        if not authorized:
+            await _stop_client(acc_id, "не авторизован")
+            conn.mark_dead("не авторизован")
+            return
+        conn.mark_healthy()
+
+
+async def _probe_clients() -> None:
+    """Параллельно проверяет все активные клиенты."""
+    await asyncio.gather(
+        *(
+            _probe_client(acc_id, client)
+            for acc_id, client in list(active_clients.items())
+        )
+    )
+
+
+async def stop_all_clients() -> None:
+    """Отменяет незавершённые подключения и параллельно отключает всех клиентов."""
+    for task in list(_starting.values()):
+        task.cancel()
+    await asyncio.gather(*_starting.values(), return_exceptions=True)
+    await asyncio.gather(
+        *(_stop_client(acc_id, "остановка") for acc_id in list(active_clients))
+    )
+
+
+def monitoring_status() -> dict:
+    """Сводка по подключениям для админов: счётчики состояний и проблемные аккаунты."""
+    problems = [
+        dict(conn.to_dict(), alias=_accounts.get(acc_id, {}).get("alias"))
+        for acc_id, conn in connection_states.items()
+        if conn.state != ConnectionState.LIVE
+    ]
+    return {
+        "total": len(_accounts),
+        "states": connection_summary(),
+        "problems": sorted(problems, key=lambda p: p["account_id"]),
+    }
+
+
+async def _resolve_peer_name(peer_cache: PeerCache, peer_id: int, fetch_entity):
+    """
+    Имя собеседника из кэша; при промахе — один запрос через fetch_entity
+    (event.get_chat / event.get_sender) и сохранение результата в кэш.
+    """
+    name = peer_cache.get(peer_id, _MISSING)
+    if name is not _MISSING:
+        return name
+    try:
+        entity = await fetch_entity()
+    except Exception as e:
+        logger.warning(
+            "start_client_for_account: Ошибка при получении собеседника %s: %s",
+            peer_id,
+            e,
+        )
+        return None
+    name = peer_display_name(entity)
+    peer_cache.set(peer_id, name)
+    return name
 
 
 async def start_client_for_account(acc_dict: dict) -> TelegramClient:
@@ -115,17 +447,26 @@ async def start_client_for_account(acc_dict: dict) -> TelegramClient:
     client = TelegramClient(
         StringSession(session_str), settings.API_TELETHON_ID, settings.API_TELETHON_HASH
     )
-    await client.connect()
+    try:
+        await client.connect()
 
-    if not await client.is_user_authorized():
-        logger.warning(
-            "start_client_for_account: Аккаунт id=%d не авторизован, пропускаем.",
-            account_id,
-        )
-        return client
+        if not await client.is_user_authorized():
+            logger.warning(
+                "start_client_for_account: Аккаунт id=%d не авторизован, пропускаем.",
+                account_id,
+            )
+            raise AccountNotAuthorized(account_id)
+
+        # Свой id запрашиваем один раз, дальше хендлеры берут его из кэша
+        me = await client.get_me()
+    except BaseException:
+        # Таймаут/отмена/ошибка посреди подключения — не оставляем висящий клиент
+        await client.disconnect()
+        raise
 
-    # Создаем папку заранее
-    os.makedirs(MEDIA_ROOT, exist_ok=True)
+    peer_cache = PeerCache()
+    peer_cache.self_id = me.id
+    peer_caches[account_id] = peer_cache
 
     @client.on(events.NewMessage)
     async def handler_newmsg(event):
@@ -137,88 +478,95 @@ async def start_client_for_account(acc_dict: dict) -> TelegramClient:
         msg_id = event.message.id
         date = event.message.date
 
-        chat_name = None
-        try:
-            chat = await event.get_chat()
-            chat_name = getattr(chat, "first_name", None) or getattr(
-                chat, "username", None
-            )
-        except Exception as e:
-            logger.warning(
-                "start_client_for_account: Ошибка при получении имени чата: %s", e
-            )
+        # Сущности, пришедшие вместе с апдейтом, бесплатны — обновляем ими кэш
+        if event.chat is not None:
+            peer_cache.update_from_entity(event.chat)
+        if event.sender is not None and event.sender is not event.chat:
+            peer_cache.update_from_entity(event.sender)
+
+        chat_name = await _resolve_peer_name(peer_cache, chat_id, event.get_chat)
 
         text = event.raw_text or ""
         media_type = None
-        media_path = None
+        media_state = None
+        media_size = None
 
-        # Определяем тип медиа
+        # Определяем тип медиа (видео и голосовые — тоже document, проверяем их раньше)
         if event.message.voice:
             media_type = "voice"
+        elif event.message.video:
+            media_type = "video"
         elif event.message.photo:
             media_type = "photo"
         elif event.message.document:
             media_type = "document"
-        elif event.message.video:
-            media_type = "video"
 
-        # Сохраняем медиа-файл
+        # Само скачивание — в фоне (media_pool), строка пишется сразу
         if media_type:
-            media_folder = os.path.join(MEDIA_ROOT, str(account_id), str(chat_id))
-            os.makedirs(media_folder, exist_ok=True)
-
-            # Автоматически расширение добавится само
-            media_file_path = await event.message.download_media(file=media_folder)
-            if media_file_path:
-                media_path = media_file_path
-                text = f"[{media_type}]"
-            else:
-                logger.error(
-                    "start_client_for_account: Не удалось сохранить медиа файл для сообщения %d",
-                    msg_id,
-                )
+            media_size = event.message.file.size if event.message.file else None
+            media_state = media_pool.admit(account_id, media_type, media_size)
+            text = f"[{media_type}]"
 
-        sender_name = None
-        try:
-            me = await client.get_me()
-            if sender_id == me.id:
-                sender_name = acc_dict["alias"]
-            else:
-                # получаем реального sender через event
-                sender_obj = await event.get_sender()
-                if sender_obj:
-                    sender_name = (
-                        sender_obj.first_name or sender_obj.username or "Собеседник"
-                    )
-                else:
-                    sender_name = "Собеседник"
-        except:
-            sender_name = "Собеседник"
+        # неизвестное имя — None: в peers остаётся последнее известное
+        if sender_id == peer_cache.self_id:
+            sender_name = acc_dict["alias"]
+        else:
+            sender_name = await _resolve_peer_name(
+                peer_cache, sender_id, event.get_sender
+            )
         try:
-            create_telegram_message(
-                account_id=account_id,
-                chat_id=chat_id,
-                chat_name=chat_name,
-                message_id=msg_id,
-                sender_id=sender_id,
-                sender_name=sender_name,
-                text=text,
-                date=date,
-                media_type=media_type,
-                media_path=media_path,
+            # Запись в БД идёт пачками через общую очередь
+            await ingest_queue.put(
+                {
+                    "account_id": account_id,
+                    "chat_id": chat_id,
+                    "chat_name": chat_name,
+                    "message_id": msg_id,
+                    "sender_id": sender_id,
+                    "sender_name": sender_name,
+                    "text": text,
+                    "date": date,
+                    "media_type": media_type,
+                    "media_path": None,
+                    "media_state": media_state,
+                    "media_size": media_size,
+                }
             )
+            if media_state == MEDIA_PENDING:
+                media_pool.submit(account_id, chat_id, msg_id, media_type, event.message)
         except Exception as e:
             logger.error(
-                "start_client_for_account: Ошибка при записи сообщения в БД: %s",
+                "start_client_for_account: Ошибка при постановке сообщения в очередь: %s",
                 e,
                 exc_info=True,
             )
 
+    @client.on(events.Raw(types.UpdateUserName))
+    async def handler_user_name(update):
+        # Собеседник сменил имя — обновляем кэш, не дожидаясь истечения TTL,
+        # и peers: по ним список чатов показывает текущее имя
+        usernames = [u.username for u in (update.usernames or [])]
+        name = update.first_name or (usernames[0] if usernames else None)
+        peer_cache.set(update.user_id, name)
+        if not name:
+            return
+        try:
+            await record_peer_name(account_id, update.user_id, name)
+        except Exception as e:
+            logger.error(
+                "start_client_for_account: Ошибка при записи нового имени %s: %s",
+                update.user_id,
+                e,
+            )
+
     @client.on(events.MessageDeleted())
     async def handler_deleted(event):
-        deleted_ids = event.deleted_ids
+        if event.chat_id is not None:
+            # удаление в канале/супергруппе: свои message_id, такие чаты не сохраняем
+            return
         try:
-            mark_deleted_messages(account_id, deleted_ids)
+            # Удаления за окно сбрасываются одним UPDATE на аккаунт
+            await ingest_queue.put_deletions(account_id, event.deleted_ids)
         except Exception as e:
             logger.error(
                 "start_client_for_account: Ошибка при отметке удалённых сообщений в БД: %s",
@@ -1,10 +1,22 @@
 import math
 
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 
-def paginate(items, page, size):
-    total_pages = math.ceil(len(items) / size)
+
+async def paginate(db: AsyncSession, query: Select, page: int, size: int):
+    """
+    Страница запроса на стороне БД: COUNT(*) по тому же запросу и LIMIT/OFFSET,
+    весь список не загружается. query — select(Model) с сортировкой.
+    Возвращает (объекты страницы, total_pages, total);
+    для страницы вне диапазона — (None, total_pages, total).
+    """
+    total = await db.scalar(
+        select(func.count()).select_from(query.order_by(None).subquery())
+    )
+    total_pages = math.ceil(total / size)
     if page < 1 or page > total_pages:
-        return None, total_pages
-    start_idx = (page - 1) * size
-    end_idx = start_idx + size
-    return items[start_idx:end_idx], total_pages
+        return None, total_pages, total
+    result = await db.execute(query.limit(size).offset((page - 1) * size))
+    return result.scalars().all(), total_pages, total
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    """
+    Хэширование паролей (bcrypt) вне event loop.
+
+    bcrypt занимает сотни миллисекунд CPU; в event loop это останавливало бы
+    бота и все Telethon-клиенты процесса. Хэши считаются в отдельном пуле из
+    workers потоков, одновременно — не больше workers; остальные ждут
+    своей очереди, а если ждущих больше max_pending — запрос отклоняется
+    (ValueError), чтобы поток входов не копил бесконечную очередь.
+
+    Стоимость — rounds (BCRYPT_ROUNDS). Хэш с другой стоимостью при успешном
+    входе пересчитывается: verify возвращает новый хэш для сохранения.
+    """
+
+    def __init__(
+        self,
+        rounds: int = settings.BCRYPT_ROUNDS,
+        workers: int = settings.PASSWORD_WORKERS,
+        max_pending: int = settings.PASSWORD_QUEUE_LIMIT,
+    ):
+        self.context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.pending = 0
+        self.active = 0
+        self.done = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.max_pending_seen = 0
+        self._wait_total = 0.0
+        self._work_total = 0.0
+        self.max_wait = 0.0
+
+    async def _run(self, func, *args):
+        # пул и семафор создаются лениво — внутри работающего event loop
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="passwords"
+            )
+            self._semaphore = asyncio.Semaphore(self.workers)
+        if self._semaphore.locked() and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ValueError("Слишком много попыток входа, попробуйте через минуту.")
+
+        queued = time.monotonic()
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.pending -= 1
+        started = time.monotonic()
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.active -= 1
+            self.done += 1
+            self._semaphore.release()
+            wait = started - queued
+            self._wait_total += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._work_total += time.monotonic() - started
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль. Возвращает (верен ли, новый хэш или None) — новый
+        хэш, если у сохранённого другая стоимость; его нужно записать в БД.
+        """
+        ok, new_hash = await self._run(
+            self.context.verify_and_update, password, password_hash
+        )
+        if ok and new_hash:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "active": self.active,
+            "done": self.done,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "max_pending": self.max_pending_seen,
+            "avg_wait_ms": round(self._wait_total / self.done * 1000, 1) if self.done else 0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_hash_ms": round(self._work_total / self.done * 1000, 1) if self.done else 0,
+        }
+
+
+# Общий сервис паролей процесса бота
+password_hasher = PasswordHasher()
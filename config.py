@@ -12,6 +12,10 @@ class Settings(BaseSettings):
     API_TELETHON_HASH: str = Field(..., env="API_TELETHON_HASH")
 
     SQLALCHEMY_DATABASE_URL: str = Field(..., env="SQLALCHEMY_DATABASE_URL")
+    # Если не задан — строится из SQLALCHEMY_DATABASE_URL с асинхронным драйвером
+    SQLALCHEMY_ASYNC_DATABASE_URL: str | None = Field(
+        None, env="SQLALCHEMY_ASYNC_DATABASE_URL"
+    )
     FERNET_KEY: str = Field(..., env="FERNET_KEY")
 
     ADMIN_USERNAME: str = Field(..., env="ADMIN_USERNAME")
@@ -21,6 +25,102 @@ class Settings(BaseSettings):
     BASE_DIR: str = Field(..., env="BASE_DIR")
     CHECK_INTERVAL: int = Field(...,env=("CHECK_INTERVAL"))
 
+    # очередь записи сообщений (write-behind)
+    INGEST_BATCH_SIZE: int = Field(500, env="INGEST_BATCH_SIZE")
+    INGEST_FLUSH_INTERVAL: float = Field(1.0, env="INGEST_FLUSH_INTERVAL")
+    INGEST_MAX_QUEUE: int = Field(50000, env="INGEST_MAX_QUEUE")
+
+    # кэш собеседников в мониторинге (на каждый аккаунт)
+    PEER_CACHE_SIZE: int = Field(5000, env="PEER_CACHE_SIZE")
+    PEER_CACHE_TTL: int = Field(3600, env="PEER_CACHE_TTL")
+
+    # параллельный запуск и проверка клиентов мониторинга
+    MONITORING_CONCURRENCY: int = Field(20, env="MONITORING_CONCURRENCY")
+    MONITORING_OP_TIMEOUT: float = Field(30.0, env="MONITORING_OP_TIMEOUT")
+
+    # переподключение с экспоненциальной задержкой
+    MONITORING_BACKOFF_BASE: float = Field(5.0, env="MONITORING_BACKOFF_BASE")
+    MONITORING_BACKOFF_MAX: float = Field(900.0, env="MONITORING_BACKOFF_MAX")
+    MONITORING_MAX_FAILURES: int = Field(10, env="MONITORING_MAX_FAILURES")
+    MONITORING_STABLE_AFTER: float = Field(60.0, env="MONITORING_STABLE_AFTER")
+
+    # скачивание медиа: параллельность, общий лимит скорости (КБ/с, 0 — без лимита),
+    # очередь на аккаунт и лимиты размера по типам в МБ (0 — только метаданные)
+    MEDIA_WORKERS: int = Field(4, env="MEDIA_WORKERS")
+    MEDIA_MAX_RATE_KB: int = Field(0, env="MEDIA_MAX_RATE_KB")
+    MEDIA_MAX_PENDING: int = Field(1000, env="MEDIA_MAX_PENDING")
+    MEDIA_SIZE_LIMITS_MB: dict[str, int] = Field(
+        {"voice": 20, "photo": 20, "video": 50, "document": 50},
+        env="MEDIA_SIZE_LIMITS_MB",
+    )
+
+    # количество worker-процессов для Telethon-клиентов (0 — всё в процессе бота)
+    MONITORING_WORKERS: int = Field(0, env="MONITORING_WORKERS")
+
+    # полная сверка аккаунтов (между ними — только изменённые по updated_at), сек.
+    ACCOUNTS_RESYNC_INTERVAL: int = Field(600, env="ACCOUNTS_RESYNC_INTERVAL")
+
+    # аренда аккаунтов между экземплярами бота (если запущено несколько копий)
+    # INSTANCE_ID по умолчанию — hostname:pid
+    INSTANCE_ID: str | None = Field(None, env="INSTANCE_ID")
+    LEASE_TTL: int = Field(60, env="LEASE_TTL")
+
+    # срок хранения архива, дней (0 — бессрочно); для аккаунта можно
+    # переопределить командой /retention. Очистка — пачками раз в RETENTION_INTERVAL сек.
+    RETENTION_TEXT_DAYS: int = Field(0, env="RETENTION_TEXT_DAYS")
+    RETENTION_MEDIA_DAYS: int = Field(0, env="RETENTION_MEDIA_DAYS")
+    RETENTION_INTERVAL: int = Field(3600, env="RETENTION_INTERVAL")
+    RETENTION_BATCH_SIZE: int = Field(1000, env="RETENTION_BATCH_SIZE")
+    RETENTION_BATCH_PAUSE: float = Field(0.2, env="RETENTION_BATCH_PAUSE")
+    # файл медиа без ссылок из сообщений удаляется через столько секунд после
+    # скачивания (ссылка записывается позже, через очередь записи)
+    MEDIA_ORPHAN_GRACE: int = Field(3600, env="MEDIA_ORPHAN_GRACE")
+
+    # холодный архив: сообщения старше ARCHIVE_AFTER_DAYS (0 — не переносить)
+    # уходят в сжатые сегменты по ARCHIVE_SEGMENT_SIZE сообщений одного чата
+    ARCHIVE_AFTER_DAYS: int = Field(0, env="ARCHIVE_AFTER_DAYS")
+    ARCHIVE_SEGMENT_SIZE: int = Field(5000, env="ARCHIVE_SEGMENT_SIZE")
+
+    # кэш авторизации в памяти: запись живёт не дольше SESSION_CACHE_TTL сек.
+    # (за это время видны изменения из других копий бота); 0 — без кэша
+    SESSION_CACHE_TTL: int = Field(60, env="SESSION_CACHE_TTL")
+    SESSION_CACHE_SIZE: int = Field(10000, env="SESSION_CACHE_SIZE")
+
+    # фоновая очистка истёкших сессий: раз в SESSION_SWEEP_INTERVAL сек. пачками
+    SESSION_SWEEP_INTERVAL: int = Field(600, env="SESSION_SWEEP_INTERVAL")
+    SESSION_SWEEP_BATCH_SIZE: int = Field(500, env="SESSION_SWEEP_BATCH_SIZE")
+    SESSION_SWEEP_PAUSE: float = Field(0.2, env="SESSION_SWEEP_PAUSE")
+
+    # хэширование паролей: стоимость bcrypt (при входе хэш со старой стоимостью
+    # пересчитывается), потоков для хэширования и сколько запросов может ждать
+    BCRYPT_ROUNDS: int = Field(12, env="BCRYPT_ROUNDS")
+    PASSWORD_WORKERS: int = Field(2, env="PASSWORD_WORKERS")
+    PASSWORD_QUEUE_LIMIT: int = Field(100, env="PASSWORD_QUEUE_LIMIT")
+
+    # лимит частоты запросов пользователя: THROTTLE_RATE в секунду (THROTTLE_BURST
+    # подряд), на каждую дорогую команду — THROTTLE_COMMAND_*; дорогих команд
+    # одновременно на весь бот — не больше THROTTLE_EXPENSIVE_CONCURRENCY
+    THROTTLE_RATE: float = Field(1.0, env="THROTTLE_RATE")
+    THROTTLE_BURST: int = Field(5, env="THROTTLE_BURST")
+    THROTTLE_COMMAND_RATE: float = Field(0.2, env="THROTTLE_COMMAND_RATE")
+    THROTTLE_COMMAND_BURST: int = Field(2, env="THROTTLE_COMMAND_BURST")
+    THROTTLE_EXPENSIVE_CONCURRENCY: int = Field(4, env="THROTTLE_EXPENSIVE_CONCURRENCY")
+
+    # режим запуска: polling, webhook (встроенный aiohttp-сервер) или monitoring
+    # (только Telethon-мониторинг и очистка, без приёма апдейтов бота).
+    # RUN_MONITORING=false — процесс только принимает апдейты, мониторинг
+    # работает отдельно (BOT_MODE=monitoring)
+    BOT_MODE: str = Field("polling", env="BOT_MODE")
+    RUN_MONITORING: bool = Field(True, env="RUN_MONITORING")
+    # WEBHOOK_URL — внешний адрес (https://host), если задан, webhook
+    # регистрируется в Telegram при старте; WEBHOOK_SECRET — 1-256 символов A-Za-z0-9_-,
+    # обязателен в режиме webhook. WEBHOOK_HOST — 127.0.0.1 за reverse proxy на той же машине
+    WEBHOOK_URL: str | None = Field(None, env="WEBHOOK_URL")
+    WEBHOOK_PATH: str = Field("/webhook", env="WEBHOOK_PATH")
+    WEBHOOK_SECRET: str | None = Field(None, env="WEBHOOK_SECRET")
+    WEBHOOK_HOST: str = Field("127.0.0.1", env="WEBHOOK_HOST")
+    WEBHOOK_PORT: int = Field(8080, env="WEBHOOK_PORT")
+
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
 
@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from db.models.model import Base
+from db.migrations import run_migrations
 from config import settings
 
 SQLALCHEMY_DATABASE_URL = settings.SQLALCHEMY_DATABASE_URL
@@ -9,7 +12,44 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL,echo=False) # если нужны
 # Фабрика сессий (SessionLocal)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Синхронный драйвер -> асинхронный для того же бэкенда
+_ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def make_async_url(url: str) -> str:
+    """
+    Возвращает URL с асинхронным драйвером (aiomysql/aiosqlite/asyncpg)
+    для синхронного URL из SQLALCHEMY_DATABASE_URL.
+    """
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+SQLALCHEMY_ASYNC_DATABASE_URL = (
+    settings.SQLALCHEMY_ASYNC_DATABASE_URL or make_async_url(SQLALCHEMY_DATABASE_URL)
+)
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True
+)
+
+# Фабрика асинхронных сессий. expire_on_commit=False — объекты остаются
+# читаемыми после commit (ленивые загрузки в async невозможны).
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # новые таблицы — по моделям, изменения существующих — миграциями
+    # (create_all — под той же блокировкой, что и миграции)
+    run_migrations(engine, Base.metadata)
 
 init_db()
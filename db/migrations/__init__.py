@@ -0,0 +1,207 @@
+"""
+Версионные миграции схемы. Запускаются из init_db() после create_all:
+create_all создаёт недостающие таблицы, миграции меняют уже существующие
+(индексы, новые колонки, перенос данных).
+
+Миграция — модуль db/migrations/versions/NNNN_<имя>.py с функцией
+upgrade(conn). Применённые версии хранятся в таблице schema_migrations.
+Миграции должны быть идемпотентными (проверять, есть ли уже индекс/колонка):
+на новой БД create_all уже создал всё по моделям.
+
+Обычная миграция выполняется в одной транзакции. Миграция с BATCHED = True
+получает engine вместо conn и сама открывает короткие транзакции
+(перенос данных в больших таблицах без долгих блокировок); при сбое
+посередине она перезапускается целиком, поэтому тоже должна быть идемпотентной.
+
+init_db() выполняется при импорте в каждом экземпляре бота, поэтому
+create_all и миграции идут под блокировкой на уровне БД (_migration_lock):
+второй экземпляр ждёт первого и перечитывает применённые версии.
+"""
+
+import importlib
+import logging
+import pkgutil
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Имя блокировки GET_LOCK (MySQL) / ключ pg_advisory_lock (PostgreSQL)
+LOCK_NAME = "schema_migrations"
+LOCK_KEY = 715_001
+# Сколько ждать экземпляр, который уже применяет миграции, сек.
+LOCK_TIMEOUT = 3600
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _discover() -> list[tuple[int, str, object]]:
+    """Все миграции из db/migrations/versions, по возрастанию версии."""
+    from db.migrations import versions
+
+    found = []
+    for module in pkgutil.iter_modules(versions.__path__):
+        number, _, name = module.name.partition("_")
+        if not number.isdigit():
+            continue
+        found.append(
+            (int(number), name, importlib.import_module(f"{versions.__name__}.{module.name}"))
+        )
+    return sorted(found, key=lambda item: item[0])
+
+
+class _ConnectionEngine:
+    """
+    engine для миграций на SQLite: connect() и begin() отдают соединение,
+    которое держит блокировку (BEGIN IMMEDIATE). Через другое соединение
+    миграция ждала бы саму себя.
+    """
+
+    def __init__(self, conn: Connection):
+        self._conn = conn
+        self.dialect = conn.dialect
+
+    @contextmanager
+    def connect(self):
+        yield self._conn
+
+    begin = connect
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    """
+    Блокировка миграций между экземплярами бота. Отдаёт engine, через который
+    их выполнять. MySQL — GET_LOCK, PostgreSQL — pg_advisory_lock на отдельном
+    соединении. В SQLite блокировок на уровне сессии нет: соединение открывает
+    BEGIN IMMEDIATE (блокировка записи до commit), и все миграции идут через
+    него одной транзакцией.
+    """
+    dialect = engine.dialect.name
+    with engine.connect() as conn:
+        if dialect == "sqlite":
+            # BEGIN IMMEDIATE ждёт чужую запись busy_timeout мс (по умолчанию 5 сек.)
+            busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {LOCK_TIMEOUT * 1000}")
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    yield _ConnectionEngine(conn)
+                except BaseException:
+                    conn.rollback()
+                    raise
+                conn.commit()
+            finally:
+                conn.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+            return
+
+        params = {"name": LOCK_NAME, "key": LOCK_KEY, "timeout": 0}
+        if dialect == "mysql":
+            lock = text("SELECT GET_LOCK(:name, :timeout)")
+            if conn.execute(lock, params).scalar() != 1:
+                logger.info("Миграции применяет другой экземпляр, ждём блокировку")
+                params["timeout"] = LOCK_TIMEOUT
+                if conn.execute(lock, params).scalar() != 1:
+                    raise RuntimeError(
+                        f"Не дождались блокировки миграций за {LOCK_TIMEOUT} сек."
+                    )
+            unlock = text("SELECT RELEASE_LOCK(:name)")
+        elif dialect == "postgresql":
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), params).scalar():
+                logger.info("Миграции применяет другой экземпляр, ждём блокировку")
+                conn.execute(text("SELECT pg_advisory_lock(:key)"), params)
+            unlock = text("SELECT pg_advisory_unlock(:key)")
+        else:
+            yield engine
+            return
+        # блокировка держится сессией; транзакцию (снимок) не держим
+        conn.commit()
+        try:
+            yield engine
+        finally:
+            conn.execute(unlock, params)
+            conn.commit()
+
+
+def run_migrations(engine: Engine, metadata: Optional[MetaData] = None) -> list[int]:
+    """
+    Применяет новые миграции по порядку. Возвращает применённые версии.
+    metadata — таблицы моделей: create_all под той же блокировкой.
+    """
+    with _migration_lock(engine) as locked:
+        # версии перечитываются под блокировкой: их мог применить другой экземпляр
+        with locked.begin() as conn:
+            if metadata is not None:
+                metadata.create_all(bind=conn)
+            _metadata.create_all(bind=conn)
+            applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+        done = []
+        for version, name, module in _discover():
+            if version in applied:
+                continue
+            logger.info("Миграция %04d_%s: применяем", version, name)
+            started = datetime.utcnow()
+            if getattr(module, "BATCHED", False):
+                # долгий перенос данных: миграция сама коммитит пачками
+                module.upgrade(locked)
+            with locked.begin() as conn:
+                if not getattr(module, "BATCHED", False):
+                    module.upgrade(conn)
+                conn.execute(
+                    schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    )
+                )
+            logger.info(
+                "Миграция %04d_%s: готово за %.1f сек.",
+                version,
+                name,
+                (datetime.utcnow() - started).total_seconds(),
+            )
+            done.append(version)
+    return done
+
+
+# ---------- помощники для миграций ----------
+def has_index(conn: Connection, table: str, name: str) -> bool:
+    return any(index["name"] == name for index in inspect(conn).get_indexes(table))
+
+
+def create_index(
+    conn: Connection, table: str, name: str, columns: list[str], unique: bool = False
+) -> bool:
+    """CREATE INDEX, если индекса ещё нет. Возвращает True, если создан."""
+    if has_index(conn, table, name):
+        return False
+    cols = ", ".join(columns)
+    conn.execute(
+        text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({cols})")
+    )
+    logger.info("Создан индекс %s ON %s (%s)", name, table, cols)
+    return True
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(col["name"] == column for col in inspect(conn).get_columns(table))
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN, если колонки ещё нет. ddl — тип и ограничения."""
+    if has_column(conn, table, column):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    logger.info("Добавлена колонка %s.%s %s", table, column, ddl)
+    return True
@@ -0,0 +1,32 @@
+"""
+Индексы под основные запросы бота и мониторинга (до этого telegram_messages
+читалась полным сканированием):
+  - get_chat_messages / list_chats_for_account: (account_id, chat_id, date)
+  - mark_deleted_messages (в личке без chat_id): (account_id, message_id)
+  - get_current_user / login_user: user_sessions.telegram_user_id
+  - get_telegram_account_by_alias: (user_id, alias)
+  - инкрементальная сверка мониторинга: telegram_accounts.updated_at
+"""
+
+from db.migrations import create_index
+
+INDEXES = [
+    (
+        "telegram_messages",
+        "ix_telegram_messages_account_chat_date",
+        ["account_id", "chat_id", "date"],
+    ),
+    (
+        "telegram_messages",
+        "ix_telegram_messages_account_message",
+        ["account_id", "message_id"],
+    ),
+    ("user_sessions", "ix_user_sessions_telegram_user_id", ["telegram_user_id"]),
+    ("telegram_accounts", "ix_telegram_accounts_user_alias", ["user_id", "alias"]),
+    ("telegram_accounts", "ix_telegram_accounts_updated_at", ["updated_at"]),
+]
+
+
+def upgrade(conn):
+    for table, name, columns in INDEXES:
+        create_index(conn, table, name, columns)
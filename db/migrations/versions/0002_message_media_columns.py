@@ -0,0 +1,21 @@
+"""
+Колонки telegram_messages для фоновой загрузки медиа и хранилища по хэшу:
+media_state, media_size, media_blob_id. В старых строках media_state
+проставляется "done", если файл уже был сохранён.
+"""
+
+from sqlalchemy import text
+
+from db.migrations import add_column
+
+
+def upgrade(conn):
+    add_column(conn, "telegram_messages", "media_state", "VARCHAR(20) NULL")
+    add_column(conn, "telegram_messages", "media_size", "BIGINT NULL")
+    add_column(conn, "telegram_messages", "media_blob_id", "INTEGER NULL")
+    conn.execute(
+        text(
+            "UPDATE telegram_messages SET media_state = 'done' "
+            "WHERE media_path IS NOT NULL AND media_state IS NULL"
+        )
+    )
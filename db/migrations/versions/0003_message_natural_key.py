@@ -0,0 +1,23 @@
+"""
+Уникальный естественный ключ сообщения (account_id, chat_id, message_id).
+Сначала пачками схлопываются накопившиеся дубли (db.services.message_dedup),
+затем создаётся уникальный индекс. На большой таблице дубли можно убрать
+заранее, не останавливая бота: python -m scripts.dedup_messages
+"""
+
+from db.migrations import create_index
+from db.services.message_dedup import dedup_messages
+
+BATCHED = True
+
+
+def upgrade(engine):
+    dedup_messages(engine)
+    with engine.begin() as conn:
+        create_index(
+            conn,
+            "telegram_messages",
+            "uq_telegram_messages_account_chat_message",
+            ["account_id", "chat_id", "message_id"],
+            unique=True,
+        )
@@ -0,0 +1,12 @@
+"""
+Заполнение сводки чатов (chat_summaries) по уже сохранённым сообщениям.
+Таблицу создаёт create_all, дальше её поддерживает запись сообщений.
+"""
+
+from db.services.chat_summary import rebuild_chat_summaries
+
+BATCHED = True
+
+
+def upgrade(engine):
+    rebuild_chat_summaries(engine)
@@ -0,0 +1,68 @@
+"""
+Полнотекстовый индекс по telegram_messages.text (db.services.async_search_crud):
+  - SQLite: FTS5-таблица telegram_messages_fts с content=telegram_messages
+    и триггерами, которые держат её в актуальном состоянии при записи;
+    уже сохранённые сообщения индексируются командой 'rebuild'.
+  - MySQL: FULLTEXT-индекс (InnoDB обновляет его сам).
+  - Остальные бэкенды: индекса нет, поиск идёт через LIKE.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from db.migrations import has_index
+
+logger = logging.getLogger(__name__)
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS telegram_messages_fts USING fts5(
+        text, content='telegram_messages', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS telegram_messages_fts_insert
+    AFTER INSERT ON telegram_messages BEGIN
+        INSERT INTO telegram_messages_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS telegram_messages_fts_delete
+    AFTER DELETE ON telegram_messages BEGIN
+        INSERT INTO telegram_messages_fts(telegram_messages_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS telegram_messages_fts_update
+    AFTER UPDATE OF text ON telegram_messages BEGIN
+        INSERT INTO telegram_messages_fts(telegram_messages_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO telegram_messages_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+
+def upgrade(conn):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        for ddl in SQLITE_DDL:
+            conn.execute(text(ddl))
+        conn.execute(
+            text("INSERT INTO telegram_messages_fts(telegram_messages_fts) VALUES ('rebuild')")
+        )
+    elif dialect == "mysql":
+        if not has_index(conn, "telegram_messages", "ft_telegram_messages_text"):
+            conn.execute(
+                text(
+                    "ALTER TABLE telegram_messages "
+                    "ADD FULLTEXT INDEX ft_telegram_messages_text (text)"
+                )
+            )
+    else:
+        logger.warning(
+            "Полнотекстовый индекс для %s не поддерживается, поиск будет через LIKE",
+            dialect,
+        )
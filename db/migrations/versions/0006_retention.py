@@ -0,0 +1,17 @@
+"""
+Срок хранения архива: колонки политики аккаунта в telegram_accounts
+и индекс (account_id, date) для очистки устаревших сообщений пачками.
+"""
+
+from db.migrations import add_column, create_index
+
+
+def upgrade(conn):
+    add_column(conn, "telegram_accounts", "retention_text_days", "INTEGER NULL")
+    add_column(conn, "telegram_accounts", "retention_media_days", "INTEGER NULL")
+    create_index(
+        conn,
+        "telegram_messages",
+        "ix_telegram_messages_account_date",
+        ["account_id", "date"],
+    )
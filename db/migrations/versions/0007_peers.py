@@ -0,0 +1,14 @@
+"""
+Имена собеседников — в таблицу peers (текущее) и peer_names (история).
+Таблицы создаёт create_all, миграция переносит имена из уже сохранённых
+сообщений и очищает chat_name/sender_name в их строках.
+На SQLite место в файле освободит только VACUUM.
+"""
+
+from db.services.peers import backfill_peers
+
+BATCHED = True
+
+
+def upgrade(engine):
+    backfill_peers(engine)
@@ -0,0 +1,11 @@
+"""
+Индексы user_sessions: expires_at — для фоновой очистки истёкших сессий
+пачками, user_id — для удаления старых сессий пользователя при входе.
+"""
+
+from db.migrations import create_index
+
+
+def upgrade(conn):
+    create_index(conn, "user_sessions", "ix_user_sessions_expires_at", ["expires_at"])
+    create_index(conn, "user_sessions", "ix_user_sessions_user_id", ["user_id"])
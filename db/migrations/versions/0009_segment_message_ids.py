@@ -0,0 +1,31 @@
+"""
+Диапазон message_id в message_segments — чтобы удаление и повторная доставка
+архивного сообщения находили его сегмент. Для уже записанных сегментов
+диапазон считается по их файлам. Таблицу segment_deletions создаёт create_all.
+"""
+
+from sqlalchemy import select, update
+
+from db.migrations import add_column
+from db.models.model import MessageSegment
+from db.services.message_archive import read_segment
+
+
+def upgrade(conn):
+    add_column(conn, "message_segments", "message_id_from", "BIGINT NULL")
+    add_column(conn, "message_segments", "message_id_to", "BIGINT NULL")
+    segments = conn.execute(
+        select(MessageSegment.id, MessageSegment.path).where(
+            MessageSegment.message_id_from.is_(None)
+        )
+    ).all()
+    for segment_id, path in segments:
+        ids = [m["message_id"] for m in read_segment(path)]
+        if not ids:
+            # файла нет — найти в нём сообщение всё равно нельзя
+            continue
+        conn.execute(
+            update(MessageSegment)
+            .where(MessageSegment.id == segment_id)
+            .values(message_id_from=min(ids), message_id_to=max(ids))
+        )
@@ -4,6 +4,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     BigInteger,
@@ -42,14 +43,15 @@ class User(Base, TimestampMixin):
 
 class UserSession(Base, TimestampMixin):
     __tablename__ = "user_sessions"
+    # индексы user_id и expires_at для существующих БД создаёт миграция 0008_session_sweep
 
     id = Column(Integer, primary_key=True)
     user_id = Column(
-        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
-    telegram_user_id = Column(String(50), nullable=False)
+    telegram_user_id = Column(String(50), nullable=False, index=True)
     session_token = Column(String(255), unique=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
 
     user = relationship("User", back_populates="sessions")
 
@@ -59,6 +61,12 @@ class UserSession(Base, TimestampMixin):
 
 class TelegramAccount(Base, TimestampMixin):
     __tablename__ = "telegram_accounts"
+    # индексы также создаёт миграция 0001_index_pack для существующих БД
+    __table_args__ = (
+        Index("ix_telegram_accounts_user_alias", "user_id", "alias"),
+        # инкрементальная сверка мониторинга по updated_at
+        Index("ix_telegram_accounts_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(
@@ -78,6 +86,10 @@ class TelegramAccount(Base, TimestampMixin):
         Boolean, default=False, nullable=False
     )  # "в руках" у менеджера или нет
 
+    # срок хранения, дней: None — глобальный RETENTION_*_DAYS, 0 — бессрочно
+    retention_text_days = Column(Integer, nullable=True)
+    retention_media_days = Column(Integer, nullable=True)
+
     messages = relationship(
         "TelegramMessage", back_populates="account", cascade="all, delete-orphan"
     )
@@ -95,14 +107,34 @@ class TelegramMessage(Base, TimestampMixin):
     """
 
     __tablename__ = "telegram_messages"
+    # индексы также создаёт миграция 0001_index_pack для существующих БД
+    __table_args__ = (
+        Index(
+            "ix_telegram_messages_account_chat_date", "account_id", "chat_id", "date"
+        ),
+        # пометка удалённых: в личке удаление приходит без chat_id
+        Index("ix_telegram_messages_account_message", "account_id", "message_id"),
+        # очистка по сроку хранения (миграция 0006_retention)
+        Index("ix_telegram_messages_account_date", "account_id", "date"),
+        # естественный ключ (миграция 0003_message_natural_key)
+        Index(
+            "uq_telegram_messages_account_chat_message",
+            "account_id",
+            "chat_id",
+            "message_id",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     account_id = Column(
         Integer, ForeignKey("telegram_accounts.id", ondelete="CASCADE"), nullable=False
     )
-    chat_name = Column(String(50), nullable=False)
+    # имена чата и отправителя — в peers (по chat_id / sender_id); колонки
+    # остались от старой схемы, новые строки их не заполняют (миграция 0007_peers)
+    chat_name = Column(String(50), nullable=False, default="")
     chat_id = Column(BigInteger, nullable=False)  # ID чата в Telegram
-    sender_name = Column(String(100), nullable=True)  # Имя отправителя
+    sender_name = Column(String(100), nullable=True)
     message_id = Column(BigInteger, nullable=False)  # ID сообщения в чате
     sender_id = Column(
         BigInteger, nullable=True
@@ -119,8 +151,225 @@ class TelegramMessage(Base, TimestampMixin):
     )  # ID пересланного сообщения в логовой группе
     media_type = Column(String(50), nullable=True)  # "voice", "document", "photo", etc.
     media_path = Column(String(255), nullable=True)
+    # "pending" (ждёт скачивания), "done", "skipped" (лимит размера), "failed"
+    media_state = Column(String(20), nullable=True)
+    media_size = Column(BigInteger, nullable=True)  # размер файла в байтах
+    # файл в хранилище по хэшу (media_path указывает на него же)
+    media_blob_id = Column(
+        Integer, ForeignKey("media_blobs.id", ondelete="SET NULL"), nullable=True
+    )
 
     account = relationship("TelegramAccount", back_populates="messages")
 
     def __repr__(self):
         return f"<TelegramMessage(id={self.id}, chat_id={self.chat_id}, message_id={self.message_id})>"
+
+
+class AccountLease(Base, TimestampMixin):
+    """
+    Аренда аккаунта мониторинга: какой экземпляр бота сейчас держит
+    Telethon-клиент этого аккаунта. Владелец продлевает expires_at
+    (heartbeat), просроченную аренду забирает другой экземпляр.
+    """
+
+    __tablename__ = "account_leases"
+
+    account_id = Column(
+        Integer,
+        ForeignKey("telegram_accounts.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    owner_id = Column(String(100), nullable=False, index=True)  # INSTANCE_ID
+    expires_at = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<AccountLease(account_id={self.account_id}, owner_id='{self.owner_id}', expires_at={self.expires_at})>"
+
+
+class MonitoringInstance(Base, TimestampMixin):
+    """Живые экземпляры бота — по ним считается справедливая доля аккаунтов."""
+
+    __tablename__ = "monitoring_instances"
+
+    instance_id = Column(String(100), primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<MonitoringInstance(instance_id='{self.instance_id}', heartbeat_at={self.heartbeat_at})>"
+
+
+class MediaBlob(Base, TimestampMixin):
+    """
+    Медиафайл в хранилище по содержимому (sha256): одинаковые фото/документы
+    из разных чатов и аккаунтов хранятся один раз. ref_count — сколько
+    сообщений ссылается на файл; при 0 файл и запись удаляются.
+    """
+
+    __tablename__ = "media_blobs"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    path = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<MediaBlob(id={self.id}, sha256='{self.sha256}', ref_count={self.ref_count})>"
+
+
+class MediaFileId(Base, TimestampMixin):
+    """
+    Telegram-id файла (photo.id / document.id) -> blob. Позволяет не скачивать
+    повторно файл, который уже есть (пересланное фото, стикер).
+    """
+
+    __tablename__ = "media_file_ids"
+
+    file_key = Column(String(64), primary_key=True)  # "photo:<id>" / "document:<id>"
+    blob_id = Column(
+        Integer, ForeignKey("media_blobs.id", ondelete="CASCADE"), nullable=False
+    )
+
+    def __repr__(self):
+        return f"<MediaFileId(file_key='{self.file_key}', blob_id={self.blob_id})>"
+
+
+class ChatSummary(Base, TimestampMixin):
+    """
+    Сводка по чату аккаунта, которую мониторинг обновляет при записи сообщений
+    и пометке удалённых: список чатов читается отсюда, без GROUP BY по
+    telegram_messages. Если сводка разошлась с сообщениями — /rebuild_chat_summary.
+    """
+
+    __tablename__ = "chat_summaries"
+    __table_args__ = (
+        Index("ix_chat_summaries_account_last", "account_id", "last_message_at"),
+    )
+
+    account_id = Column(
+        Integer,
+        ForeignKey("telegram_accounts.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    chat_id = Column(BigInteger, primary_key=True)
+    chat_name = Column(String(50), nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+    deleted_count = Column(Integer, default=0, nullable=False)
+    media_bytes = Column(BigInteger, default=0, nullable=False)  # сумма media_size
+    last_message_at = Column(DateTime, nullable=True)
+    last_sender_name = Column(String(100), nullable=True)
+
+    def __repr__(self):
+        return f"<ChatSummary(account_id={self.account_id}, chat_id={self.chat_id}, message_count={self.message_count})>"
+
+
+class MessageSegment(Base, TimestampMixin):
+    """
+    Холодный архив: сжатый файл с сообщениями одного чата за диапазон дат
+    (db/services/message_archive.py). Строки перенесены сюда из telegram_messages,
+    в БД остаётся только эта запись; чтение истории объединяет оба уровня.
+    """
+
+    __tablename__ = "message_segments"
+    __table_args__ = (
+        Index(
+            "ix_message_segments_account_chat_date", "account_id", "chat_id", "date_to"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(
+        Integer, ForeignKey("telegram_accounts.id", ondelete="CASCADE"), nullable=False
+    )
+    chat_id = Column(BigInteger, nullable=False)
+    chat_name = Column(String(50), nullable=False)
+    path = Column(String(255), nullable=False)  # файл .jsonl.gz
+    date_from = Column(DateTime, nullable=False)
+    date_to = Column(DateTime, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    deleted_count = Column(Integer, default=0, nullable=False)
+    media_bytes = Column(BigInteger, default=0, nullable=False)  # сумма media_size
+    last_sender_name = Column(String(100), nullable=True)
+    size = Column(BigInteger, nullable=False)  # размер файла в байтах
+    # диапазон message_id сообщений сегмента — поиск сообщения по id
+    # (удаление, повторная доставка) без чтения всех файлов чата
+    message_id_from = Column(BigInteger, nullable=True)
+    message_id_to = Column(BigInteger, nullable=True)
+
+    def __repr__(self):
+        return f"<MessageSegment(id={self.id}, account_id={self.account_id}, chat_id={self.chat_id}, messages={self.message_count})>"
+
+
+class SegmentDeletion(Base, TimestampMixin):
+    """
+    Удаление сообщения, которое уже в холодном архиве: файл сегмента не
+    меняется, пометка хранится здесь и накладывается на него при чтении.
+    """
+
+    __tablename__ = "segment_deletions"
+    __table_args__ = (
+        Index(
+            "ix_segment_deletions_account_chat_message",
+            "account_id",
+            "chat_id",
+            "message_id",
+        ),
+    )
+
+    segment_id = Column(
+        Integer,
+        ForeignKey("message_segments.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    message_id = Column(BigInteger, primary_key=True)
+    account_id = Column(
+        Integer, ForeignKey("telegram_accounts.id", ondelete="CASCADE"), nullable=False
+    )
+    chat_id = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<SegmentDeletion(segment_id={self.segment_id}, message_id={self.message_id})>"
+
+
+class Peer(Base, TimestampMixin):
+    """
+    Собеседник (пользователь/чат) аккаунта: текущее отображаемое имя.
+    Сообщения ссылаются на него числом — chat_id и sender_id.
+    """
+
+    __tablename__ = "peers"
+
+    account_id = Column(
+        Integer,
+        ForeignKey("telegram_accounts.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    peer_id = Column(BigInteger, primary_key=True)  # ID в Telegram
+    name = Column(String(100), nullable=False)
+
+    def __repr__(self):
+        return f"<Peer(account_id={self.account_id}, peer_id={self.peer_id}, name='{self.name}')>"
+
+
+class PeerName(Base, TimestampMixin):
+    """История имён собеседника: каждое имя, под которым он встречался."""
+
+    __tablename__ = "peer_names"
+    __table_args__ = (
+        Index(
+            "uq_peer_names_account_peer_name", "account_id", "peer_id", "name", unique=True
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(
+        Integer, ForeignKey("telegram_accounts.id", ondelete="CASCADE"), nullable=False
+    )
+    peer_id = Column(BigInteger, nullable=False)
+    name = Column(String(100), nullable=False)
+    first_seen_at = Column(DateTime, nullable=False)  # дата первого сообщения с этим именем
+
+    def __repr__(self):
+        return f"<PeerName(account_id={self.account_id}, peer_id={self.peer_id}, name='{self.name}')>"
@@ -0,0 +1,95 @@
+"""
+Перенос старых сообщений в холодный архив (db/services/message_archive.py).
+
+Один вызов archive_messages — один сегмент: самые старые сообщения одного
+чата пишутся в сжатый файл, затем в одной транзакции добавляется запись
+message_segments и строки удаляются из telegram_messages. Файл пишется до
+commit; если транзакция не прошла, он удаляется, и строки остаются в БД.
+Ссылки на медиа (media_blob_id) переходят в сегмент вместе с сообщением,
+сводка чатов не меняется — история никуда не пропадает.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+
+from db.models.model import MessageSegment, TelegramMessage
+from db.services import peers
+from db.services.manager import get_async_db_session, lock_for_batch
+from db.services.message_archive import (
+    remove_segment_files,
+    segment_path,
+    write_segment,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def archive_messages(account_id: int, before: datetime, segment_size: int) -> dict:
+    """
+    Переносит в новый сегмент до segment_size самых старых сообщений одного
+    чата аккаунта с датой раньше before. Возвращает {"messages", "size"};
+    messages == 0 — переносить больше нечего.
+    """
+    table = TelegramMessage.__table__
+    path = None
+    try:
+        async with get_async_db_session() as db:
+            # чат с самым старым сообщением — по индексу (account_id, date)
+            chat_id = await db.scalar(
+                select(table.c.chat_id)
+                .where(table.c.account_id == account_id, table.c.date < before)
+                .order_by(table.c.date)
+                .limit(1)
+            )
+            if chat_id is None:
+                return {"messages": 0, "size": 0}
+            query = (
+                select(table)
+                .where(
+                    table.c.account_id == account_id,
+                    table.c.chat_id == chat_id,
+                    table.c.date < before,
+                )
+                .order_by(table.c.date, table.c.message_id)
+                .limit(segment_size)
+            )
+            result = await db.execute(await lock_for_batch(db, query))
+            messages = [dict(row._mapping) for row in result]
+            if not messages:
+                # строки заняты (или уже перенесены) другим экземпляром
+                return {"messages": 0, "size": 0}
+
+            # имена для записи сегмента — из peers (в строках их уже нет)
+            last = dict(messages[-1])
+            conn = await db.connection()
+            await conn.run_sync(peers.resolve_names, [last])
+            path = segment_path(account_id, chat_id, messages[0]["date"])
+            size = await asyncio.to_thread(write_segment, path, messages)
+            await db.execute(
+                insert(MessageSegment).values(
+                    account_id=account_id,
+                    chat_id=chat_id,
+                    chat_name=last["chat_name"],
+                    path=path,
+                    date_from=messages[0]["date"],
+                    date_to=messages[-1]["date"],
+                    message_count=len(messages),
+                    deleted_count=sum(1 for m in messages if m["deleted_at"]),
+                    media_bytes=sum(m["media_size"] or 0 for m in messages),
+                    last_sender_name=last["sender_name"],
+                    size=size,
+                    message_id_from=min(m["message_id"] for m in messages),
+                    message_id_to=max(m["message_id"] for m in messages),
+                )
+            )
+            await db.execute(
+                delete(table).where(table.c.id.in_([m["id"] for m in messages]))
+            )
+    except Exception:
+        if path:
+            remove_segment_files([path])
+        raise
+    return {"messages": len(messages), "size": size}
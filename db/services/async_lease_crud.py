@@ -0,0 +1,178 @@
+"""
+Аренда аккаунтов мониторинга между экземплярами бота (account_leases)
+и heartbeat самих экземпляров (monitoring_instances).
+
+heartbeat_at и expires_at пишутся и сравниваются по часам БД (db_utcnow):
+часы серверов с разными экземплярами могут расходиться, и тогда один
+считал бы чужую аренду просроченной раньше срока.
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import delete, func, select, update
+
+from db.models.model import AccountLease, MonitoringInstance
+from db.services.manager import db_utcnow, get_async_db_session, insert_ignore
+
+logger = logging.getLogger(__name__)
+
+
+async def heartbeat_instance(instance_id: str, ttl: int) -> int:
+    """
+    Отмечает экземпляр живым и возвращает количество живых экземпляров
+    (heartbeat не старше ttl секунд), включая этот.
+    """
+    now = datetime.utcnow()
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            update(MonitoringInstance)
+            .where(MonitoringInstance.instance_id == instance_id)
+            .values(heartbeat_at=db_utcnow(db), updated_at=now)
+        )
+        if result.rowcount == 0:
+            await db.execute(
+                insert_ignore(db, MonitoringInstance).values(
+                    instance_id=instance_id,
+                    heartbeat_at=db_utcnow(db),
+                    created_at=now,
+                    updated_at=now,
+                )
+            )
+        # давно пропавшие экземпляры больше не нужны
+        await db.execute(
+            delete(MonitoringInstance).where(
+                MonitoringInstance.heartbeat_at < db_utcnow(db, -ttl * 10)
+            )
+        )
+        count = await db.scalar(
+            select(func.count()).where(
+                MonitoringInstance.heartbeat_at >= db_utcnow(db, -ttl)
+            )
+        )
+        return max(1, count or 0)
+
+
+async def delete_instance(instance_id: str) -> None:
+    async with get_async_db_session() as db:
+        await db.execute(
+            delete(MonitoringInstance).where(
+                MonitoringInstance.instance_id == instance_id
+            )
+        )
+
+
+async def renew_account_leases(
+    owner_id: str, account_ids: Iterable[int], ttl: int
+) -> set[int]:
+    """
+    Продлевает аренду своих аккаунтов из account_ids.
+    Возвращает аккаунты, которые по-прежнему принадлежат owner_id.
+    """
+    account_ids = list(account_ids)
+    if not account_ids:
+        return set()
+    now = datetime.utcnow()
+    async with get_async_db_session() as db:
+        await db.execute(
+            update(AccountLease)
+            .where(
+                AccountLease.owner_id == owner_id,
+                AccountLease.account_id.in_(account_ids),
+            )
+            .values(
+                expires_at=db_utcnow(db, ttl),
+                heartbeat_at=db_utcnow(db),
+                updated_at=now,
+            )
+        )
+        result = await db.execute(
+            select(AccountLease.account_id).where(
+                AccountLease.owner_id == owner_id,
+                AccountLease.account_id.in_(account_ids),
+            )
+        )
+        return set(result.scalars())
+
+
+async def claim_account_leases(
+    owner_id: str, account_ids: Iterable[int], ttl: int, limit: int
+) -> set[int]:
+    """
+    Забирает до limit аккаунтов из account_ids: свободные (без аренды)
+    и с просроченной арендой. Гонка с другими экземплярами решается в БД:
+    INSERT пропускает занятые ключи, UPDATE повторно проверяет expires_at.
+    Возвращает аккаунты, которые удалось взять.
+    """
+    account_ids = list(account_ids)
+    if not account_ids or limit <= 0:
+        return set()
+    now = datetime.utcnow()
+    async with get_async_db_session() as db:
+        # просрочена ли аренда — решает БД по своим часам
+        result = await db.execute(
+            select(
+                AccountLease.account_id, AccountLease.expires_at < db_utcnow(db)
+            ).where(AccountLease.account_id.in_(account_ids))
+        )
+        leased = dict(result.all())
+        free = [acc_id for acc_id in account_ids if acc_id not in leased][:limit]
+        expired = [
+            acc_id for acc_id, is_expired in leased.items() if is_expired
+        ][: limit - len(free)]
+
+        if free:
+            await db.execute(
+                insert_ignore(db, AccountLease).values(
+                    expires_at=db_utcnow(db, ttl), heartbeat_at=db_utcnow(db)
+                ),
+                [
+                    {
+                        "account_id": acc_id,
+                        "owner_id": owner_id,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for acc_id in free
+                ],
+            )
+        if expired:
+            await db.execute(
+                update(AccountLease)
+                .where(
+                    AccountLease.account_id.in_(expired),
+                    AccountLease.expires_at < db_utcnow(db),
+                )
+                .values(
+                    owner_id=owner_id,
+                    expires_at=db_utcnow(db, ttl),
+                    heartbeat_at=db_utcnow(db),
+                    updated_at=now,
+                )
+            )
+        if not free and not expired:
+            return set()
+
+        result = await db.execute(
+            select(AccountLease.account_id).where(
+                AccountLease.owner_id == owner_id,
+                AccountLease.account_id.in_(free + expired),
+            )
+        )
+        return set(result.scalars())
+
+
+async def release_account_leases(
+    owner_id: str, account_ids: Iterable[int] | None = None
+) -> int:
+    """Отдаёт аренду аккаунтов (все аккаунты владельца, если account_ids=None)."""
+    query = delete(AccountLease).where(AccountLease.owner_id == owner_id)
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return 0
+        query = query.where(AccountLease.account_id.in_(account_ids))
+    async with get_async_db_session() as db:
+        result = await db.execute(query)
+        return result.rowcount
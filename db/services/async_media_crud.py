@@ -0,0 +1,105 @@
+"""
+Хранилище медиа по содержимому: media_blobs (sha256 -> файл, ref_count)
+и media_file_ids (Telegram-id файла -> blob).
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models.model import MediaBlob, MediaFileId
+from db.services.manager import get_async_db_session, insert_ignore
+from db.services.media_refs import release_blob_refs, remove_blob_files
+
+logger = logging.getLogger(__name__)
+
+
+def _blob_to_dict(blob: MediaBlob) -> dict:
+    return {
+        "id": blob.id,
+        "sha256": blob.sha256,
+        "path": blob.path,
+        "size": blob.size,
+        "ref_count": blob.ref_count,
+    }
+
+
+async def get_media_blob_by_file_key(file_key: str) -> Optional[dict]:
+    """Blob, уже скачанный по этому Telegram-id файла, или None."""
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(MediaBlob)
+            .join(MediaFileId, MediaFileId.blob_id == MediaBlob.id)
+            .where(MediaFileId.file_key == file_key)
+        )
+        blob = result.scalars().first()
+        return _blob_to_dict(blob) if blob else None
+
+
+async def get_or_create_media_blob(
+    sha256: str, path: str, size: int, file_key: Optional[str] = None
+) -> dict:
+    """
+    Возвращает blob с этим sha256, создавая запись при необходимости,
+    и связывает с ним file_key. Гонку нескольких процессов решает
+    уникальный ключ sha256 (INSERT IGNORE + повторный SELECT).
+    Новая запись создаётся с ref_count=0: ссылку берёт update_messages_media,
+    а blob, до которого она так и не дошла, удаляет очистка
+    (purge_orphan_media_blobs).
+    """
+    async with get_async_db_session() as db:
+        await db.execute(
+            insert_ignore(db, MediaBlob),
+            [{"sha256": sha256, "path": path, "size": size, "ref_count": 0}],
+        )
+        result = await db.execute(select(MediaBlob).filter_by(sha256=sha256))
+        blob = result.scalars().one()
+        if file_key:
+            await db.execute(
+                insert_ignore(db, MediaFileId),
+                [{"file_key": file_key, "blob_id": blob.id}],
+            )
+        return _blob_to_dict(blob)
+
+
+async def lock_media_blobs(db: AsyncSession, blob_ids: Iterable[int]) -> set[int]:
+    """
+    Блокирует записи blob'ов до конца транзакции вызывающего и возвращает id
+    тех, что ещё существуют: пока блокировка держится, очистка не удалит их
+    между проверкой и add_media_blob_refs.
+    """
+    blob_ids = list(blob_ids)
+    if not blob_ids:
+        return set()
+    # UPDATE без изменений, а не FOR UPDATE: в SQLite он тоже берёт блокировку
+    await db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.id.in_(blob_ids))
+        .values(ref_count=MediaBlob.ref_count)
+    )
+    result = await db.execute(select(MediaBlob.id).where(MediaBlob.id.in_(blob_ids)))
+    return set(result.scalars())
+
+
+async def add_media_blob_refs(db: AsyncSession, counts: Dict[int, int]) -> None:
+    """Увеличивает ref_count (в транзакции вызывающего)."""
+    for blob_id, count in counts.items():
+        await db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.id == blob_id)
+            .values(ref_count=MediaBlob.ref_count + count)
+        )
+
+
+async def release_media_blobs(db: AsyncSession, counts: Dict[int, int]) -> list[str]:
+    """
+    Уменьшает ref_count (в транзакции вызывающего) и удаляет записи blob'ов,
+    на которые больше никто не ссылается (media_refs.release_blob_refs).
+    Возвращает пути их файлов — удалить через remove_blob_files() после commit.
+    """
+    if not counts:
+        return []
+    conn = await db.connection()
+    return await conn.run_sync(release_blob_refs, counts)
@@ -0,0 +1,306 @@
+"""
+Очистка архива по сроку хранения: удаление старых сообщений (в том числе
+сегментов холодного архива целиком) и файлов медиа, а также blob'ов,
+на которые так и не сослалось ни одно сообщение.
+
+Каждая функция обрабатывает одну пачку в короткой транзакции — фоновая
+задача (bot/monitoring/retention.py) вызывает их в цикле с паузами,
+чтобы не держать долгих блокировок и не копить отставание реплик.
+Строки пачки блокируются (manager.lock_for_batch): несколько экземпляров
+бота не обработают одну строку дважды (и не освободят blob дважды).
+SKIP LOCKED — только там, где сервер его знает (не MariaDB до 10.6),
+иначе второй экземпляр ждёт commit первого на обычном FOR UPDATE.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, or_, select, update
+
+from db.models.model import (
+    MediaBlob,
+    MediaFileId,
+    MessageSegment,
+    SegmentDeletion,
+    TelegramAccount,
+    TelegramMessage,
+)
+from db.services import chat_summary
+from db.services.async_media_crud import release_media_blobs, remove_blob_files
+from db.services.manager import get_async_db_session, lock_for_batch
+from db.services.message_archive import read_segment, remove_segment_files
+
+logger = logging.getLogger(__name__)
+
+# media_state сообщения, у которого файл удалён по сроку хранения
+MEDIA_EXPIRED = "expired"
+
+
+def effective_days(account_days: Optional[int], default_days: int) -> int:
+    """Срок хранения аккаунта: своя настройка или глобальная; 0 — бессрочно."""
+    return default_days if account_days is None else account_days
+
+
+async def list_retention_policies() -> list[dict]:
+    """Аккаунты с их настройками срока хранения (None — глобальная политика)."""
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(
+                TelegramAccount.id,
+                TelegramAccount.alias,
+                TelegramAccount.retention_text_days,
+                TelegramAccount.retention_media_days,
+            ).order_by(TelegramAccount.id)
+        )
+        return [
+            {
+                "account_id": row.id,
+                "alias": row.alias,
+                "text_days": row.retention_text_days,
+                "media_days": row.retention_media_days,
+            }
+            for row in result
+        ]
+
+
+async def set_account_retention(
+    account_id: int, text_days: Optional[int], media_days: Optional[int]
+) -> None:
+    """Задаёт срок хранения аккаунта (None — вернуть глобальную политику)."""
+    async with get_async_db_session() as db:
+        await db.execute(
+            update(TelegramAccount)
+            .where(TelegramAccount.id == account_id)
+            .values(retention_text_days=text_days, retention_media_days=media_days)
+        )
+
+
+async def purge_expired_messages(
+    account_id: int, before: datetime, batch_size: int
+) -> dict:
+    """
+    Удаляет до batch_size сообщений аккаунта с датой раньше before,
+    освобождает их blob'ы и вычитает из сводки чатов.
+    Возвращает {"messages", "files", "freed_bytes"}; messages == 0 — больше нечего.
+    """
+    async with get_async_db_session() as db:
+        query = (
+            select(
+                TelegramMessage.id,
+                TelegramMessage.chat_id,
+                TelegramMessage.deleted_at,
+                TelegramMessage.media_size,
+                TelegramMessage.media_path,
+                TelegramMessage.media_blob_id,
+            )
+            .where(
+                TelegramMessage.account_id == account_id,
+                TelegramMessage.date < before,
+            )
+            .order_by(TelegramMessage.id)
+            .limit(batch_size)
+        )
+        result = await db.execute(await lock_for_batch(db, query))
+        rows = result.all()
+        if not rows:
+            return {"messages": 0, "files": 0, "freed_bytes": 0}
+
+        counts: dict[int, dict] = {}
+        released = Counter()
+        legacy_paths = []
+        for row in rows:
+            count = counts.setdefault(
+                row.chat_id, {"messages": 0, "deleted": 0, "media_bytes": 0}
+            )
+            count["messages"] += 1
+            count["deleted"] += row.deleted_at is not None
+            count["media_bytes"] += row.media_size or 0
+            if row.media_blob_id:
+                released[row.media_blob_id] += 1
+            elif row.media_path:
+                # файл из времён до хранилища по хэшу — принадлежит только этой строке
+                legacy_paths.append(row.media_path)
+
+        conn = await db.connection()
+        await conn.execute(
+            TelegramMessage.__table__.delete().where(
+                TelegramMessage.id.in_([row.id for row in rows])
+            )
+        )
+        await conn.run_sync(chat_summary.remove_messages, account_id, counts)
+        orphan_paths = await release_media_blobs(db, released)
+
+    paths = orphan_paths + legacy_paths
+    return {
+        "messages": len(rows),
+        "files": len(paths),
+        "freed_bytes": remove_blob_files(paths),
+    }
+
+
+async def purge_expired_media(
+    account_id: int, before: datetime, batch_size: int, after_id: int = 0
+) -> dict:
+    """
+    Убирает файлы медиа у до batch_size сообщений аккаунта с датой раньше before
+    и id больше after_id; сами сообщения остаются с media_state="expired".
+    Возвращает {"messages", "files", "freed_bytes", "last_id"} — last_id
+    передать следующему вызову как after_id.
+    """
+    async with get_async_db_session() as db:
+        query = (
+            select(
+                TelegramMessage.id,
+                TelegramMessage.media_path,
+                TelegramMessage.media_blob_id,
+            )
+            .where(
+                TelegramMessage.account_id == account_id,
+                TelegramMessage.id > after_id,
+                TelegramMessage.date < before,
+                or_(
+                    TelegramMessage.media_blob_id.is_not(None),
+                    TelegramMessage.media_path.is_not(None),
+                ),
+            )
+            .order_by(TelegramMessage.id)
+            .limit(batch_size)
+        )
+        result = await db.execute(await lock_for_batch(db, query))
+        rows = result.all()
+        if not rows:
+            return {"messages": 0, "files": 0, "freed_bytes": 0, "last_id": after_id}
+
+        released = Counter(row.media_blob_id for row in rows if row.media_blob_id)
+        legacy_paths = [
+            row.media_path for row in rows if row.media_path and not row.media_blob_id
+        ]
+        # media_size остаётся: сводка и просмотр знают, каким был файл
+        await db.execute(
+            update(TelegramMessage)
+            .where(TelegramMessage.id.in_([row.id for row in rows]))
+            .values(
+                media_state=MEDIA_EXPIRED,
+                media_path=None,
+                media_blob_id=None,
+                updated_at=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        orphan_paths = await release_media_blobs(db, released)
+
+    paths = orphan_paths + legacy_paths
+    return {
+        "messages": len(rows),
+        "files": len(paths),
+        "freed_bytes": remove_blob_files(paths),
+        "last_id": rows[-1].id,
+    }
+
+
+async def purge_expired_segments(
+    account_id: int, before: datetime, batch_size: int
+) -> dict:
+    """
+    Удаляет до batch_size сегментов холодного архива аккаунта, которые целиком
+    старше before (сегмент, где есть сообщения новее, ждёт следующих проходов),
+    освобождает blob'ы их сообщений и вычитает их из сводки чатов.
+    Возвращает {"segments", "messages", "files", "freed_bytes"}.
+    """
+    async with get_async_db_session() as db:
+        query = (
+            select(MessageSegment)
+            .where(MessageSegment.account_id == account_id, MessageSegment.date_to < before)
+            .order_by(MessageSegment.id)
+            .limit(batch_size)
+        )
+        result = await db.execute(await lock_for_batch(db, query))
+        segments = result.scalars().all()
+        if not segments:
+            return {"segments": 0, "messages": 0, "files": 0, "freed_bytes": 0}
+
+        counts: dict[int, dict] = {}
+        released = Counter()
+        legacy_paths = []
+        for segment in segments:
+            count = counts.setdefault(
+                segment.chat_id, {"messages": 0, "deleted": 0, "media_bytes": 0}
+            )
+            count["messages"] += segment.message_count
+            count["deleted"] += segment.deleted_count
+            count["media_bytes"] += segment.media_bytes
+            for message in await asyncio.to_thread(read_segment, segment.path):
+                if message.get("media_blob_id"):
+                    released[message["media_blob_id"]] += 1
+                elif message.get("media_path"):
+                    legacy_paths.append(message["media_path"])
+
+        segment_paths = [segment.path for segment in segments]
+        await db.execute(
+            delete(SegmentDeletion).where(
+                SegmentDeletion.segment_id.in_([segment.id for segment in segments])
+            )
+        )
+        for segment in segments:
+            await db.delete(segment)
+        await db.flush()
+        conn = await db.connection()
+        await conn.run_sync(chat_summary.remove_messages, account_id, counts)
+        orphan_paths = await release_media_blobs(db, released)
+
+    paths = orphan_paths + legacy_paths
+    freed = remove_blob_files(paths) + remove_segment_files(segment_paths)
+    return {
+        "segments": len(segment_paths),
+        "messages": sum(count["messages"] for count in counts.values()),
+        "files": len(paths),
+        "freed_bytes": freed,
+    }
+
+
+async def purge_orphan_media_blobs(before: datetime, batch_size: int) -> dict:
+    """
+    Удаляет до batch_size blob'ов с ref_count <= 0, созданных раньше before.
+    Blob записывается с ref_count=0, а ссылку берёт update_messages_media
+    позже, через очередь записи; если строки сообщения к тому времени уже нет
+    (удалена очисткой, перенесена в архив, не записалась), ссылка не появится
+    никогда. before — с запасом на время в очереди, чтобы не удалить blob,
+    ссылка на который ещё в пути.
+    Возвращает {"blobs", "files", "freed_bytes"}.
+    """
+    async with get_async_db_session() as db:
+        orphan = (MediaBlob.ref_count <= 0, MediaBlob.created_at < before)
+        query = (
+            select(MediaBlob.id, MediaBlob.path)
+            .where(*orphan)
+            .order_by(MediaBlob.id)
+            .limit(batch_size)
+        )
+        result = await db.execute(await lock_for_batch(db, query))
+        rows = result.all()
+        if not rows:
+            return {"blobs": 0, "files": 0, "freed_bytes": 0}
+
+        ids = [row.id for row in rows]
+        # условие повторяется: без FOR UPDATE (SQLite) ссылку могли взять
+        # после SELECT, такой blob остаётся
+        await db.execute(
+            delete(MediaFileId).where(
+                MediaFileId.blob_id.in_(
+                    select(MediaBlob.id).where(MediaBlob.id.in_(ids), *orphan)
+                )
+            )
+        )
+        await db.execute(delete(MediaBlob).where(MediaBlob.id.in_(ids), *orphan))
+        result = await db.execute(select(MediaBlob.id).where(MediaBlob.id.in_(ids)))
+        kept = set(result.scalars())
+
+    paths = [row.path for row in rows if row.id not in kept]
+    return {
+        "blobs": len(rows),
+        "files": len(paths),
+        "freed_bytes": remove_blob_files(paths),
+    }
@@ -0,0 +1,114 @@
+"""
+Полнотекстовый поиск по telegram_messages.text.
+
+SQLite — FTS5 (внешняя таблица telegram_messages_fts, триггеры на вставку,
+изменение и удаление), MySQL — FULLTEXT-индекс. И то и другое создаёт
+миграция 0005_message_search, дальше индекс обновляет сама БД при каждой
+записи сообщения. На других бэкендах — LIKE без индекса.
+"""
+
+import logging
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import column, exists, or_, select, table, text
+
+from db.models.model import PeerName, TelegramMessage
+from db.services import peers
+from db.services.manager import get_async_db_session
+from db.services.telegram_crud import _message_to_dict
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 20
+
+_fts = table("telegram_messages_fts", column("rowid"))
+
+
+def search_terms(query: str) -> List[str]:
+    """Слова запроса без операторов FTS (кавычки, *, -, + и т.п.)."""
+    return re.findall(r"\w+", query.lower())
+
+
+def _match_query(dialect: str, terms: List[str]) -> str:
+    # все слова обязательны, последнее — как префикс (поиск по мере набора)
+    if dialect == "mysql":
+        return " ".join(f"+{t}" for t in terms[:-1]) + f" +{terms[-1]}*"
+    return " ".join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+
+
+async def search_messages(
+    query: str,
+    account_id: Optional[int] = None,
+    chat_id: Optional[int] = None,
+    sender: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    deleted_only: bool = False,
+    limit: int = SEARCH_LIMIT,
+    offset: int = 0,
+) -> List[dict]:
+    """
+    Сообщения, в тексте которых есть все слова query, от новых к старым.
+    sender — sender_id (числом) или часть имени отправителя (текущего или прежнего);
+    date_to — не включительно.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    async with get_async_db_session() as db:
+        dialect = db.bind.dialect.name
+        stmt = select(TelegramMessage)
+        if dialect == "sqlite":
+            stmt = (
+                stmt.join(_fts, _fts.c.rowid == TelegramMessage.id)
+                .where(text("telegram_messages_fts MATCH :match"))
+                .order_by(_fts.c.rowid.desc())
+            )
+        elif dialect == "mysql":
+            stmt = stmt.where(
+                text("MATCH (telegram_messages.text) AGAINST (:match IN BOOLEAN MODE)")
+            ).order_by(TelegramMessage.id.desc())
+        else:
+            stmt = stmt.where(
+                *(TelegramMessage.text.ilike(f"%{t}%") for t in terms)
+            ).order_by(TelegramMessage.id.desc())
+
+        if account_id is not None:
+            stmt = stmt.where(TelegramMessage.account_id == account_id)
+        if chat_id is not None:
+            stmt = stmt.where(TelegramMessage.chat_id == chat_id)
+        if sender:
+            if sender.lstrip("-").isdigit():
+                stmt = stmt.where(TelegramMessage.sender_id == int(sender))
+            else:
+                # по любому имени, под которым отправитель встречался (peer_names)
+                stmt = stmt.where(
+                    or_(
+                        exists().where(
+                            PeerName.account_id == TelegramMessage.account_id,
+                            PeerName.peer_id == TelegramMessage.sender_id,
+                            PeerName.name.ilike(f"%{sender}%"),
+                        ),
+                        TelegramMessage.sender_name.ilike(f"%{sender}%"),
+                    )
+                )
+        if date_from:
+            stmt = stmt.where(TelegramMessage.date >= date_from)
+        if date_to:
+            stmt = stmt.where(TelegramMessage.date < date_to)
+        if deleted_only:
+            stmt = stmt.where(TelegramMessage.deleted_at.is_not(None))
+
+        stmt = stmt.limit(limit).offset(offset)
+        params = (
+            {"match": _match_query(dialect, terms)}
+            if dialect in ("sqlite", "mysql")
+            else {}
+        )
+        result = await db.execute(stmt, params)
+        messages = [_message_to_dict(msg) for msg in result.scalars()]
+        conn = await db.connection()
+        return await conn.run_sync(peers.resolve_names, messages)
@@ -0,0 +1,880 @@
+"""
+Асинхронная версия CRUD для TelegramAccount / TelegramMessage.
+Используется хендлерами бота и мониторингом, чтобы запросы к БД
+не блокировали event loop. Синхронный telegram_crud остаётся для скриптов.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import bindparam, case, delete, func, select, tuple_, update
+from sqlalchemy.orm import selectinload
+
+from bot.utils.paginate import paginate
+from db.models.model import (
+    AccountLease,
+    ChatSummary,
+    MessageSegment,
+    Peer,
+    PeerName,
+    SegmentDeletion,
+    TelegramAccount,
+    TelegramMessage,
+    UserSession,
+)
+from db.services import chat_summary, peers
+from db.services.async_media_crud import (
+    add_media_blob_refs,
+    lock_media_blobs,
+    release_media_blobs,
+    remove_blob_files,
+)
+from db.services.manager import get_async_db_session, insert_or_skip
+from db.services.message_archive import (
+    archive_page,
+    cursor_key,
+    find_archived,
+    merge_page,
+    record_deletions,
+    remove_segment_files,
+    segment_blob_refs,
+    segment_deletions,
+    segments_query,
+    segments_with_ids_query,
+)
+from db.services.telegram_crud import (
+    MESSAGE_CHUNK,
+    MESSAGE_KEY,
+    _chat_page_query,
+    _decrypt_two_factor_pass,
+    _encrypt_two_factor_pass,
+    _format_chat_message,
+    _mark_hot_deleted,
+    _message_to_dict,
+    _next_cursor,
+    decode_cursor,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _account_to_dict(account: TelegramAccount) -> dict:
+    return {
+        "id": account.id,
+        "alias": account.alias,
+        "phone": account.phone,
+        "session_string": account.session_string,
+        "two_factor": account.two_factor,
+        "two_factor_pass": _decrypt_two_factor_pass(account.two_factor_pass),
+        "is_monitoring": account.is_monitoring,
+        "is_taken": account.is_taken,
+        "created_at": account.created_at,
+        "updated_at": account.updated_at,
+    }
+
+
+# ---------- TelegramMessage CRUD ----------
+async def create_telegram_message(
+    account_id,
+    chat_id,
+    chat_name,
+    message_id,
+    sender_id,
+    sender_name,
+    text,
+    date,
+    logs_msg_id=None,
+    media_type=None,
+    media_path=None,
+    media_state=None,
+    media_size=None,
+):
+    """
+    Записывает сообщение, если его ещё нет (по MESSAGE_KEY), и возвращает
+    строку из БД — новую или уже сохранённую ранее.
+    """
+    key = {"account_id": account_id, "chat_id": chat_id, "message_id": message_id}
+    row = {
+        **key,
+        "chat_name": chat_name,
+        "sender_id": sender_id,
+        "sender_name": sender_name,
+        "text": text,
+        "date": date,
+        "logs_msg_id": logs_msg_id,
+        "media_type": media_type,
+        "media_path": media_path,
+        "media_state": media_state,
+        "media_size": media_size,
+    }
+    async with get_async_db_session() as db:
+        # новое ли сообщение — по ключу, а не по rowcount: на MySQL upsert
+        # дубликата с CLIENT.FOUND_ROWS тоже возвращает 1
+        existing = (
+            await db.execute(select(TelegramMessage.id).filter_by(**key))
+        ).scalar_one_or_none()
+        conn = await db.connection()
+        if existing is None:
+            archived = (await _archived_messages(db, [row])).get(
+                tuple(row[k] for k in MESSAGE_KEY)
+            )
+            if archived is not None:
+                # повторная доставка уже перенесённого в архив — строку не пишем
+                del archived["segment_id"]
+                await conn.run_sync(peers.record_peers, [row])
+                await conn.run_sync(peers.resolve_names, [archived])
+                return archived
+        await conn.execute(
+            insert_or_skip(db, TelegramMessage, MESSAGE_KEY), [peers.without_names(row)]
+        )
+        if existing is None:
+            await conn.run_sync(peers.record_peers, [row])
+            await conn.run_sync(chat_summary.add_messages, [row])
+        msg = (await db.execute(select(TelegramMessage).filter_by(**key))).scalars().one()
+        if existing is None:
+            logger.info(
+                "Создано сообщение id=%s, chat_id=%s, message_id=%s",
+                msg.id,
+                chat_id,
+                message_id,
+            )
+        message = {
+            "id": msg.id,
+            "account_id": msg.account_id,
+            "chat_name": msg.chat_name,
+            "chat_id": msg.chat_id,
+            "message_id": msg.message_id,
+            "sender_id": msg.sender_id,
+            "sender_name": msg.sender_name,
+            "text": msg.text,
+            "date": msg.date,
+            "deleted_at": msg.deleted_at,
+            "logs_msg_id": msg.logs_msg_id,
+            "media_type": msg.media_type,
+            "media_path": msg.media_path,
+            "media_state": msg.media_state,
+            "media_size": msg.media_size,
+            "media_blob_id": msg.media_blob_id,
+            "created_at": msg.created_at,
+            "updated_at": msg.updated_at,
+        }
+        await conn.run_sync(peers.resolve_names, [message])
+        return message
+
+
+async def bulk_create_telegram_messages(messages: List[dict]) -> int:
+    """
+    Записывает пачку сообщений одним INSERT (executemany) и одним commit,
+    в той же транзакции обновляет сводку чатов и имена собеседников (peers).
+    Уже сохранённые сообщения (тот же MESSAGE_KEY, в том числе перенесённые
+    в холодный архив) пропускаются, поэтому повторная доставка тех же
+    апдейтов безопасна.
+    Возвращает количество новых строк.
+    """
+    if not messages:
+        return 0
+    async with get_async_db_session() as db:
+        # какие из сообщений уже есть — чтобы не учесть их в сводке повторно
+        result = await db.execute(
+            select(
+                TelegramMessage.account_id,
+                TelegramMessage.chat_id,
+                TelegramMessage.message_id,
+            ).where(
+                tuple_(
+                    TelegramMessage.account_id,
+                    TelegramMessage.chat_id,
+                    TelegramMessage.message_id,
+                ).in_({tuple(m[k] for k in MESSAGE_KEY) for m in messages})
+            )
+        )
+        seen = {tuple(row) for row in result}
+        new_messages = []
+        for m in messages:
+            key = tuple(m[k] for k in MESSAGE_KEY)
+            if key not in seen:
+                seen.add(key)
+                new_messages.append(m)
+        if new_messages:
+            # и какие уже перенесены в холодный архив
+            archived = await _archived_messages(db, new_messages)
+            new_messages = [
+                m for m in new_messages if tuple(m[k] for k in MESSAGE_KEY) not in archived
+            ]
+        conn = await db.connection()
+        # имена — в peers, в том числе из повторной доставки (мог смениться)
+        await conn.run_sync(peers.record_peers, messages)
+        if not new_messages:
+            return 0
+
+        stmt = insert_or_skip(db, TelegramMessage, MESSAGE_KEY)
+        inserted = (
+            await conn.execute(stmt, [peers.without_names(m) for m in new_messages])
+        ).rowcount
+        await conn.run_sync(chat_summary.add_messages, new_messages)
+    return inserted
+
+
+async def _archived_messages(db, messages: List[dict]) -> Dict[tuple, dict]:
+    """
+    Какие из messages уже в холодном архиве (повторная доставка после переноса):
+    {(account_id, chat_id, message_id): сообщение из сегмента}. Обычно новые
+    сообщения новее всех сегментов, и запрос сегментов ничего не находит.
+    """
+    by_account: Dict[int, List[dict]] = {}
+    for m in messages:
+        by_account.setdefault(m["account_id"], []).append(m)
+    archived = {}
+    for account_id, batch in by_account.items():
+        ids = [m["message_id"] for m in batch]
+        query = segments_with_ids_query(account_id, ids, {m["chat_id"] for m in batch})
+        segments = (await db.execute(query)).all()
+        if not segments:
+            continue
+        found = await asyncio.to_thread(find_archived, segments, ids)
+        for m in batch:
+            message = found.get((m["chat_id"], m["message_id"]))
+            if message is not None:
+                archived[(account_id, m["chat_id"], m["message_id"])] = message
+    return archived
+
+
+async def update_messages_media(updates: List[dict]) -> List[dict]:
+    """
+    Проставляет результат скачивания медиа (media_state, media_path, media_size,
+    media_blob_id) пачке сообщений, найденных по (account_id, chat_id, message_id),
+    и в той же транзакции увеличивает ref_count их blob'ов. Один UPDATE
+    (executemany) и один commit.
+    Blob мог быть удалён очисткой, пока обновление ждало в очереди: такие
+    обновления не применяются (строка остаётся pending) и возвращаются —
+    файл нужно скачать заново.
+    """
+    if not updates:
+        return []
+    table = TelegramMessage.__table__
+    stmt = (
+        update(table)
+        .where(
+            table.c.account_id == bindparam("b_account_id"),
+            table.c.chat_id == bindparam("b_chat_id"),
+            table.c.message_id == bindparam("b_message_id"),
+        )
+        .values(
+            media_state=bindparam("b_media_state"),
+            media_path=bindparam("b_media_path"),
+            media_size=bindparam("b_media_size"),
+            media_blob_id=bindparam("b_media_blob_id"),
+            updated_at=bindparam("b_updated_at"),
+        )
+    )
+    keys = {(u["account_id"], u["chat_id"], u["message_id"]) for u in updates}
+    async with get_async_db_session() as db:
+        # ссылки считаем по тому, что реально меняется в строке: повторное
+        # обновление того же сообщения (повторная доставка) не добавляет ref.
+        # Блокировки в том же порядке, что у очистки: сообщения, затем blob'ы
+        result = await db.execute(
+            select(
+                TelegramMessage.account_id,
+                TelegramMessage.chat_id,
+                TelegramMessage.message_id,
+                TelegramMessage.media_blob_id,
+            )
+            .where(
+                tuple_(
+                    TelegramMessage.account_id,
+                    TelegramMessage.chat_id,
+                    TelegramMessage.message_id,
+                ).in_(keys)
+            )
+            .with_for_update()
+        )
+        current = {tuple(row[:3]): row.media_blob_id for row in result}
+        # blob'ы блокируются до commit: очистка не удалит их, пока ссылка не записана
+        alive = await lock_media_blobs(
+            db, {u["media_blob_id"] for u in updates if u.get("media_blob_id")}
+        )
+        lost = [
+            u
+            for u in updates
+            if u.get("media_blob_id") and u["media_blob_id"] not in alive
+        ]
+        if lost:
+            updates = [
+                u
+                for u in updates
+                if not u.get("media_blob_id") or u["media_blob_id"] in alive
+            ]
+            if not updates:
+                return lost
+        blob_refs, released = Counter(), Counter()
+        for u in updates:
+            key = (u["account_id"], u["chat_id"], u["message_id"])
+            if key not in current:
+                continue
+            old_blob, new_blob = current[key], u.get("media_blob_id")
+            if old_blob != new_blob:
+                if new_blob:
+                    blob_refs[new_blob] += 1
+                if old_blob:
+                    released[old_blob] += 1
+                current[key] = new_blob
+
+        now = datetime.utcnow()
+        params = [
+            {
+                "b_account_id": u["account_id"],
+                "b_chat_id": u["chat_id"],
+                "b_message_id": u["message_id"],
+                "b_media_state": u["media_state"],
+                "b_media_path": u.get("media_path"),
+                "b_media_size": u.get("media_size"),
+                "b_media_blob_id": u.get("media_blob_id"),
+                "b_updated_at": now,
+            }
+            for u in updates
+        ]
+        conn = await db.connection()
+        await conn.execute(stmt, params)
+        await add_media_blob_refs(db, blob_refs)
+        orphan_paths = await release_media_blobs(db, released)
+    remove_blob_files(orphan_paths)
+    return lost
+
+
+async def record_peer_name(account_id: int, peer_id: int, name: str) -> None:
+    """Новое имя собеседника (UpdateUserName) — в peers, не дожидаясь его сообщения."""
+    async with get_async_db_session() as db:
+        conn = await db.connection()
+        await conn.run_sync(
+            peers.record_peers,
+            [{"account_id": account_id, "chat_id": peer_id, "chat_name": name}],
+        )
+
+
+async def get_sender_display_name(sender_id: int) -> str:
+    """
+    Ищет sender_id среди UserSession.telegram_user_id.
+    Если нашёл — возвращает user.username, иначе пустую строку.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(UserSession)
+            .options(selectinload(UserSession.user))
+            .filter_by(telegram_user_id=str(sender_id))
+        )
+        session_obj = result.scalars().first()
+        if session_obj and session_obj.user:
+            return session_obj.user.username
+        return ""
+
+
+async def list_chats_for_account(account_id: int) -> list[dict]:
+    """Чаты аккаунта из сводки chat_summaries, сначала с последними сообщениями."""
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(ChatSummary)
+            .filter_by(account_id=account_id)
+            .order_by(ChatSummary.last_message_at.desc())
+        )
+        chats = [_chat_to_dict(chat) for chat in result.scalars()]
+        conn = await db.connection()
+        return await conn.run_sync(peers.resolve_chat_names, account_id, chats)
+
+
+def _chat_to_dict(chat: ChatSummary) -> dict:
+    return {
+        "chat_id": chat.chat_id,
+        "chat_name": chat.chat_name,
+        "msg_count": chat.message_count,
+        "deleted_count": chat.deleted_count,
+        "media_bytes": chat.media_bytes,
+        "last_message_at": chat.last_message_at,
+        "last_sender_name": chat.last_sender_name,
+    }
+
+
+async def list_chats_page(account_id: int, page: int, size: int):
+    """Страница чатов аккаунта из сводки: (чаты, total_pages, total)."""
+    async with get_async_db_session() as db:
+        chats, total_pages, total = await paginate(
+            db,
+            select(ChatSummary)
+            .filter_by(account_id=account_id)
+            .order_by(ChatSummary.last_message_at.desc(), ChatSummary.chat_id),
+            page,
+            size,
+        )
+        if chats is not None:
+            conn = await db.connection()
+            chats = await conn.run_sync(
+                peers.resolve_chat_names,
+                account_id,
+                [_chat_to_dict(chat) for chat in chats],
+            )
+        return chats, total_pages, total
+
+
+async def get_chat_messages(account_id: int, chat_id: int) -> list[dict]:
+    """Вся история чата (включая холодный архив) — для больших чатов iter_chat_messages."""
+    return [
+        _format_chat_message(msg)
+        async for chunk in iter_chat_messages(account_id, chat_id)
+        for msg in chunk
+    ]
+
+
+async def list_messages_page(
+    account_id: int, chat_id: int, limit: int = 50, cursor: Optional[str] = None
+) -> tuple[List[dict], Optional[str]]:
+    """
+    Страница истории чата в порядке (date, message_id), без OFFSET,
+    вместе с холодным архивом (сегменты читаются в отдельном потоке).
+    Возвращает (сообщения, курсор следующей страницы или None).
+    """
+    after = cursor_key(*decode_cursor(cursor)) if cursor else None
+    async with get_async_db_session() as db:
+        rows = await db.execute(_chat_page_query(account_id, chat_id, limit, cursor))
+        hot = [_message_to_dict(msg) for msg in rows.scalars()]
+        segments = (await db.execute(segments_query(account_id, chat_id, after))).all()
+        cold = (
+            await asyncio.to_thread(archive_page, segments, after, limit)
+            if segments
+            else []
+        )
+        conn = await db.connection()
+        deletions = await conn.run_sync(segment_deletions, account_id, chat_id, cold)
+        items, has_more = merge_page(hot, cold, limit, deletions)
+        await conn.run_sync(peers.resolve_names, items)
+    return items, _next_cursor(items, has_more)
+
+
+async def iter_chat_messages(
+    account_id: int, chat_id: int, chunk_size: int = MESSAGE_CHUNK
+) -> AsyncIterator[List[dict]]:
+    """Вся история чата пачками по chunk_size, в памяти — одна пачка."""
+    cursor = None
+    while True:
+        items, cursor = await list_messages_page(account_id, chat_id, chunk_size, cursor)
+        if items:
+            yield items
+        if not cursor:
+            return
+
+
+async def mark_deleted_messages(
+    account_id: int, message_ids: List[int], chat_id: int = None
+) -> int:
+    """
+    Помечает список сообщений (message_ids) как удалённые (deleted_at = now()).
+    Если сообщение уже помечено, повторно не обновляет. Строки telegram_messages
+    помечаются общей с синхронным API _mark_hot_deleted (UPDATE пачками по id);
+    id, которых там нет, ищутся в холодном архиве (пометка — в segment_deletions,
+    файлы сегментов читаются в отдельном потоке).
+    Возвращает количество помеченных сообщений.
+    """
+    message_ids = list(dict.fromkeys(message_ids))
+    if not message_ids:
+        return 0
+    now = datetime.utcnow()
+    async with get_async_db_session() as db:
+        conn = await db.connection()
+        marked, missing = await conn.run_sync(
+            _mark_hot_deleted, account_id, message_ids, chat_id, now
+        )
+        if missing:
+            query = segments_with_ids_query(
+                account_id, missing, None if chat_id is None else [chat_id]
+            )
+            segments = (await db.execute(query)).all()
+            if segments:
+                archived = await asyncio.to_thread(find_archived, segments, missing)
+                counts = await conn.run_sync(record_deletions, account_id, archived, now)
+                marked += sum(counts.values())
+                await conn.run_sync(chat_summary.add_deleted, account_id, counts)
+    logger.info(
+        "Помечено удалёнными %d из %d сообщений для account_id=%s",
+        marked,
+        len(message_ids),
+        account_id,
+    )
+    return marked
+
+
+async def list_messages_by_chat(
+    account_id: int, chat_id: int, limit: int = 20, offset: int = 0
+) -> list:
+    """
+    Возвращает список сообщений по заданному chat_id (и account_id)
+    в порядке возрастания даты. limit/offset — для пагинации.
+    """
+    async with get_async_db_session() as db:
+        query = (
+            select(TelegramMessage)
+            .filter_by(account_id=account_id, chat_id=chat_id)
+            .order_by(TelegramMessage.date.asc())
+        )
+        if offset:
+            query = query.offset(offset)
+        if limit:
+            query = query.limit(limit)
+
+        result = await db.execute(query)
+        messages = [
+            {
+                "id": r.id,
+                "account_id": r.account_id,
+                "chat_id": r.chat_id,
+                "chat_name": r.chat_name,
+                "message_id": r.message_id,
+                "sender_id": r.sender_id,
+                "text": r.text,
+                "date": r.date,
+                "deleted_at": r.deleted_at,
+                "logs_msg_id": r.logs_msg_id,
+                "media_type": r.media_type,
+                "created_at": r.created_at,
+                "updated_at": r.updated_at,
+            }
+            for r in result.scalars()
+        ]
+        conn = await db.connection()
+        return await conn.run_sync(peers.resolve_names, messages)
+
+
+async def get_account_messages(account_id: int) -> list[dict]:
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(TelegramMessage)
+            .filter_by(account_id=account_id)
+            .order_by(TelegramMessage.date.desc())
+        )
+        return [
+            {
+                "id": msg.id,
+                "chat_id": msg.chat_id,
+                "sender_id": msg.sender_id,
+                "text": msg.text,
+                "media_path": msg.media_path,
+                "date": msg.date.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            for msg in result.scalars()
+        ]
+
+
+# ---------- TelegramAccount CRUD ----------
+
+
+async def list_telegram_accounts_with_monitoring():
+    """
+    Возвращает список аккаунтов, у которых is_monitoring=True (для прослушки).
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(select(TelegramAccount).filter_by(is_monitoring=True))
+        return [
+            {
+                "id": acc.id,
+                "alias": acc.alias,
+                "phone": acc.phone,
+                "session_string": acc.session_string,
+                "two_factor": acc.two_factor,
+                "two_factor_pass": _decrypt_two_factor_pass(acc.two_factor_pass),
+                "is_monitoring": acc.is_monitoring,
+                "is_taken": acc.is_taken,
+            }
+            for acc in result.scalars()
+        ]
+
+
+async def list_monitoring_accounts_brief() -> list[dict]:
+    """
+    Аккаунты с is_monitoring=True без сессии и 2FA: id, alias, updated_at.
+    Полная сверка для цикла мониторинга.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(
+                TelegramAccount.id,
+                TelegramAccount.alias,
+                TelegramAccount.is_monitoring,
+                TelegramAccount.updated_at,
+            ).filter_by(is_monitoring=True)
+        )
+        return [dict(row._mapping) for row in result]
+
+
+async def list_accounts_changed_since(since: datetime) -> list[dict]:
+    """
+    Аккаунты, изменённые начиная с since (в том числе с выключенным мониторингом):
+    id, alias, is_monitoring, updated_at. Инкрементальная сверка по updated_at.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(
+                TelegramAccount.id,
+                TelegramAccount.alias,
+                TelegramAccount.is_monitoring,
+                TelegramAccount.updated_at,
+            ).where(TelegramAccount.updated_at >= since)
+        )
+        return [dict(row._mapping) for row in result]
+
+
+async def get_monitoring_account(account_id: int):
+    """
+    Полные данные аккаунта для запуска клиента (сессия, расшифрованный 2FA).
+    None, если аккаунт удалён или мониторинг выключен.
+    """
+    async with get_async_db_session() as db:
+        account = await db.get(TelegramAccount, account_id)
+        if account is None or not account.is_monitoring:
+            return None
+        return _account_to_dict(account)
+
+
+async def list_monitoring_account_ids() -> list[int]:
+    """
+    Только id аккаунтов с is_monitoring=True — без сессий и расшифровки 2FA.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(TelegramAccount.id).filter_by(is_monitoring=True)
+        )
+        return list(result.scalars())
+
+
+async def create_telegram_account(
+    user_id: int,
+    alias: str,
+    phone: str,
+    session_string: str = None,
+    two_factor: bool = False,
+    two_factor_pass: str = None,
+    is_monitoring: bool = True,
+    is_taken: bool = False,
+):
+    """
+    Создаёт запись в telegram_accounts с проверками и обработкой ошибок.
+    """
+    if not user_id or not alias or not phone:
+        raise ValueError("user_id, alias, and phone are required fields")
+
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(TelegramAccount).filter(
+                TelegramAccount.user_id == user_id,
+                (TelegramAccount.phone == phone) | (TelegramAccount.alias == alias),
+            )
+        )
+        if result.scalars().first():
+            raise ValueError(
+                f"Телеграм аккаунт '{phone}' или элиас '{alias}' уже существует!"
+            )
+
+        account = TelegramAccount(
+            user_id=user_id,
+            alias=alias,
+            phone=phone,
+            session_string=session_string,
+            two_factor=two_factor,
+            two_factor_pass=_encrypt_two_factor_pass(two_factor_pass),
+            is_monitoring=is_monitoring,
+            is_taken=is_taken,
+        )
+        try:
+            db.add(account)
+            await db.flush()
+            logger.info(f"Телеграм аккаунт успешно сохранён: {account.id}")
+        except Exception as e:
+            logger.error(f"Ошибка сохранения аккаунта: {e}")
+            raise e
+
+        return account
+
+
+async def get_user_by_telegram_id(telegram_user_id: int):
+    """
+    Возвращает данные сессии, если в таблице user_sessions
+    найдена запись, где telegram_user_id == str(telegram_user_id).
+    Иначе возвращает None.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(UserSession).filter_by(telegram_user_id=str(telegram_user_id))
+        )
+        session_obj = result.scalars().first()
+        if session_obj:
+            return {
+                "id": session_obj.id,
+                "user_id": session_obj.user_id,
+                "telegram_user_id": session_obj.telegram_user_id,
+                "session_token": session_obj.session_token,
+            }
+        return None
+
+
+async def get_telegram_account_by_phone(user_id: int, phone: str):
+    """
+    Находит TelegramAccount по user_id & phone. Если аккаунт не найден, возвращает None.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(TelegramAccount).filter_by(user_id=user_id, phone=phone)
+        )
+        account = result.scalars().first()
+        return _account_to_dict(account) if account else None
+
+
+async def get_telegram_account_by_alias(user_id: int, alias: str):
+    """
+    Возвращает одну запись TelegramAccount (или None) по alias и user_id.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(TelegramAccount).filter_by(user_id=user_id, alias=alias)
+        )
+        account = result.scalars().first()
+        return _account_to_dict(account) if account else None
+
+
+async def get_telegram_account_by_alias_for_admin(alias: str):
+    """Возвращает запись из TelegramAccount или None по alias"""
+    async with get_async_db_session() as db:
+        result = await db.execute(select(TelegramAccount).filter_by(alias=alias))
+        account = result.scalars().first()
+        return _account_to_dict(account) if account else None
+
+
+async def list_telegram_accounts(user_id: int):
+    """
+    Возвращает список всех аккаунтов, принадлежащих user_id.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(select(TelegramAccount).filter_by(user_id=user_id))
+        return [_account_to_dict(account) for account in result.scalars()]
+
+
+async def list_accounts_page(user_id: int, page: int, size: int):
+    """
+    Страница аккаунтов пользователя для просмотра админом: (аккаунты, total_pages, total).
+    Без session_string и 2FA — ничего не расшифровывается.
+    """
+    async with get_async_db_session() as db:
+        accounts, total_pages, total = await paginate(
+            db,
+            select(TelegramAccount)
+            .filter_by(user_id=user_id)
+            .order_by(TelegramAccount.id),
+            page,
+            size,
+        )
+        return (
+            [
+                {
+                    "id": account.id,
+                    "alias": account.alias,
+                    "phone": account.phone,
+                    "is_monitoring": account.is_monitoring,
+                    "is_taken": account.is_taken,
+                }
+                for account in accounts
+            ]
+            if accounts is not None
+            else None,
+            total_pages,
+            total,
+        )
+
+
+async def count_user_accounts(user_id: int) -> dict:
+    """Счётчики аккаунтов пользователя одним агрегатным запросом."""
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(
+                func.count(TelegramAccount.id),
+                func.count(case((TelegramAccount.is_monitoring.is_(True), 1))),
+            ).filter_by(user_id=user_id)
+        )
+        total, monitoring = result.one()
+        return {"total": total, "monitoring": monitoring}
+
+
+async def update_telegram_account(acc, **kwargs):
+    """
+    Обновляет поля записи TelegramAccount (session_string, two_factor_pass, is_monitoring, ...).
+    Принимает либо объект модели, либо словарь, содержащий ключ "id".
+    """
+    acc_id = acc.id if hasattr(acc, "id") else acc.get("id")
+    if not acc_id:
+        raise ValueError("Невозможно определить идентификатор аккаунта.")
+
+    async with get_async_db_session() as db:
+        db_acc = await db.get(TelegramAccount, acc_id)
+        if not db_acc:
+            return None
+
+        try:
+            for k, v in kwargs.items():
+                setattr(db_acc, k, v)
+            db_acc.updated_at = datetime.utcnow()
+            await db.flush()
+            logger.info(f"Аккаунт id={acc_id} обновлён, поля={list(kwargs.keys())}")
+            return db_acc
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении аккаунта: {e}")
+            raise e
+
+
+async def delete_telegram_account(alias: str, phone: str) -> bool:
+    """
+    Удаляет аккаунт по alias и phone. Возвращает True, если удалён, иначе False.
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(TelegramAccount).filter_by(alias=alias, phone=phone)
+        )
+        account = result.scalars().first()
+        if not account:
+            logger.warning(f"Аккаунт '{alias}' (phone={phone}) не найден для удаления.")
+            return False
+
+        try:
+            # сообщения удаляются каскадом — отпускаем их медиафайлы
+            refs = await db.execute(
+                select(TelegramMessage.media_blob_id, func.count())
+                .where(
+                    TelegramMessage.account_id == account.id,
+                    TelegramMessage.media_blob_id.is_not(None),
+                )
+                .group_by(TelegramMessage.media_blob_id)
+            )
+            released = Counter(dict(refs.all()))
+            # и медиа сообщений из холодного архива
+            segments = await db.execute(
+                select(MessageSegment.path).filter_by(account_id=account.id)
+            )
+            segment_paths = list(segments.scalars())
+            released.update(await asyncio.to_thread(segment_blob_refs, segment_paths))
+            orphan_paths = await release_media_blobs(db, released)
+            # явно, а не через ON DELETE CASCADE: SQLite без PRAGMA foreign_keys
+            # его не выполняет, а id аккаунта может достаться новому
+            for model in (
+                ChatSummary,
+                SegmentDeletion,
+                MessageSegment,
+                Peer,
+                PeerName,
+                AccountLease,
+            ):
+                await db.execute(delete(model).filter_by(account_id=account.id))
+            await db.delete(account)
+            await db.flush()
+        except Exception as e:
+            logger.error(f"Ошибка при удалении аккаунта: {e}")
+            raise e
+    remove_blob_files(orphan_paths)
+    remove_segment_files(segment_paths)
+    logger.info(f"Аккаунт '{alias}' (phone={phone}) удалён.")
+    return True
@@ -0,0 +1,289 @@
+"""
+Асинхронная версия CRUD для User / UserSession.
+Используется хендлерами бота и AuthMiddleware. Синхронный user_crud остаётся для скриптов.
+"""
+
+import uuid
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from bot.utils.paginate import paginate
+from bot.utils.passwords import password_hasher
+from db.database import AsyncSessionLocal
+from db.models.model import User, UserSession
+from db.services.manager import get_async_db_session, lock_for_batch
+from db.services.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def get_all_users():
+    async with get_async_db_session() as db:
+        result = await db.execute(select(User))
+        all_users = result.scalars().all()
+        if not all_users:
+            logger.info("get_all_users: пользователи не найдены!")
+            return
+        return [
+            {"id": user.id, "username": user.username, "is_admin": user.is_admin}
+            for user in all_users
+        ]
+
+
+def _user_to_dict(user: User) -> dict:
+    return {"id": user.id, "username": user.username, "is_admin": user.is_admin}
+
+
+async def list_users_page(page: int, size: int):
+    """Страница пользователей по id: (пользователи, total_pages, total)."""
+    async with get_async_db_session() as db:
+        users, total_pages, total = await paginate(
+            db, select(User).order_by(User.id), page, size
+        )
+        return (
+            [_user_to_dict(user) for user in users] if users is not None else None,
+            total_pages,
+            total,
+        )
+
+
+async def get_user_by_id(user_id: int):
+    async with get_async_db_session() as db:
+        user = await db.get(User, user_id)
+        return _user_to_dict(user) if user else None
+
+
+async def delete_admin(username: str):
+    """
+    Меняет флаг is_admin = True на is_admin = False
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(select(User).filter_by(username=username))
+        admin_user = result.scalars().first()
+        if not admin_user:
+            logger.info(f"delete_admin: Пользователь не найден!")
+            return
+        if not admin_user.is_admin:
+            logger.info(f"delete_admin: {username} не имеет прав!")
+            return
+        admin_user.is_admin = False
+        logger.info(f"delete_admin: {username} лишен прав администратора!")
+
+    session_cache.invalidate_user(admin_user.id)
+    return True
+
+
+async def set_new_admin(username: str):
+    async with get_async_db_session() as db:
+        result = await db.execute(select(User).filter_by(username=username))
+        new_admin = result.scalars().first()
+        if new_admin.is_admin is True:
+            logger.info(
+                f"set_new_admin: пользоватль {new_admin.username} уже имеет права администратора!"
+            )
+            return
+        new_admin.is_admin = True
+        logger.info(f"set_new_admin: Назначен новый админ: {new_admin.username}")
+
+    session_cache.invalidate_user(new_admin.id)
+
+
+async def create_admin_account(username: str, password: str, is_admin: bool = True):
+    """
+    Создает по умолчанию профиль с is_admin=True, для последующих манипулций с ботом через админку
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(User).filter_by(username=username, is_admin=True)
+        )
+        current_admin = result.scalars().first()
+    if current_admin:
+        logger.info(
+            f"Create_admin_account: Первинный админ уже существует! Username={username}"
+        )
+        return
+    await register_user(username=username, password=password, is_admin=is_admin)
+    logger.info(f"Create_admin_account: Создан новый админ с username={username}")
+
+
+async def register_user(username: str, password: str, is_admin: bool = False) -> dict:
+    """
+    Регистрирует нового пользователя:
+    - Проверяет, что username не занят
+    - Хеширует пароль
+    - Создаёт запись в таблице users
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(select(User).filter(User.username == username))
+        if result.scalars().first():
+            logger.info("Пользователь с таким именем уже существует!")
+            return
+
+        if len(password) < 4:
+            logger.info(
+                "Пароль не может быть меньше 4 символов! Введите /register, и попробуйте заново"
+            )
+            return
+
+        # хэш считается в пуле потоков, event loop не блокируется
+        hash_password = await password_hasher.hash(password)
+
+        new_user = User(
+            username=username, password_hash=hash_password, is_admin=is_admin
+        )
+        db.add(new_user)
+        await db.flush()  # чтобы new_user.id заполнилось
+        return {
+            "id": new_user.id,
+            "username": new_user.username,
+            "is_admin": new_user.is_admin,
+        }
+
+
+async def login_user(
+    username: str, password: str, telegram_user_id: int, session_hours=24
+) -> dict:
+    """
+    Авторизует пользователя:
+    - Проверяем, что пользователь существует
+    - Сверяем пароль
+    - Создаём сессию (запись в user_sessions)
+    - Возвращаем session_token
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(select(User).filter(User.username == username))
+        user = result.scalars().first()
+    if not user:
+        raise ValueError(
+            "Пользователь не найден! Пройдите регистрацию для входа! \n Введите /register для регистрации профиля."
+        )
+    # проверка пароля — вне транзакции и вне event loop
+    ok, new_hash = await password_hasher.verify(password, user.password_hash)
+    if not ok:
+        raise ValueError("Неверный пароль, введите /login и попробуйте еще раз!")
+
+    async with get_async_db_session() as db:
+        if new_hash:
+            # изменилась стоимость BCRYPT_ROUNDS — сохраняем пересчитанный хэш
+            await db.execute(
+                update(User)
+                .where(User.id == user.id, User.password_hash == user.password_hash)
+                .values(password_hash=new_hash)
+            )
+
+        # Удаляем ВСЕ старые сессии
+        await db.execute(
+            delete(UserSession).where(
+                (UserSession.user_id == user.id)
+                | (UserSession.telegram_user_id == str(telegram_user_id))
+            )
+        )
+
+        token = str(uuid.uuid4())
+        expires = datetime.utcnow() + timedelta(hours=session_hours)
+        new_session = UserSession(
+            user_id=user.id,
+            telegram_user_id=str(telegram_user_id),
+            session_token=token,
+            expires_at=expires,
+        )
+        db.add(new_session)
+        await db.flush()
+        session = {
+            "id": new_session.id,
+            "session_token": new_session.session_token,
+            "expires_at": new_session.expires_at,
+            "user_id": user.id,
+        }
+
+    # старые сессии удалены и у других Telegram-аккаунтов этого пользователя
+    session_cache.invalidate(telegram_user_id)
+    session_cache.invalidate_user(user.id)
+    return session
+
+
+async def logout_user(telegram_user_id: int):
+    """
+    Удаляет запись сессии по telegram_user_id
+    """
+    async with get_async_db_session() as db:
+        result = await db.execute(
+            select(UserSession).filter_by(telegram_user_id=str(telegram_user_id))
+        )
+        session_obj = result.scalars().first()
+        if not session_obj:
+            raise ValueError("Нет активной сессии")
+        await db.delete(session_obj)
+
+    session_cache.invalidate(telegram_user_id)
+
+
+async def get_current_user(db: AsyncSession, telegram_user_id: int):
+    """
+    Возвращает объект User, если у данного telegram_user_id есть активная сессия,
+    иначе None.
+    """
+    result = await db.execute(
+        select(UserSession)
+        .options(selectinload(UserSession.user))
+        .filter_by(telegram_user_id=str(telegram_user_id))
+    )
+    session_obj = result.scalars().first()
+    # истёкшую сессию не удаляем: путь запроса только читает,
+    # строки убирает фоновая очистка (purge_expired_sessions)
+    if not session_obj or session_obj.expires_at < datetime.utcnow():
+        return None
+
+    return session_obj.user
+
+
+async def get_authorized_user(telegram_user_id: int):
+    """
+    Как get_current_user, но сначала смотрит session_cache: пока запись
+    жива, БД не трогается. При промахе читает сессию и кладёт её в кэш.
+    """
+    user = session_cache.get(telegram_user_id)
+    if user is not None:
+        return user
+    version = session_cache.version()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(UserSession)
+            .options(selectinload(UserSession.user))
+            .filter_by(telegram_user_id=str(telegram_user_id))
+        )
+        session_obj = result.scalars().first()
+        if not session_obj or session_obj.expires_at < datetime.utcnow():
+            return None
+        session_cache.put(
+            telegram_user_id, session_obj.user, session_obj.expires_at, version
+        )
+        return session_obj.user
+
+
+async def purge_expired_sessions(before: datetime, batch_size: int) -> int:
+    """
+    Удаляет до batch_size сессий, истёкших раньше before, и сбрасывает их
+    в session_cache. Возвращает число удалённых; меньше batch_size — больше нечего.
+    """
+    async with get_async_db_session() as db:
+        query = (
+            select(UserSession.id, UserSession.telegram_user_id)
+            .where(UserSession.expires_at < before)
+            .order_by(UserSession.expires_at)
+            .limit(batch_size)
+        )
+        result = await db.execute(await lock_for_batch(db, query))
+        rows = result.all()
+        if not rows:
+            return 0
+        await db.execute(
+            delete(UserSession).where(UserSession.id.in_([row.id for row in rows]))
+        )
+
+    for row in rows:
+        session_cache.invalidate(int(row.telegram_user_id))
+    return len(rows)
@@ -0,0 +1,270 @@
+"""
+Сводка по чатам (chat_summaries): инкрементальное обновление при записи
+сообщений, пометке удалённых и очистке по сроку хранения, полная пересборка.
+
+Функции работают с синхронным Connection: async-CRUD вызывает их через
+AsyncConnection.run_sync в той же транзакции, что и запись сообщений,
+пересборку — миграция 0004_chat_summaries и команда /rebuild_chat_summary.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, delete, func, literal, or_, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from db.models.model import (
+    ChatSummary,
+    MessageSegment,
+    Peer,
+    TelegramAccount,
+    TelegramMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+_summary = ChatSummary.__table__
+_messages = TelegramMessage.__table__
+_segments = MessageSegment.__table__
+_peers = Peer.__table__
+
+
+def _upsert(dialect: str):
+    """INSERT сводки, при существующей — прибавить счётчики и обновить «последнее»."""
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(_summary)
+        new = stmt.inserted
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        stmt = insert(_summary)
+        new = stmt.excluded
+
+    newer = or_(
+        _summary.c.last_message_at.is_(None),
+        new.last_message_at >= _summary.c.last_message_at,
+    )
+    # MySQL выполняет присваивания по порядку и дальше видит уже новые
+    # значения, поэтому last_message_at обновляется последним
+    values = [
+        ("message_count", _summary.c.message_count + new.message_count),
+        ("media_bytes", _summary.c.media_bytes + new.media_bytes),
+        # имя неизвестно ("") — остаётся прежнее
+        (
+            "chat_name",
+            case(
+                (and_(newer, new.chat_name != ""), new.chat_name),
+                else_=_summary.c.chat_name,
+            ),
+        ),
+        (
+            "last_sender_name",
+            case((newer, new.last_sender_name), else_=_summary.c.last_sender_name),
+        ),
+        ("updated_at", new.updated_at),
+        (
+            "last_message_at",
+            case((newer, new.last_message_at), else_=_summary.c.last_message_at),
+        ),
+    ]
+    if dialect == "mysql":
+        return stmt.on_duplicate_key_update(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["account_id", "chat_id"], set_=dict(values)
+    )
+
+
+def _last(rows: List[dict]) -> dict:
+    return max(
+        rows,
+        key=lambda r: (r.get("date") is not None, r.get("date") or datetime.min, r["message_id"]),
+    )
+
+
+def add_messages(conn: Connection, rows: Iterable[dict]) -> None:
+    """Учитывает в сводке новые сообщения (только действительно записанные строки)."""
+    groups: Dict[tuple, List[dict]] = {}
+    for row in rows:
+        groups.setdefault((row["account_id"], row["chat_id"]), []).append(row)
+    if not groups:
+        return
+    now = datetime.utcnow()
+    values = []
+    for (account_id, chat_id), group in groups.items():
+        last = _last(group)
+        values.append(
+            {
+                "account_id": account_id,
+                "chat_id": chat_id,
+                "chat_name": last["chat_name"] or "",
+                "message_count": len(group),
+                "deleted_count": 0,
+                "media_bytes": sum(r.get("media_size") or 0 for r in group),
+                "last_message_at": last.get("date"),
+                "last_sender_name": last.get("sender_name"),
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+    conn.execute(_upsert(conn.dialect.name), values)
+
+
+def add_deleted(conn: Connection, account_id: int, counts: Dict[int, int]) -> None:
+    """Прибавляет помеченные удалёнными сообщения: counts — chat_id -> количество."""
+    now = datetime.utcnow()
+    for chat_id, count in counts.items():
+        conn.execute(
+            update(_summary)
+            .where(_summary.c.account_id == account_id, _summary.c.chat_id == chat_id)
+            .values(deleted_count=_summary.c.deleted_count + count, updated_at=now)
+        )
+
+
+def remove_messages(conn: Connection, account_id: int, counts: Dict[int, dict]) -> None:
+    """
+    Вычитает из сводки удалённые из архива сообщения: counts — chat_id ->
+    {"messages", "deleted", "media_bytes"}. Опустевшие чаты убираются из сводки.
+    Удаляются самые старые сообщения, поэтому «последнее» в сводке не меняется.
+    """
+    if not counts:
+        return
+    now = datetime.utcnow()
+    for chat_id, count in counts.items():
+        conn.execute(
+            update(_summary)
+            .where(_summary.c.account_id == account_id, _summary.c.chat_id == chat_id)
+            .values(
+                message_count=_summary.c.message_count - count["messages"],
+                deleted_count=_summary.c.deleted_count - count["deleted"],
+                media_bytes=_summary.c.media_bytes - count["media_bytes"],
+                updated_at=now,
+            )
+        )
+    conn.execute(
+        delete(_summary).where(
+            _summary.c.account_id == account_id,
+            _summary.c.chat_id.in_(list(counts)),
+            _summary.c.message_count <= 0,
+        )
+    )
+
+
+def rebuild_account(conn: Connection, account_id: int) -> int:
+    """
+    Пересчитывает сводку аккаунта по telegram_messages и сегментам холодного
+    архива (message_segments). Возвращает число чатов.
+    """
+    hot = {
+        row.chat_id: row
+        for row in conn.execute(
+            select(
+                _messages.c.chat_id,
+                func.count(_messages.c.id).label("message_count"),
+                func.count(_messages.c.deleted_at).label("deleted_count"),
+                func.coalesce(func.sum(_messages.c.media_size), 0).label("media_bytes"),
+            )
+            .where(_messages.c.account_id == account_id)
+            .group_by(_messages.c.chat_id)
+        )
+    }
+    archived = {
+        row.chat_id: row
+        for row in conn.execute(
+            select(
+                _segments.c.chat_id,
+                func.sum(_segments.c.message_count).label("message_count"),
+                func.sum(_segments.c.deleted_count).label("deleted_count"),
+                func.sum(_segments.c.media_bytes).label("media_bytes"),
+            )
+            .where(_segments.c.account_id == account_id)
+            .group_by(_segments.c.chat_id)
+        )
+    }
+
+    names = dict(
+        conn.execute(
+            select(_peers.c.peer_id, _peers.c.name).where(
+                _peers.c.account_id == account_id
+            )
+        ).all()
+    )
+
+    now = datetime.utcnow()
+    values = []
+    for chat_id in hot.keys() | archived.keys():
+        # последнее сообщение — по индексу (account_id, chat_id, date);
+        # в архиве только старые, он нужен, если в таблице не осталось датированных
+        last = conn.execute(
+            select(
+                _messages.c.chat_name,
+                _messages.c.sender_id,
+                _messages.c.sender_name,
+                _messages.c.date,
+            )
+            .where(
+                _messages.c.account_id == account_id,
+                _messages.c.chat_id == chat_id,
+            )
+            .order_by(_messages.c.date.desc(), _messages.c.message_id.desc())
+            .limit(1)
+        ).first()
+        if chat_id in archived and (last is None or last.date is None):
+            last = conn.execute(
+                select(
+                    _segments.c.chat_name,
+                    literal(None).label("sender_id"),
+                    _segments.c.last_sender_name.label("sender_name"),
+                    _segments.c.date_to.label("date"),
+                )
+                .where(
+                    _segments.c.account_id == account_id,
+                    _segments.c.chat_id == chat_id,
+                )
+                .order_by(_segments.c.date_to.desc())
+                .limit(1)
+            ).one()
+        parts = [part for part in (hot.get(chat_id), archived.get(chat_id)) if part]
+        values.append(
+            {
+                "account_id": account_id,
+                "chat_id": chat_id,
+                "chat_name": names.get(chat_id) or last.chat_name or str(chat_id),
+                "message_count": sum(part.message_count for part in parts),
+                "deleted_count": sum(part.deleted_count for part in parts),
+                "media_bytes": sum(part.media_bytes for part in parts),
+                "last_message_at": last.date,
+                "last_sender_name": names.get(last.sender_id) or last.sender_name,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+
+    conn.execute(delete(_summary).where(_summary.c.account_id == account_id))
+    if values:
+        conn.execute(_summary.insert(), values)
+    return len(values)
+
+
+def rebuild_chat_summaries(engine: Engine, account_ids: Optional[List[int]] = None) -> int:
+    """
+    Пересобирает сводку для account_ids (по умолчанию — всех аккаунтов),
+    по аккаунту на транзакцию. Возвращает общее число чатов.
+    """
+    if account_ids is None:
+        with engine.connect() as conn:
+            account_ids = list(conn.execute(select(TelegramAccount.id)).scalars())
+
+    total = 0
+    for account_id in account_ids:
+        with engine.begin() as conn:
+            total += rebuild_account(conn, account_id)
+    logger.info(
+        "Сводка чатов пересобрана: %d аккаунтов, %d чатов", len(account_ids), total
+    )
+    return total
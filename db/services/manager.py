@@ -1,6 +1,8 @@
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from sqlalchemy import DateTime, func, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db.database import SessionLocal
+from db.database import AsyncSessionLocal, SessionLocal
 
 @contextmanager
 def get_db_session():
@@ -16,4 +18,105 @@ def get_db_session():
         db.rollback() # при любой ошибке откатываем
         raise         # пробрасываем исключение выше
     finally:
-        db.close()    # закрываем сессию в любом случае 
\ No newline at end of file
+        db.close()    # закрываем сессию в любом случае 
+
+
+@asynccontextmanager
+async def get_async_db_session():
+    """
+    Асинхронный аналог get_db_session(): commit при успехе,
+    rollback при ошибке, закрытие сессии в любом случае.
+    """
+    db: AsyncSession = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+def insert_ignore(db: AsyncSession, model):
+    """INSERT, который пропускает строки с уже существующим ключом (MySQL/SQLite/PostgreSQL)."""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return insert(model).prefix_with("OR IGNORE")
+    return insert(model).prefix_with("IGNORE")
+
+
+def insert_or_skip(db: Session | AsyncSession, model, keys: list[str]):
+    """
+    INSERT, который пропускает строки с уже существующим уникальным ключом keys.
+    В отличие от insert_ignore, на MySQL это ON DUPLICATE KEY UPDATE без изменений,
+    а не IGNORE: остальные ошибки (FK, обрезка данных) не глушатся.
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        key = model.__table__.c[keys[0]]
+        return mysql_insert(model).on_duplicate_key_update({key.name: key})
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(model).on_conflict_do_nothing(index_elements=keys)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    return sqlite_insert(model).on_conflict_do_nothing(index_elements=keys)
+
+
+def db_utcnow(db: Session | AsyncSession, seconds: int = 0):
+    """
+    Текущее время UTC по часам БД (плюс seconds, можно отрицательное) —
+    SQL-выражение для values() и where(). Нужно там, где экземпляры бота
+    сравнивают свои отметки времени между собой: часы серверов могут
+    расходиться, часы БД у всех общие. Формат совпадает с datetime.utcnow(),
+    которым пишутся остальные столбцы.
+    """
+    seconds = int(seconds)
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        if not seconds:
+            return func.utc_timestamp(type_=DateTime)
+        return func.date_add(
+            func.utc_timestamp(), text(f"INTERVAL {seconds} SECOND"), type_=DateTime
+        )
+    if dialect == "postgresql":
+        now = func.timezone("UTC", func.now(), type_=DateTime)
+        if not seconds:
+            return now
+        return now + func.make_interval(0, 0, 0, 0, 0, 0, seconds)
+    # SQLite хранит DateTime строкой "YYYY-MM-DD HH:MM:SS.ffffff"
+    return func.strftime(
+        "%Y-%m-%d %H:%M:%f000", "now", f"{seconds:+d} seconds", type_=DateTime
+    )
+
+
+def supports_skip_locked(dialect) -> bool:
+    """
+    Понимает ли сервер FOR UPDATE SKIP LOCKED: MySQL — с 8.0.1, MariaDB —
+    только с 10.6 (XAMPP поставляет 10.4). SQLite FOR UPDATE не рендерит вовсе.
+    """
+    if dialect.name != "mysql":
+        return True
+    version = dialect.server_version_info or ()
+    if dialect.is_mariadb:
+        return version >= (10, 6)
+    return version >= (8, 0, 1)
+
+
+async def lock_for_batch(db: AsyncSession, query):
+    """
+    Блокировка строк пачки фоновой задачи: FOR UPDATE SKIP LOCKED, где сервер
+    его поддерживает, иначе обычный FOR UPDATE (второй экземпляр подождёт
+    commit первого вместо того, чтобы пропустить занятые строки).
+    """
+    # версия сервера известна только после подключения
+    conn = await db.connection()
+    return query.with_for_update(skip_locked=supports_skip_locked(conn.dialect))
@@ -0,0 +1,57 @@
+"""
+Освобождение ссылок на blob'ы media_blobs — на уровне Connection, чтобы
+одной логикой пользовались синхронный CRUD, асинхронный (через run_sync)
+и миграции внутри init_db() (модуль не импортирует manager).
+"""
+
+import logging
+import os
+from typing import Dict, Iterable
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Connection
+
+from db.models.model import MediaBlob, MediaFileId
+
+logger = logging.getLogger(__name__)
+
+
+def release_blob_refs(conn: Connection, counts: Dict[int, int]) -> list[str]:
+    """
+    Уменьшает ref_count (в транзакции вызывающего) и удаляет записи blob'ов,
+    на которые больше никто не ссылается. Возвращает пути их файлов —
+    удалить через remove_blob_files() после commit.
+    """
+    if not counts:
+        return []
+    for blob_id, count in counts.items():
+        conn.execute(
+            update(MediaBlob)
+            .where(MediaBlob.id == blob_id)
+            .values(ref_count=MediaBlob.ref_count - count)
+        )
+    orphans = conn.execute(
+        select(MediaBlob.id, MediaBlob.path).where(
+            MediaBlob.id.in_(list(counts)), MediaBlob.ref_count <= 0
+        )
+    ).all()
+    if orphans:
+        orphan_ids = [row.id for row in orphans]
+        conn.execute(delete(MediaFileId).where(MediaFileId.blob_id.in_(orphan_ids)))
+        conn.execute(delete(MediaBlob).where(MediaBlob.id.in_(orphan_ids)))
+    return [row.path for row in orphans]
+
+
+def remove_blob_files(paths: Iterable[str]) -> int:
+    """Удаляет файлы освобождённых blob'ов. Возвращает освобождённые байты."""
+    freed = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error("Не удалось удалить медиафайл %s: %s", path, e)
+    return freed
@@ -0,0 +1,293 @@
+"""
+Холодный архив истории: старые сообщения чата переносятся из telegram_messages
+в сжатые сегменты ARCHIVE_ROOT/<account_id>/<chat_id>/<...>.jsonl.gz —
+по строке JSON на сообщение, в порядке (date, message_id). Файл пишется
+один раз и больше не меняется, в БД о нём остаётся запись message_segments.
+
+Здесь — формат файлов и слияние архива с горячей таблицей при чтении
+(list_messages_page в telegram_crud / async_telegram_crud). Перенос делает
+async_archive_crud.archive_messages, удаление по сроку хранения —
+async_retention_crud.purge_expired_segments.
+
+Удаление сообщения, которое уже в архиве, файл не меняет: пометка пишется
+в segment_deletions (record_deletions) и накладывается при чтении (merge_page).
+"""
+
+import gzip
+import json
+import logging
+import os
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.engine import Connection
+
+from config import settings
+from db.models.model import MessageSegment, SegmentDeletion
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ROOT = os.path.join(settings.BASE_DIR, "archive")
+
+# Сколько распакованных сегментов держать в памяти: листание истории
+# страницами читает один и тот же файл много раз подряд
+SEGMENT_CACHE_SIZE = 8
+
+_DATES = ("date", "deleted_at", "created_at", "updated_at")
+
+
+def message_key(message: dict) -> tuple:
+    """Ключ порядка истории (date, message_id); сообщения без даты — первыми, как в БД."""
+    date = message["date"]
+    return (date is not None, date or datetime.min, message["message_id"])
+
+
+def cursor_key(date: Optional[datetime], message_id: int) -> tuple:
+    return (date is not None, date or datetime.min, message_id)
+
+
+def segment_path(account_id: int, chat_id: int, date_from: datetime) -> str:
+    name = f"{date_from:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+    return os.path.join(ARCHIVE_ROOT, str(account_id), str(chat_id), name)
+
+
+def _encode(message: dict) -> str:
+    record = dict(message)
+    for field in _DATES:
+        if record.get(field) is not None:
+            record[field] = record[field].isoformat()
+    return json.dumps(record, ensure_ascii=False)
+
+
+def _decode(line: str) -> dict:
+    record = json.loads(line)
+    for field in _DATES:
+        if record.get(field) is not None:
+            record[field] = datetime.fromisoformat(record[field])
+    return record
+
+
+def write_segment(path: str, messages: List[dict]) -> int:
+    """
+    Записывает сегмент (через временный файл, чтобы недописанный файл
+    никогда не лежал под своим именем). Возвращает размер файла в байтах.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for message in messages:
+            f.write(_encode(message) + "\n")
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def _read_segment(path: str) -> tuple:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return tuple(_decode(line) for line in f)
+
+
+def read_segment(path: str) -> List[dict]:
+    """Сообщения сегмента (копии — вызывающий может их менять)."""
+    try:
+        return [dict(message) for message in _read_segment(path)]
+    except FileNotFoundError:
+        logger.error("Файл сегмента архива не найден: %s", path)
+        return []
+
+
+def remove_segment_files(paths: Iterable[str]) -> int:
+    """Удаляет файлы сегментов. Возвращает освобождённые байты."""
+    freed = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error("Не удалось удалить сегмент архива %s: %s", path, e)
+    return freed
+
+
+def segment_blob_refs(paths: Iterable[str]) -> Counter:
+    """Ссылки сообщений сегментов на blob'ы: {media_blob_id: сколько сообщений}."""
+    refs = Counter()
+    for path in paths:
+        for message in read_segment(path):
+            if message.get("media_blob_id"):
+                refs[message["media_blob_id"]] += 1
+    return refs
+
+
+def segments_query(account_id: int, chat_id: int, after: Optional[tuple]):
+    """Сегменты чата, в которых могут быть сообщения после позиции after."""
+    query = (
+        select(MessageSegment.path, MessageSegment.date_from)
+        .filter_by(account_id=account_id, chat_id=chat_id)
+        .order_by(MessageSegment.date_from, MessageSegment.id)
+    )
+    if after is not None and after[0]:
+        query = query.where(MessageSegment.date_to >= after[1])
+    return query
+
+
+def archive_page(segments, after: Optional[tuple], limit: int) -> List[dict]:
+    """
+    Первые limit сообщений архива после позиции after. segments — (path, date_from)
+    по возрастанию date_from; сегменты могут пересекаться по датам (опоздавшие
+    сообщения уходят в архив следующим проходом), поэтому читаются, пока
+    следующий сегмент может попасть в страницу.
+    """
+    found: List[dict] = []
+    for path, date_from in segments:
+        if len(found) >= limit and cursor_key(date_from, -1) > message_key(found[limit - 1]):
+            break
+        found.extend(
+            m for m in read_segment(path) if after is None or message_key(m) > after
+        )
+        found.sort(key=message_key)
+    return found[:limit]
+
+
+def segments_with_ids_query(
+    account_id: int, message_ids: List[int], chat_ids: Optional[Iterable[int]] = None
+):
+    """
+    Сегменты аккаунта (или только чатов chat_ids), в диапазон message_id
+    которых попадает хотя бы часть message_ids. Для find_archived.
+    """
+    query = select(
+        MessageSegment.id,
+        MessageSegment.chat_id,
+        MessageSegment.path,
+        MessageSegment.message_id_from,
+        MessageSegment.message_id_to,
+    ).where(
+        MessageSegment.account_id == account_id,
+        MessageSegment.message_id_from <= max(message_ids),
+        MessageSegment.message_id_to >= min(message_ids),
+    )
+    if chat_ids is not None:
+        query = query.where(MessageSegment.chat_id.in_(set(chat_ids)))
+    return query.order_by(MessageSegment.id)
+
+
+def find_archived(segments, message_ids: Iterable[int]) -> Dict[tuple, dict]:
+    """
+    Сообщения с message_ids из сегментов segments (строки segments_with_ids_query).
+    Файл читается, только если в его диапазон попадает какой-то из id.
+    Возвращает {(chat_id, message_id): сообщение}, у сообщения — "segment_id".
+    """
+    ids = sorted(set(message_ids))
+    found: Dict[tuple, dict] = {}
+    for segment_id, chat_id, path, id_from, id_to in segments:
+        i = bisect_left(ids, id_from)
+        if i == len(ids) or ids[i] > id_to:
+            continue
+        wanted = set(ids[i : bisect_left(ids, id_to + 1)])
+        for message in read_segment(path):
+            if message["message_id"] in wanted:
+                message["segment_id"] = segment_id
+                found.setdefault((chat_id, message["message_id"]), message)
+    return found
+
+
+def record_deletions(
+    conn: Connection, account_id: int, archived: Dict[tuple, dict], deleted_at: datetime
+) -> Dict[int, int]:
+    """
+    Помечает удалёнными архивные сообщения archived (результат find_archived):
+    строки segment_deletions и deleted_count сегментов. Уже удалённые (в файле
+    или отдельной пометкой) пропускаются.
+    Возвращает {chat_id: помечено} — для chat_summary.add_deleted.
+    """
+    pending = {
+        (m["segment_id"], m["message_id"]): chat_id
+        for (chat_id, _), m in archived.items()
+        if m["deleted_at"] is None
+    }
+    if not pending:
+        return {}
+    key = tuple_(SegmentDeletion.segment_id, SegmentDeletion.message_id)
+    for row in conn.execute(
+        select(SegmentDeletion.segment_id, SegmentDeletion.message_id).where(
+            key.in_(list(pending))
+        )
+    ):
+        pending.pop(tuple(row), None)
+    if not pending:
+        return {}
+    conn.execute(
+        insert(SegmentDeletion),
+        [
+            {
+                "segment_id": segment_id,
+                "message_id": message_id,
+                "account_id": account_id,
+                "chat_id": chat_id,
+                "deleted_at": deleted_at,
+                "created_at": deleted_at,
+                "updated_at": deleted_at,
+            }
+            for (segment_id, message_id), chat_id in pending.items()
+        ],
+    )
+    for segment_id, count in Counter(segment_id for segment_id, _ in pending).items():
+        conn.execute(
+            update(MessageSegment)
+            .where(MessageSegment.id == segment_id)
+            .values(deleted_count=MessageSegment.deleted_count + count)
+        )
+    return dict(Counter(pending.values()))
+
+
+def segment_deletions(
+    conn: Connection, account_id: int, chat_id: int, messages: List[dict]
+) -> Dict[int, datetime]:
+    """Пометки удаления для архивных сообщений чата: {message_id: deleted_at}."""
+    ids = [m["message_id"] for m in messages if m["deleted_at"] is None]
+    if not ids:
+        return {}
+    rows = conn.execute(
+        select(SegmentDeletion.message_id, SegmentDeletion.deleted_at).where(
+            SegmentDeletion.account_id == account_id,
+            SegmentDeletion.chat_id == chat_id,
+            SegmentDeletion.message_id.in_(ids),
+        )
+    )
+    return dict(rows.all())
+
+
+def merge_page(
+    hot: List[dict],
+    cold: List[dict],
+    limit: int,
+    deletions: Optional[Dict[int, datetime]] = None,
+) -> tuple[List[dict], bool]:
+    """
+    Страница из горячей таблицы и архива по (date, message_id). Сообщение,
+    записанное повторно уже после переноса в архив, выдаётся один раз.
+    deletions — пометки удаления архивных сообщений (segment_deletions).
+    Возвращает (сообщения, есть ли продолжение).
+    """
+    if deletions:
+        for message in cold:
+            if message["deleted_at"] is None:
+                message["deleted_at"] = deletions.get(message["message_id"])
+    if not cold:
+        return hot, len(hot) >= limit
+    merged, last = [], None
+    for message in sorted(hot + cold, key=message_key):
+        key = message_key(message)
+        if key != last:
+            merged.append(message)
+            last = key
+    has_more = len(merged) > limit or len(hot) >= limit or len(cold) >= limit
+    return merged[:limit], has_more
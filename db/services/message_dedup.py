@@ -0,0 +1,137 @@
+"""
+Схлопывание дублей telegram_messages по естественному ключу
+(account_id, chat_id, message_id). Остаётся строка с наименьшим id,
+на неё переносятся пометка удаления, logs_msg_id и медиа из дублей.
+
+Таблица проходится окнами по id, каждое окно — отдельная короткая
+транзакция, так что большие таблицы не блокируются надолго.
+Используется миграцией 0003_message_natural_key и scripts/dedup_messages.py.
+"""
+
+import logging
+from collections import Counter
+from typing import Callable, Optional
+
+from sqlalchemy import delete, exists, func, select, tuple_, update
+from sqlalchemy.engine import Connection, Engine
+
+from db.models.model import TelegramMessage
+from db.services.media_refs import release_blob_refs, remove_blob_files
+
+logger = logging.getLogger(__name__)
+
+# Ширина окна по id на одну транзакцию
+BATCH_SIZE = 5000
+
+_messages = TelegramMessage.__table__
+
+
+def _merge(survivor, duplicates) -> tuple[dict, Optional[int]]:
+    """
+    Значения, которые нужно перенести на оставшуюся строку, и id дубля,
+    чей blob переходит к ней (его ссылка не освобождается).
+    """
+    values = {}
+    if survivor.deleted_at is None:
+        deleted = [d.deleted_at for d in duplicates if d.deleted_at]
+        if deleted:
+            values["deleted_at"] = min(deleted)
+    if survivor.logs_msg_id is None:
+        logs = [d.logs_msg_id for d in duplicates if d.logs_msg_id]
+        if logs:
+            values["logs_msg_id"] = logs[0]
+    donor_id = None
+    if survivor.media_blob_id is None:
+        donor = next((d for d in duplicates if d.media_blob_id), None)
+        if donor:
+            donor_id = donor.id
+            values.update(
+                media_path=donor.media_path,
+                media_state=donor.media_state,
+                media_size=donor.media_size,
+                media_blob_id=donor.media_blob_id,
+            )
+    return values, donor_id
+
+
+def dedup_window(conn: Connection, low: int, high: int) -> tuple[int, list[str]]:
+    """
+    Удаляет дубли с id в (low, high]. Возвращает количество удалённых строк
+    и пути медиафайлов, на которые больше никто не ссылается.
+    """
+    other = _messages.alias("other")
+    key = (_messages.c.account_id, _messages.c.chat_id, _messages.c.message_id)
+    duplicates = conn.execute(
+        select(_messages).where(
+            _messages.c.id > low,
+            _messages.c.id <= high,
+            exists().where(
+                other.c.account_id == _messages.c.account_id,
+                other.c.chat_id == _messages.c.chat_id,
+                other.c.message_id == _messages.c.message_id,
+                other.c.id < _messages.c.id,
+            ),
+        )
+    ).all()
+    if not duplicates:
+        return 0, []
+
+    keys = {(row.account_id, row.chat_id, row.message_id) for row in duplicates}
+    rows = conn.execute(
+        select(_messages)
+        .where(tuple_(*key).in_(keys), _messages.c.id <= high)
+        .order_by(_messages.c.id)
+    ).all()
+    groups: dict[tuple, list] = {}
+    for row in rows:
+        groups.setdefault((row.account_id, row.chat_id, row.message_id), []).append(row)
+
+    released = Counter()
+    removed_ids = []
+    for group in groups.values():
+        survivor, rest = group[0], [row for row in group[1:] if row.id > low]
+        values, donor_id = _merge(survivor, rest)
+        if values:
+            conn.execute(
+                update(_messages).where(_messages.c.id == survivor.id).values(**values)
+            )
+        for row in rest:
+            removed_ids.append(row.id)
+            if row.media_blob_id and row.id != donor_id:
+                released[row.media_blob_id] += 1
+
+    conn.execute(delete(_messages).where(_messages.c.id.in_(removed_ids)))
+    return len(removed_ids), release_blob_refs(conn, released)
+
+
+def dedup_messages(
+    engine: Engine,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> dict:
+    """
+    Проходит всю таблицу окнами по batch_size id. progress(high, max_id, removed)
+    вызывается после каждого окна. Возвращает {"removed", "freed_bytes"}.
+    """
+    with engine.connect() as conn:
+        max_id = conn.execute(select(func.max(_messages.c.id))).scalar() or 0
+
+    removed = freed = 0
+    low = 0
+    while low < max_id:
+        high = min(low + batch_size, max_id)
+        with engine.begin() as conn:
+            count, orphan_paths = dedup_window(conn, low, high)
+        removed += count
+        freed += remove_blob_files(orphan_paths)
+        if progress:
+            progress(high, max_id, removed)
+        low = high
+
+    if removed:
+        logger.info(
+            "Дубли сообщений: удалено %d, освобождено %.1f МБ",
+            removed,
+            freed / 1024 / 1024,
+        )
+    return {"removed": removed, "freed_bytes": freed}
@@ -0,0 +1,226 @@
+"""
+Собеседники аккаунтов (peers) и история их имён (peer_names).
+
+Сообщения хранят только числовые chat_id / sender_id, имена берутся отсюда:
+record_peers — при записи сообщений (в той же транзакции), resolve_names —
+при чтении. Функции работают с синхронным Connection, async-CRUD вызывает
+их через AsyncConnection.run_sync; backfill_peers — миграция 0007_peers.
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.engine import Connection, Engine
+
+from db.models.model import Peer, PeerName, TelegramMessage
+
+logger = logging.getLogger(__name__)
+
+# Ширина окна по id на одну транзакцию при переносе имён из сообщений
+BATCH_SIZE = 5000
+
+_peers = Peer.__table__
+_names = PeerName.__table__
+_messages = TelegramMessage.__table__
+
+
+def _insert_ignore(dialect: str, table):
+    # как manager.insert_ignore, но без импорта manager: модуль работает и внутри init_db()
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return insert(table).prefix_with("OR IGNORE")
+    return insert(table).prefix_with("IGNORE")
+
+
+def without_names(row: dict) -> dict:
+    """Строка сообщения для записи: имена живут в peers, в строке — только id."""
+    return {**row, "chat_name": "", "sender_name": None}
+
+
+def record_peers(conn: Connection, rows: Iterable[dict]) -> int:
+    """
+    Запоминает имена chat_id/chat_name и sender_id/sender_name из сообщений:
+    текущее имя в peers (побеждает последнее по порядку строк) и каждое новое
+    имя в peer_names. Пишет только новое и изменившееся. Возвращает число
+    собеседников, у которых имя появилось или поменялось.
+    """
+    latest: Dict[tuple, str] = {}
+    first_seen: Dict[tuple, datetime] = {}
+    now = datetime.utcnow()
+    for row in rows:
+        for peer_id, name in (
+            (row.get("chat_id"), row.get("chat_name")),
+            (row.get("sender_id"), row.get("sender_name")),
+        ):
+            if peer_id is None or not name:
+                continue
+            key = (row["account_id"], peer_id)
+            latest[key] = name
+            first_seen.setdefault((*key, name), row.get("date") or now)
+    if not latest:
+        return 0
+
+    current = {
+        (row.account_id, row.peer_id): row.name
+        for row in conn.execute(
+            select(_peers.c.account_id, _peers.c.peer_id, _peers.c.name).where(
+                tuple_(_peers.c.account_id, _peers.c.peer_id).in_(list(latest))
+            )
+        )
+    }
+    changed = {key: name for key, name in latest.items() if current.get(key) != name}
+    if not changed:
+        return 0
+
+    dialect = conn.dialect.name
+    new = [key for key in changed if key not in current]
+    if new:
+        conn.execute(
+            _insert_ignore(dialect, _peers),
+            [
+                {
+                    "account_id": key[0],
+                    "peer_id": key[1],
+                    "name": changed[key],
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for key in new
+            ],
+        )
+    for key in changed.keys() - set(new):
+        conn.execute(
+            update(_peers)
+            .where(_peers.c.account_id == key[0], _peers.c.peer_id == key[1])
+            .values(name=changed[key], updated_at=now)
+        )
+    conn.execute(
+        _insert_ignore(dialect, _names),
+        [
+            {
+                "account_id": account_id,
+                "peer_id": peer_id,
+                "name": name,
+                "first_seen_at": seen,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for (account_id, peer_id, name), seen in first_seen.items()
+            if (account_id, peer_id) in changed
+        ],
+    )
+    return len(changed)
+
+
+def peer_names(conn: Connection, keys: Iterable[tuple]) -> Dict[tuple, str]:
+    """Текущие имена: (account_id, peer_id) -> name."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    return {
+        (row.account_id, row.peer_id): row.name
+        for row in conn.execute(
+            select(_peers.c.account_id, _peers.c.peer_id, _peers.c.name).where(
+                tuple_(_peers.c.account_id, _peers.c.peer_id).in_(keys)
+            )
+        )
+    }
+
+
+def resolve_names(conn: Connection, messages: List[dict]) -> List[dict]:
+    """
+    Проставляет в словари сообщений chat_name и sender_name из peers
+    (у строк старой схемы и сегментов архива — то, что записано в них).
+    """
+    keys = set()
+    for m in messages:
+        keys.add((m["account_id"], m["chat_id"]))
+        if m.get("sender_id") is not None:
+            keys.add((m["account_id"], m["sender_id"]))
+    names = peer_names(conn, keys)
+    for m in messages:
+        m["chat_name"] = (
+            names.get((m["account_id"], m["chat_id"])) or m.get("chat_name") or str(m["chat_id"])
+        )
+        m["sender_name"] = names.get((m["account_id"], m.get("sender_id"))) or m.get(
+            "sender_name"
+        )
+    return messages
+
+
+def resolve_chat_names(conn: Connection, account_id: int, chats: List[dict]) -> List[dict]:
+    """
+    Проставляет chat_name чатам аккаунта из сводки (chat_summaries) по peers:
+    сводка помнит имя на момент последнего сообщения, peers — текущее.
+    """
+    names = peer_names(conn, [(account_id, chat["chat_id"]) for chat in chats])
+    for chat in chats:
+        chat["chat_name"] = (
+            names.get((account_id, chat["chat_id"]))
+            or chat.get("chat_name")
+            or str(chat["chat_id"])
+        )
+    return chats
+
+
+def backfill_window(conn: Connection, low: int, high: int) -> int:
+    """
+    Переносит имена из строк с id в (low, high] в peers/peer_names
+    и очищает их в строках. Возвращает число обработанных строк.
+    """
+    rows = conn.execute(
+        select(
+            _messages.c.account_id,
+            _messages.c.chat_id,
+            _messages.c.chat_name,
+            _messages.c.sender_id,
+            _messages.c.sender_name,
+            _messages.c.date,
+        )
+        .where(
+            _messages.c.id > low,
+            _messages.c.id <= high,
+            (_messages.c.chat_name != "") | _messages.c.sender_name.is_not(None),
+        )
+        .order_by(_messages.c.id)
+    ).all()
+    if not rows:
+        return 0
+    record_peers(conn, [row._asdict() for row in rows])
+    conn.execute(
+        update(_messages)
+        .where(_messages.c.id > low, _messages.c.id <= high)
+        .values(chat_name="", sender_name=None)
+    )
+    return len(rows)
+
+
+def backfill_peers(
+    engine: Engine,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> int:
+    """
+    Проходит telegram_messages окнами по batch_size id, по окну на транзакцию.
+    progress(high, max_id, done) — после каждого окна. Возвращает число строк с именами.
+    """
+    with engine.connect() as conn:
+        max_id = conn.execute(select(func.max(_messages.c.id))).scalar() or 0
+
+    done = 0
+    low = 0
+    while low < max_id:
+        high = min(low + batch_size, max_id)
+        with engine.begin() as conn:
+            done += backfill_window(conn, low, high)
+        if progress:
+            progress(high, max_id, done)
+        low = high
+    if done:
+        logger.info("Имена собеседников перенесены в peers из %d сообщений", done)
+    return done
@@ -0,0 +1,98 @@
+"""
+Кэш авторизации в памяти: telegram_user_id -> пользователь с активной сессией.
+
+AuthMiddleware проверяет сессию на каждое сообщение; пока запись в кэше
+жива, БД не трогается. Запись живёт до expires_at сессии, но не дольше
+ttl секунд — так изменения из другого процесса (вторая копия бота,
+скрипты на синхронном user_crud) видны не позже чем через ttl.
+login_user / logout_user / delete_admin / set_new_admin сбрасывают
+записи сами (async_user_crud).
+
+Промах читает БД без блокировок, поэтому запись, прочитанная до сброса,
+могла бы вернуться в кэш после него. Чтобы этого не было, put принимает
+version(), взятую до чтения: после любого сброса она устарела и запись
+не сохраняется.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from config import settings
+from db.models.model import User
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    def __init__(
+        self,
+        ttl: int = settings.SESSION_CACHE_TTL,
+        max_size: int = settings.SESSION_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        # telegram_user_id -> (user, expires_at сессии, monotonic-срок записи)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_user_id: int) -> Optional[User]:
+        """Пользователь из кэша или None (нет записи, сессия или запись истекли)."""
+        entry = self._entries.get(telegram_user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at, deadline = entry
+        if deadline <= time.monotonic() or expires_at <= datetime.utcnow():
+            del self._entries[telegram_user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(telegram_user_id)
+        self.hits += 1
+        return user
+
+    def version(self) -> int:
+        """Версия кэша: взять до чтения сессии из БД и передать в put."""
+        return self._version
+
+    def put(
+        self, telegram_user_id: int, user: User, expires_at: datetime, version: int
+    ) -> None:
+        if not self.ttl or version != self._version:
+            return
+        self._entries[telegram_user_id] = (
+            user,
+            expires_at,
+            time.monotonic() + self.ttl,
+        )
+        self._entries.move_to_end(telegram_user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_user_id: int) -> None:
+        """Сбрасывает запись одного Telegram-пользователя."""
+        self._version += 1
+        self._entries.pop(telegram_user_id, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает записи всех Telegram-пользователей, вошедших под user_id."""
+        self._version += 1
+        for telegram_user_id in [
+            key for key, (user, _, _) in self._entries.items() if user.id == user_id
+        ]:
+            del self._entries[telegram_user_id]
+
+    def clear(self) -> None:
+        self._version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Кэш сессий процесса бота
+session_cache = SessionCache()
@@ -1,15 +1,54 @@
+import base64
+import binascii
+import json
 import logging
+from collections import Counter
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterator, List, Optional
 
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_, select, tuple_, update
+from sqlalchemy.engine import Connection
 
 from bot.utils.crypto import encrypt_text, decrypt_text
-from db.models.model import TelegramAccount, TelegramMessage, UserSession
-from db.services.manager import get_db_session
+from db.models.model import (
+    AccountLease,
+    ChatSummary,
+    MessageSegment,
+    Peer,
+    PeerName,
+    SegmentDeletion,
+    TelegramAccount,
+    TelegramMessage,
+    UserSession,
+)
+from db.services import chat_summary, peers
+from db.services.message_archive import (
+    archive_page,
+    cursor_key,
+    find_archived,
+    merge_page,
+    record_deletions,
+    remove_segment_files,
+    segment_blob_refs,
+    segment_deletions,
+    segments_query,
+    segments_with_ids_query,
+)
+from db.services.manager import get_db_session, insert_or_skip
+from db.services.media_refs import release_blob_refs, remove_blob_files
 
 logger = logging.getLogger(__name__)
 
+# Естественный ключ сообщения: одно сообщение Telegram хранится один раз,
+# повторная доставка (переподключение, догрузка) ничего не пишет
+MESSAGE_KEY = ["account_id", "chat_id", "message_id"]
+
+# Размер пачки при потоковом чтении истории чата
+MESSAGE_CHUNK = 500
+
+# Сколько id помещать в один UPDATE ... IN (...)
+DELETE_CHUNK = 500
+
 
 def _decrypt_two_factor_pass(two_factor_pass: str):
     return decrypt_text(two_factor_pass) if two_factor_pass else None
@@ -32,35 +71,59 @@ def create_telegram_message(
     logs_msg_id=None,
     media_type=None,
     media_path=None,
+    media_state=None,
+    media_size=None,
 ):
+    key = {"account_id": account_id, "chat_id": chat_id, "message_id": message_id}
+    row = {
+        **key,
+        "chat_name": chat_name,
+        "sender_id": sender_id,
+        "sender_name": sender_name,
+        "text": text,
+        "date": date,
+        "logs_msg_id": logs_msg_id,
+        "media_type": media_type,
+        "media_path": media_path,
+        "media_state": media_state,
+        "media_size": media_size,
+    }
     with get_db_session() as db:
-        msg = TelegramMessage(
-            account_id=account_id,
-            chat_id=chat_id,
-            chat_name=chat_name,
-            message_id=message_id,
-            sender_id=sender_id,
-            sender_name=sender_name,
-            text=text,
-            date=date,
-            logs_msg_id=logs_msg_id,
-            media_type=media_type,
-            media_path=media_path,
-        )
         try:
-            db.add(msg)
-            db.commit()
-            db.refresh(msg)
-            logger.info(
-                "Создано сообщение id=%s, chat_id=%s, message_id=%s",
-                msg.id,
-                chat_id,
-                message_id,
+            # новое ли сообщение — по ключу, а не по rowcount: на MySQL upsert
+            # дубликата с CLIENT.FOUND_ROWS тоже возвращает 1
+            existing = db.query(TelegramMessage.id).filter_by(**key).scalar()
+            conn = db.connection()
+            if existing is None:
+                archived = _archived_messages(db, [row]).get(
+                    tuple(row[k] for k in MESSAGE_KEY)
+                )
+                if archived is not None:
+                    # повторная доставка уже перенесённого в архив — строку не пишем
+                    del archived["segment_id"]
+                    peers.record_peers(conn, [row])
+                    peers.resolve_names(conn, [archived])
+                    db.commit()
+                    return archived
+            conn.execute(
+                insert_or_skip(db, TelegramMessage, MESSAGE_KEY), [peers.without_names(row)]
             )
+            if existing is None:
+                peers.record_peers(conn, [row])
+                chat_summary.add_messages(conn, [row])
+            db.commit()
+            msg = db.query(TelegramMessage).filter_by(**key).one()
+            if existing is None:
+                logger.info(
+                    "Создано сообщение id=%s, chat_id=%s, message_id=%s",
+                    msg.id,
+                    chat_id,
+                    message_id,
+                )
         except Exception as e:
             logger.error("Create_telegram_message: Сообщение не записано в БД")
             return
-        return {
+        message = {
             "id": msg.id,
             "account_id": msg.account_id,
             "chat_name": msg.chat_name,
@@ -74,9 +137,76 @@ def create_telegram_message(
             "logs_msg_id": msg.logs_msg_id,
             "media_type": msg.media_type,
             "media_path": msg.media_path,
+            "media_state": msg.media_state,
+            "media_size": msg.media_size,
             "created_at": msg.created_at,
             "updated_at": msg.updated_at,
         }
+        peers.resolve_names(db.connection(), [message])
+        return message
+
+
+def bulk_create_telegram_messages(messages: List[dict]) -> int:
+    """
+    Записывает пачку сообщений одним INSERT (executemany) и одним commit.
+    Каждый элемент — словарь с полями TelegramMessage.
+    Уже сохранённые сообщения (тот же MESSAGE_KEY, в том числе перенесённые
+    в холодный архив) пропускаются.
+    Возвращает количество новых строк.
+    """
+    if not messages:
+        return 0
+    with get_db_session() as db:
+        conn = db.connection()
+        seen = set(
+            conn.execute(
+                select(*(TelegramMessage.__table__.c[k] for k in MESSAGE_KEY)).where(
+                    tuple_(*(TelegramMessage.__table__.c[k] for k in MESSAGE_KEY)).in_(
+                        {tuple(m[k] for k in MESSAGE_KEY) for m in messages}
+                    )
+                )
+            ).all()
+        )
+        new_messages = []
+        for m in messages:
+            key = tuple(m[k] for k in MESSAGE_KEY)
+            if key not in seen:
+                seen.add(key)
+                new_messages.append(m)
+        if new_messages:
+            archived = _archived_messages(db, new_messages)
+            new_messages = [
+                m for m in new_messages if tuple(m[k] for k in MESSAGE_KEY) not in archived
+            ]
+        peers.record_peers(conn, messages)
+        if not new_messages:
+            return 0
+        stmt = insert_or_skip(db, TelegramMessage, MESSAGE_KEY)
+        inserted = conn.execute(
+            stmt, [peers.without_names(m) for m in new_messages]
+        ).rowcount
+        chat_summary.add_messages(conn, new_messages)
+        return inserted
+
+
+def _archived_messages(db, messages: List[dict]) -> Dict[tuple, dict]:
+    """
+    Какие из messages уже в холодном архиве (повторная доставка после переноса):
+    {(account_id, chat_id, message_id): сообщение из сегмента}.
+    """
+    by_account: Dict[int, List[dict]] = {}
+    for m in messages:
+        by_account.setdefault(m["account_id"], []).append(m)
+    archived = {}
+    for account_id, batch in by_account.items():
+        ids = [m["message_id"] for m in batch]
+        query = segments_with_ids_query(account_id, ids, {m["chat_id"] for m in batch})
+        found = find_archived(db.execute(query).all(), ids)
+        for m in batch:
+            message = found.get((m["chat_id"], m["message_id"]))
+            if message is not None:
+                archived[(account_id, m["chat_id"], m["message_id"])] = message
+    return archived
 
 
 def get_sender_display_name(sender_id: int) -> str:
@@ -97,80 +227,251 @@ def get_sender_display_name(sender_id: int) -> str:
 def list_chats_for_account(account_id: int) -> list[dict]:
     with get_db_session() as db:
         chats = (
-            db.query(
-                TelegramMessage.chat_id,
-                TelegramMessage.chat_name,
-                func.count(TelegramMessage.id).label("msg_count"),
-            )
+            db.query(ChatSummary)
             .filter_by(account_id=account_id)
-            .group_by(TelegramMessage.chat_id, TelegramMessage.chat_name)
+            .order_by(ChatSummary.last_message_at.desc())
             .all()
         )
 
-        return [
-            {
-                "chat_id": chat.chat_id,
-                "chat_name": chat.chat_name,
-                "msg_count": chat.msg_count,
-            }
-            for chat in chats
-        ]
+        return peers.resolve_chat_names(
+            db.connection(),
+            account_id,
+            [
+                {
+                    "chat_id": chat.chat_id,
+                    "chat_name": chat.chat_name,
+                    "msg_count": chat.message_count,
+                    "deleted_count": chat.deleted_count,
+                    "media_bytes": chat.media_bytes,
+                    "last_message_at": chat.last_message_at,
+                    "last_sender_name": chat.last_sender_name,
+                }
+                for chat in chats
+            ],
+        )
+
+
+def _format_chat_message(msg: dict) -> dict:
+    return {
+        "id": msg["id"],
+        "chat_id": msg["chat_id"],
+        "sender_id": msg["sender_id"],
+        "sender_name": msg["sender_name"],
+        "chat_name": msg["chat_name"],
+        "text": msg["text"],
+        "media_path": msg["media_path"],
+        "date": msg["date"].strftime("%Y-%m-%d %H:%M:%S") if msg["date"] else None,
+        "deleted_at": (
+            msg["deleted_at"].strftime("%Y-%m-%d %H:%M:%S")
+            if msg["deleted_at"]
+            else None
+        ),
+    }
 
 
 def get_chat_messages(account_id: int, chat_id: int) -> list[dict]:
-    with get_db_session() as db:
-        messages = (
-            db.query(TelegramMessage)
-            .filter_by(account_id=account_id, chat_id=chat_id)
-            .order_by(TelegramMessage.date.asc())
-            .all()
+    """Вся история чата (включая холодный архив) — для больших чатов iter_chat_messages."""
+    return [
+        _format_chat_message(msg)
+        for chunk in iter_chat_messages(account_id, chat_id)
+        for msg in chunk
+    ]
+
+
+# ---------- Постраничное чтение истории по курсору ----------
+def encode_cursor(date: Optional[datetime], message_id: int) -> str:
+    """Непрозрачный токен продолжения: позиция (date, message_id) последней строки."""
+    raw = json.dumps([date.isoformat() if date else None, message_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, message_id = json.loads(raw)
+        return (datetime.fromisoformat(date) if date else None), int(message_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor!r}") from e
+
+
+def _after_cursor(cursor: str):
+    """
+    Условие «строго после курсора» в порядке (date, message_id).
+    NULL в date MySQL и SQLite сортируют первыми.
+    """
+    date, message_id = decode_cursor(cursor)
+    if date is None:
+        return or_(
+            TelegramMessage.date.is_not(None),
+            and_(TelegramMessage.date.is_(None), TelegramMessage.message_id > message_id),
         )
+    return or_(
+        TelegramMessage.date > date,
+        and_(TelegramMessage.date == date, TelegramMessage.message_id > message_id),
+    )
+
+
+def _chat_page_query(account_id: int, chat_id: int, limit: int, cursor: Optional[str]):
+    query = (
+        select(TelegramMessage)
+        .filter_by(account_id=account_id, chat_id=chat_id)
+        .order_by(TelegramMessage.date.asc(), TelegramMessage.message_id.asc())
+        .limit(limit)
+    )
+    if cursor:
+        query = query.where(_after_cursor(cursor))
+    return query
+
+
+def _message_to_dict(msg: TelegramMessage) -> dict:
+    return {
+        "id": msg.id,
+        "account_id": msg.account_id,
+        "chat_id": msg.chat_id,
+        "chat_name": msg.chat_name,
+        "message_id": msg.message_id,
+        "sender_id": msg.sender_id,
+        "sender_name": msg.sender_name,
+        "text": msg.text,
+        "date": msg.date,
+        "deleted_at": msg.deleted_at,
+        "logs_msg_id": msg.logs_msg_id,
+        "media_type": msg.media_type,
+        "media_path": msg.media_path,
+        "media_state": msg.media_state,
+        "media_size": msg.media_size,
+        "created_at": msg.created_at,
+        "updated_at": msg.updated_at,
+    }
+
+
+def _next_cursor(items: List[dict], has_more: bool) -> Optional[str]:
+    if not items or not has_more:
+        return None
+    return encode_cursor(items[-1]["date"], items[-1]["message_id"])
 
-        return [
-            {
-                "id": msg.id,
-                "chat_id": msg.chat_id,
-                "sender_id": msg.sender_id,
-                "sender_name": msg.sender_name,
-                "chat_name": msg.chat_name,
-                "text": msg.text,
-                "media_path": msg.media_path,
-                "date": msg.date.strftime("%Y-%m-%d %H:%M:%S"),
-                "deleted_at": (
-                    msg.deleted_at.strftime("%Y-%m-%d %H:%M:%S")
-                    if msg.deleted_at
-                    else None
-                ),
-            }
-            for msg in messages
-        ]
+
+def list_messages_page(
+    account_id: int, chat_id: int, limit: int = 50, cursor: Optional[str] = None
+) -> tuple[List[dict], Optional[str]]:
+    """
+    Страница истории чата в порядке (date, message_id) по индексу
+    (account_id, chat_id, date) — без OFFSET, глубина страницы не важна.
+    Сообщения, перенесённые в холодный архив, подмешиваются из его сегментов.
+    Возвращает (сообщения, курсор следующей страницы или None).
+    """
+    after = cursor_key(*decode_cursor(cursor)) if cursor else None
+    with get_db_session() as db:
+        rows = db.execute(_chat_page_query(account_id, chat_id, limit, cursor))
+        hot = [_message_to_dict(msg) for msg in rows.scalars()]
+        segments = db.execute(segments_query(account_id, chat_id, after)).all()
+        cold = archive_page(segments, after, limit) if segments else []
+        conn = db.connection()
+        deletions = segment_deletions(conn, account_id, chat_id, cold)
+        items, has_more = merge_page(hot, cold, limit, deletions)
+        peers.resolve_names(conn, items)
+    return items, _next_cursor(items, has_more)
+
+
+def iter_chat_messages(
+    account_id: int, chat_id: int, chunk_size: int = MESSAGE_CHUNK
+) -> Iterator[List[dict]]:
+    """
+    Вся история чата пачками по chunk_size: в памяти одна пачка,
+    каждая читается своей короткой сессией.
+    """
+    cursor = None
+    while True:
+        items, cursor = list_messages_page(account_id, chat_id, chunk_size, cursor)
+        if items:
+            yield items
+        if not cursor:
+            return
 
 
-def mark_deleted_messages(account_id: int, message_ids: List[int]) -> None:
+def _mark_hot_deleted(
+    conn: Connection,
+    account_id: int,
+    message_ids: List[int],
+    chat_id: Optional[int],
+    now: datetime,
+) -> tuple[int, List[int]]:
+    """
+    Помечает удалёнными строки telegram_messages: один UPDATE ... WHERE
+    message_id IN (...) на каждые DELETE_CHUNK id по индексу
+    (account_id, message_id). Удаления в личке приходят без chat_id,
+    поэтому для сводки чатов строки сначала выбираются вместе с chat_id.
+    Общая часть mark_deleted_messages обоих API (в async — через run_sync).
+    Возвращает (помечено, id, которых в таблице нет — искать в архиве).
+    """
+    marked = 0
+    missing = []
+    for i in range(0, len(message_ids), DELETE_CHUNK):
+        chunk = message_ids[i : i + DELETE_CHUNK]
+        condition = [
+            TelegramMessage.account_id == account_id,
+            TelegramMessage.message_id.in_(chunk),
+        ]
+        if chat_id is not None:
+            condition.append(TelegramMessage.chat_id == chat_id)
+        rows = conn.execute(
+            select(
+                TelegramMessage.chat_id,
+                TelegramMessage.message_id,
+                TelegramMessage.deleted_at,
+            ).where(*condition)
+        ).all()
+        found = {row.message_id for row in rows}
+        missing.extend(msg_id for msg_id in chunk if msg_id not in found)
+        counts = Counter(row.chat_id for row in rows if row.deleted_at is None)
+        if not counts:
+            continue
+        marked += conn.execute(
+            update(TelegramMessage)
+            .where(*condition, TelegramMessage.deleted_at.is_(None))
+            .values(deleted_at=now, updated_at=now)
+        ).rowcount
+        chat_summary.add_deleted(conn, account_id, counts)
+    return marked, missing
+
+
+def mark_deleted_messages(
+    account_id: int, message_ids: List[int], chat_id: int = None
+) -> int:
     """
     Помечает список сообщений (message_ids) как удалённые (deleted_at = now()).
-    Если сообщение уже помечено, повторно не обновляет.
+    Если сообщение уже помечено, повторно не обновляет. id, которых нет
+    в telegram_messages, ищутся в холодном архиве (пометка — в segment_deletions).
+    Возвращает количество помеченных сообщений.
     """
+    message_ids = list(dict.fromkeys(message_ids))
+    if not message_ids:
+        return 0
+    now = datetime.utcnow()
     with get_db_session() as db:
         try:
-            for msg_id in message_ids:
-                row = (
-                    db.query(TelegramMessage)
-                    .filter_by(account_id=account_id, message_id=msg_id)
-                    .first()
+            conn = db.connection()
+            marked, missing = _mark_hot_deleted(conn, account_id, message_ids, chat_id, now)
+            if missing:
+                query = segments_with_ids_query(
+                    account_id, missing, None if chat_id is None else [chat_id]
                 )
-
-                if row and row.deleted_at is None:
-                    row.deleted_at = datetime.utcnow()
-
+                archived = find_archived(conn.execute(query).all(), missing)
+                counts = record_deletions(conn, account_id, archived, now)
+                marked += sum(counts.values())
+                chat_summary.add_deleted(conn, account_id, counts)
             db.commit()
-            logger.info(
-                f"Помечены удалёнными сообщения: {message_ids} для account_id={account_id}"
-            )
         except Exception as e:
             db.rollback()
             logger.error(f"Ошибка при пометке удалённых: {e}")
             raise e
+    logger.info(
+        "Помечено удалёнными %d из %d сообщений для account_id=%s",
+        marked,
+        len(message_ids),
+        account_id,
+    )
+    return marked
 
 
 def list_messages_by_chat(
@@ -179,7 +480,8 @@ def list_messages_by_chat(
     """
     Возвращает список сообщений по заданному chat_id (и account_id),
     в порядке убывания по дате (последние сообщения в начале).
-    Можно использовать limit/offset для пагинации.
+    Можно использовать limit/offset для пагинации; для глубоких страниц —
+    list_messages_page (курсор вместо OFFSET).
     """
     with get_db_session() as db:
         query = (
@@ -215,7 +517,7 @@ def list_messages_by_chat(
                 }
             )
 
-        return result
+        return peers.resolve_names(db.connection(), result)
 
 
 def get_account_messages(account_id: int) -> list[dict]:
@@ -477,8 +779,41 @@ def delete_telegram_account(alias: str, phone: str) -> bool:
             return False
 
         try:
+            # сообщения удаляются каскадом — отпускаем их медиафайлы
+            released = Counter(
+                dict(
+                    db.query(TelegramMessage.media_blob_id, func.count())
+                    .filter(
+                        TelegramMessage.account_id == account.id,
+                        TelegramMessage.media_blob_id.is_not(None),
+                    )
+                    .group_by(TelegramMessage.media_blob_id)
+                    .all()
+                )
+            )
+            # и медиа сообщений из холодного архива; файлы сегментов
+            # удаляются после commit
+            segment_paths = [
+                segment.path
+                for segment in db.query(MessageSegment).filter_by(account_id=account.id)
+            ]
+            released.update(segment_blob_refs(segment_paths))
+            orphan_paths = release_blob_refs(db.connection(), released)
+            # явно, а не через ON DELETE CASCADE: SQLite без PRAGMA foreign_keys
+            # его не выполняет, а id аккаунта может достаться новому
+            for model in (
+                ChatSummary,
+                SegmentDeletion,
+                MessageSegment,
+                Peer,
+                PeerName,
+                AccountLease,
+            ):
+                db.query(model).filter_by(account_id=account.id).delete()
             db.delete(account)
             db.commit()
+            remove_blob_files(orphan_paths)
+            remove_segment_files(segment_paths)
             logger.info(f"Аккаунт '{alias}' (phone={phone}) удалён.")
             return True
         except Exception as e:
@@ -2,9 +2,9 @@ from multiprocessing import Value
 import uuid
 import logging
 from datetime import datetime, timedelta
-from passlib.hash import bcrypt
 from sqlalchemy.orm import Session
 
+from bot.utils.passwords import password_hasher
 from db.models.model import User, UserSession
 from db.services.manager import get_db_session
 
@@ -96,7 +96,7 @@ def register_user(username: str, password: str, is_admin: bool = False) -> dict:
             return
 
         # хеширование пароля
-        hash_password = bcrypt.hash(password)
+        hash_password = password_hasher.context.hash(password)
 
         # создание нового юзера
         new_user = User(
@@ -132,7 +132,7 @@ def login_user(
                 "Пользователь не найден! Пройдите регистрацию для входа! \n Введите /register для регистрации профиля."
             )
         # 2) проверка пароля
-        if not bcrypt.verify(password, user.password_hash):
+        if not password_hasher.context.verify(password, user.password_hash):
             raise ValueError("Неверный пароль, введите /login и попробуйте еще раз!")
 
         # 3) Удаляем ВСЕ старые сессии:
@@ -2,12 +2,29 @@ import sys
 import logging
 import asyncio
 from contextlib import suppress
+from aiohttp import web
 from aiogram import Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from bot.monitoring.telethon_service import run_monitoring, active_clients
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from bot.monitoring.telethon_service import (
+    run_monitoring,
+    set_account_filter,
+    stop_all_clients,
+)
+from bot.monitoring.ingest_queue import ingest_queue
+from bot.monitoring.leases import account_leases
+from bot.monitoring.media_pool import media_pool
+from bot.monitoring.retention import retention_job
+from bot.monitoring.session_sweeper import session_sweeper
+from bot.monitoring.supervisor import (
+    set_monitored_accounts,
+    start_supervisor,
+    stop_supervisor,
+)
 from bot.core.bot_instance import bot
 from bot import root_router
-from db.services.user_crud import create_admin_account
+from db.services.async_user_crud import create_admin_account
+from db.database import async_engine
 from config import settings
 
 logging.basicConfig(level=logging.DEBUG)
@@ -15,59 +32,168 @@ logger = logging.getLogger(__name__)
 
 ADMIN_USERNAME = settings.ADMIN_USERNAME
 ADMIN_PASSWORD = settings.ADMIN_PASSWORD
+MONITORING_WORKERS = settings.MONITORING_WORKERS
+BOT_MODE = settings.BOT_MODE
+# в режиме monitoring мониторинг запускается всегда
+RUN_MONITORING = settings.RUN_MONITORING or BOT_MODE == "monitoring"
 
 monitoring_task: asyncio.Task | None = None
+lease_task: asyncio.Task | None = None
 
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 
+async def start_monitoring():
+    """Мониторинг и фоновые задачи архива: Telethon-клиенты, аренда аккаунтов, очистка."""
+    global monitoring_task, lease_task
+    if MONITORING_WORKERS > 0:
+        # Telethon-клиенты работают в отдельных процессах, бот остаётся здесь
+        monitoring_task = start_supervisor(MONITORING_WORKERS)
+        on_leases = set_monitored_accounts
+    else:
+        ingest_queue.start()
+        media_pool.start()
+        # слушаем только арендованные аккаунты — до первой аренды ничего
+        set_account_filter(set())
+        monitoring_task = asyncio.create_task(run_monitoring())
+        on_leases = set_account_filter
+    lease_task = asyncio.create_task(account_leases.run(on_leases))
+    retention_job.start()
+
+
+async def stop_monitoring():
+    global monitoring_task, lease_task
+    logger.info("on_shutdown: Остановка фонового процесса (Telethon)")
+    await retention_job.stop()
+    for task in (lease_task, monitoring_task):
+        if task:
+            task.cancel()
+
+            with suppress(asyncio.CancelledError):
+                await task
+
+    # Отключение активных сессий Telethon (в worker-процессах или здесь).
+    # Текущие загрузки медиа дожидаемся, пока клиенты ещё подключены
+    await stop_supervisor()
+    await media_pool.stop()
+    await stop_all_clients()
+    logger.info("on_shutdown: Все Telethon-клиенты отключены")
+
+    # Дописываем в БД всё, что осталось в очереди сообщений
+    await ingest_queue.drain()
+
+    # Клиенты отключены — аккаунты можно сразу отдать другим экземплярам
+    await account_leases.release_all()
+
+
 async def on_startup():
     """Вызывается автоматически при старте бота"""
-    global monitoring_task
-    monitoring_task = asyncio.create_task(run_monitoring())
+    if RUN_MONITORING:
+        await start_monitoring()
+    session_sweeper.start()
+    if BOT_MODE == "webhook" and settings.WEBHOOK_URL:
+        # у нескольких копий за балансировщиком адрес один — повторная установка безвредна
+        await bot.set_webhook(
+            settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET,
+        )
+        logger.info("on_startup: webhook установлен")
 
 
 async def on_shutdown():
     """Вызывается автоматически при остановке бота"""
-    global monitoring_task
-    logger.info("on_shutdown: Остановка фонового процесса (Telethon)")
-    if monitoring_task:
-        monitoring_task.cancel()
-        
-        with suppress(asyncio.CancelledError):
-            await monitoring_task
-
-    # Отключение активных сессий Telethon
-    for acc_id, client in list(active_clients.items()):
-        if client.is_connected():
-            await client.disconnect()
-        active_clients.pop(acc_id, None)
-    logger.info("on_shutdown: Все Telethon-клиенты отключены")
+    await session_sweeper.stop()
+    if RUN_MONITORING:
+        await stop_monitoring()
 
 
 async def init_admin():
-    create_admin_account(
+    await create_admin_account(
         username=ADMIN_USERNAME, password=ADMIN_PASSWORD, is_admin=True
     )
 
 
-async def main():
+def create_dispatcher() -> Dispatcher:
     dp = Dispatcher(storage=MemoryStorage())
     dp.include_router(root_router)
 
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def run_polling(dp: Dispatcher):
+    # Запуск поллинга. При корректном завершении on_shutdown будет вызван автоматически.
+    await dp.start_polling(bot)
+
+
+async def run_webhook(dp: Dispatcher):
+    """
+    Приём апдейтов по webhook: встроенный aiohttp-сервер на WEBHOOK_HOST:WEBHOOK_PORT,
+    путь WEBHOOK_PATH, заголовок X-Telegram-Bot-Api-Secret-Token сверяется с WEBHOOK_SECRET.
+    Telegram получает ответ сразу, апдейт обрабатывается в фоне.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=settings.WEBHOOK_SECRET
+    ).register(app, path=settings.WEBHOOK_PATH)
+    # startup/shutdown диспетчера — вместе с приложением aiohttp
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(
+        "Webhook: слушаем %s:%d%s",
+        settings.WEBHOOK_HOST,
+        settings.WEBHOOK_PORT,
+        settings.WEBHOOK_PATH,
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_monitoring_only():
+    """Только мониторинг (BOT_MODE=monitoring): апдейты бота принимают другие процессы."""
+    await start_monitoring()
+    session_sweeper.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await session_sweeper.stop()
+        await stop_monitoring()
+
+
+async def main():
+    if BOT_MODE not in ("polling", "webhook", "monitoring"):
+        raise ValueError(f"Неизвестный BOT_MODE={BOT_MODE}: polling, webhook или monitoring")
+    # без секрета SimpleRequestHandler не проверяет заголовок, и любой, кто
+    # достучится до порта, пришлёт апдейт от имени админа
+    if BOT_MODE == "webhook" and not settings.WEBHOOK_SECRET:
+        raise ValueError("BOT_MODE=webhook требует WEBHOOK_SECRET")
 
     await init_admin()
 
     try:
-        # Запуск поллинга. При корректном завершении on_shutdown будет вызван автоматически.
-        await dp.start_polling(bot)
+        if BOT_MODE == "monitoring":
+            await run_monitoring_only()
+            return
+        dp = create_dispatcher()
+        try:
+            if BOT_MODE == "webhook":
+                await run_webhook(dp)
+            else:
+                await run_polling(dp)
+        finally:
+            # Гарантированно закрываем хранилище
+            await dp.storage.close()
     finally:
-        # Гарантированно вызов shutdown и закрываем хранилище
-        dp.shutdown()
-        await dp.storage.close()
+        await bot.session.close()
+        await async_engine.dispose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+"""
+Разовое схлопывание дублей telegram_messages по (account_id, chat_id, message_id).
+
+    python -m scripts.dedup_messages [--batch 5000]
+
+Можно запускать при работающем боте: каждое окно по id — отдельная короткая
+транзакция. Миграция 0003_message_natural_key делает то же самое при старте
+и затем создаёт уникальный индекс; если дубли убраны заранее, она проходит быстро.
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import create_engine
+
+from config import settings
+from db.services.message_dedup import BATCH_SIZE, dedup_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # отдельный engine: db.database при импорте запускает миграции
+    engine = create_engine(settings.SQLALCHEMY_DATABASE_URL)
+
+    def progress(high: int, max_id: int, removed: int) -> None:
+        print(f"\r  id {high}/{max_id}, удалено дублей: {removed}", end="", flush=True)
+
+    result = dedup_messages(engine, args.batch, progress)
+    print(
+        f"\nГотово: удалено {result['removed']}, "
+        f"освобождено {result['freed_bytes'] / 1024 / 1024:.1f} МБ"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Нагрузочный тест приёма апдейтов: webhook против polling, без сети.
+
+    python -m scripts.webhook_load --mode webhook --updates 5000 --concurrency 50
+    python -m scripts.webhook_load --mode polling --updates 5000
+    python -m scripts.webhook_load --url http://127.0.0.1:8080/webhook --secret ...
+
+Генерирует фейковые апдейты (сообщения от --users разных пользователей,
+вперемешку текст и /start). Bot API подменён локальной сессией,
+которая отвечает через --api-latency мс, — в Telegram ничего не уходит.
+Хендлеры и middleware настоящие и читают БД из .env (неавторизованные
+пользователи в БД ничего не пишут).
+
+webhook — встроенный aiohttp-сервер (как в BOT_MODE=webhook) на случайном
+порту, апдейты отправляются POST-запросами по --concurrency одновременно;
+ответ приходит после обработки, так что задержка — полная.
+polling — как dp.start_polling: пачки по 100 апдейтов с задержкой
+getUpdates в --api-latency мс, каждый апдейт — отдельная задача.
+С --url апдейты уходят на уже запущенный бот (его Bot API не подменяется).
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+from bot import root_router
+from bot.middlewares.throttling_middleware import throttling_middleware
+
+# столько апдейтов polling получает за один getUpdates
+POLLING_BATCH = 100
+# дорогие команды (/view_tg, /view_users) не шлются: их режет общий лимит
+# ThrottlingMiddleware, и тест мерил бы его, а не приём апдейтов
+TEXTS = ["привет", "/start", "как дела?", "/help"]
+
+
+class FakeSession(BaseSession):
+    """Bot API без сети: каждый вызов отвечает через latency секунд."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.requests = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.__returning__ is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=self.requests,
+                date=datetime.utcnow(),
+                chat=Chat(
+                    id=chat_id if isinstance(chat_id, int) else 0, type="private"
+                ),
+            )
+        return True
+
+    async def stream_content(
+        self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True
+    ):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def fake_updates(count: int, users: int) -> list[dict]:
+    updates = []
+    for i in range(1, count + 1):
+        user_id = random.randint(1, users) + 10**9
+        updates.append(
+            {
+                "update_id": i,
+                "message": {
+                    "message_id": i,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "load"},
+                    "text": random.choice(TEXTS),
+                },
+            }
+        )
+    return updates
+
+
+async def run_webhook(dp, bot, updates, concurrency, url=None, secret=None):
+    runner = None
+    if url is None:
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=dp, bot=bot, secret_token=secret, handle_in_background=False
+        ).register(app, path="/webhook")
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/webhook"
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies = []
+    errors = 0
+    queue = iter(updates)
+
+    async def sender(http):
+        nonlocal errors
+        for update in queue:
+            started = time.perf_counter()
+            async with http.post(url, json=update, headers=headers) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await asyncio.gather(*(sender(http) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if runner:
+        await runner.cleanup()
+    return elapsed, latencies, errors
+
+
+async def run_polling(dp, bot, updates, api_latency):
+    latencies = []
+    tasks = []
+
+    async def handle(update, received):
+        await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+        latencies.append(time.perf_counter() - received)
+
+    started = time.perf_counter()
+    for i in range(0, len(updates), POLLING_BATCH):
+        # getUpdates: апдейты пачки приходят вместе, после round trip к API
+        await asyncio.sleep(api_latency)
+        received = time.perf_counter()
+        tasks += [
+            asyncio.create_task(handle(update, received))
+            for update in updates[i : i + POLLING_BATCH]
+        ]
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, latencies, 0
+
+
+def report(mode, elapsed, latencies, errors, requests):
+    latencies.sort()
+    print(
+        f"{mode}: {len(latencies)} апдейтов за {elapsed:.2f} сек. — "
+        f"{len(latencies) / elapsed:.0f}/сек."
+    )
+    if latencies:
+        p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+        print(
+            f"  задержка: avg {statistics.mean(latencies) * 1000:.1f} мс, "
+            f"p50 {p(0.5):.1f} мс, p95 {p(0.95):.1f} мс, p99 {p(0.99):.1f} мс"
+        )
+    print(
+        f"  ошибок {errors}, вызовов Bot API {requests}, "
+        f"лимит запросов: {throttling_middleware.stats()}"
+    )
+
+
+async def run(args):
+    random.seed(args.seed)
+    updates = fake_updates(args.updates, args.users)
+    session = FakeSession(args.api_latency / 1000)
+    bot = Bot(token="123456:load-test", session=session)
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(root_router)
+
+    if args.mode == "webhook":
+        result = await run_webhook(
+            dp, bot, updates, args.concurrency, args.url, args.secret
+        )
+    else:
+        result = await run_polling(dp, bot, updates, args.api_latency / 1000)
+    report(args.mode, *result, session.requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("webhook", "polling"), default="webhook")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--api-latency", type=float, default=50.0, help="мс на вызов Bot API"
+    )
+    parser.add_argument(
+        "--url", help="webhook уже запущенного бота вместо встроенного сервера"
+    )
+    parser.add_argument("--secret", help="WEBHOOK_SECRET")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.url:
+        args.mode = "webhook"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()